@@ -0,0 +1,246 @@
+# Python libraries
+import os
+import re
+import time
+import uuid
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from threading import Event, Lock
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Local imports
+from modules.get_api_key import get_API, load_environment
+
+# Load .env before the local modules read their configuration
+load_environment()
+
+from modules.api_client import STREAM_ERROR_MARKER
+from modules.ingestion_pipeline import VIDEO_FOLDER, ingest_sources
+from modules.library_registry import get_library, get_raw_data
+from modules.managers.folder_manager import check_folder_existence, read_json, write_json
+from modules.managers.trace_manager import tracer
+
+# Default library and raw data (the same of the Streamlit app)
+DEFAULT_LIBRARY_PATH = 'data/libraries/first_approach'
+DEFAULT_RAW_DATA_PATH = 'data/raw_data.json'
+
+# Libraries created by the ingestion endpoint and the status of each ingestion job. They are saved
+# on disk, so every worker process can answer about them
+INGESTED_LIBRARIES_PATH = 'data/libraries/ingested'
+JOBS_PATH = 'data/cache/jobs'
+
+# Blocking work (searches, LLM calls, ingestion) runs in bounded thread pools, so the event loop
+# keeps accepting requests and a burst of questions does not create unlimited threads
+chat_executor = ThreadPoolExecutor(max_workers=int(os.getenv('API_CHAT_WORKERS', 16)), thread_name_prefix='chat')
+ingest_executor = ThreadPoolExecutor(max_workers=int(os.getenv('API_INGEST_WORKERS', 1)), thread_name_prefix='ingest')
+
+app = FastAPI(title='Teacher Assistant API')
+
+class ChatRequest(BaseModel):
+    query: str
+    threshold: float = 0.4
+    # Pydantic needs Optional (Python 3.9)
+    library_id: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    txt_url: str
+    pdf_url: str
+    video_url: str
+
+def run_blocking(executor: ThreadPoolExecutor, function, *args, **kwargs):
+    """
+        This function runs a blocking function in a thread pool without blocking the event loop.
+        The function runs in a copy of the current context (e.g. the tracing spans).
+
+        :param executor: The thread pool
+        :param function: The blocking function
+        :return: An awaitable with the function result
+    """
+    return asyncio.get_running_loop().run_in_executor(executor, partial(copy_context().run, function, *args, **kwargs))
+
+def library_paths(library_id: str or None) -> tuple[str, str]:
+    """
+        This function returns where a library and its raw data are saved. Without an ID, the
+        default library is used.
+
+        :param library_id: A string representing the ID returned by the ingestion endpoint
+        :return: A tuple with the library path and the raw data path
+    """
+    if library_id is None:
+        return DEFAULT_LIBRARY_PATH, DEFAULT_RAW_DATA_PATH
+
+    # The ID is part of a path, so only IDs created by the service are accepted
+    if not re.fullmatch(r'[0-9a-f]{32}', library_id):
+        raise HTTPException(status_code=400, detail=f'Invalid library ID {library_id!r}.')
+
+    path = f'{INGESTED_LIBRARIES_PATH}/{library_id}'
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f'The library {library_id!r} does not exist.')
+
+    return path, f'{path}/raw_data.json'
+
+def load_library(library_id: str or None) -> tuple:
+    """
+        This function returns a library and its raw data. Each worker process loads a library only
+        once and shares it between every request (see modules/library_registry.py).
+
+        :param library_id: A string representing the library ID (None for the default library)
+        :return: A tuple with the IndexingData object and the raw data dictionary
+    """
+    path, raw_data_path = library_paths(library_id)
+
+    return get_library(api_key=get_API(), path=path), get_raw_data(raw_data_path)
+
+def stream_answer(request: ChatRequest, loop: asyncio.AbstractEventLoop, pieces: asyncio.Queue, cancelled: Event):
+    """
+        This function streams an answer from a worker thread to the event loop. The whole answer is
+        generated in the same thread (the tracing spans are kept in one context).
+
+        :param request: The chat request
+        :param loop: The event loop of the request
+        :param pieces: An asyncio Queue that receives each piece and None at the end. An error is
+        sent as a piece starting with STREAM_ERROR_MARKER
+        :param cancelled: An Event set when the client disconnects. The answer stops at the next piece
+    """
+    answer = None
+
+    try:
+        index, raw_data = load_library(request.library_id)
+        answer = index.stream_context(request.query, raw_data, threshold=request.threshold)
+
+        for piece in answer:
+            if cancelled.is_set():
+                break
+            loop.call_soon_threadsafe(pieces.put_nowait, piece)
+    except Exception as e:
+        loop.call_soon_threadsafe(pieces.put_nowait, f'{STREAM_ERROR_MARKER}{type(e).__name__}: {e}')
+    finally:
+        # Stops the ChatGPT stream if the client disconnected
+        if answer is not None:
+            answer.close()
+        loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+def run_ingestion_job(job_id: str, request: IngestRequest):
+    """
+        This function runs the ingestion pipeline, saving the progress of each stage in the job
+        status and the new library on disk.
+
+        :param job_id: A string representing the job ID (also the ID of the new library)
+        :param request: The ingestion request
+    """
+    job_path = f'{JOBS_PATH}/{job_id}.json'
+    video_path = f'{VIDEO_FOLDER}/{job_id}.mp4'
+    status = {'job_id': job_id, 'status': 'running', 'events': [], 'library_id': None, 'error': None}
+
+    # The sources report their progress from different threads
+    lock = Lock()
+
+    def on_progress(source: str, stage: str, state: str, seconds: float):
+        with lock:
+            status['events'].append({'source': source, 'stage': stage, 'status': state, 'seconds': seconds})
+            write_json(job_path, status)
+
+    write_json(job_path, status)
+
+    try:
+        # Each job downloads its own video (deleted at the end), so jobs can run at the same time
+        index, raw_data = ingest_sources(
+            request.txt_url, request.pdf_url, request.video_url, api_key=get_API(), on_progress=on_progress,
+            video_path=video_path
+        )
+
+        path = f'{INGESTED_LIBRARIES_PATH}/{job_id}'
+        index.save_local(path)
+        write_json(f'{path}/raw_data.json', raw_data)
+
+        status.update({'status': 'done', 'library_id': job_id})
+    except Exception as e:
+        status.update({'status': 'failed', 'error': str(e)})
+
+    write_json(job_path, status)
+
+@app.get('/health')
+async def health() -> dict:
+    return {'status': 'ok'}
+
+@app.post('/chat')
+async def chat(request: ChatRequest) -> dict:
+    """
+        This endpoint answers a question with `retrieve_context`.
+    """
+    index, raw_data = await run_blocking(chat_executor, load_library, request.library_id)
+    answer = await run_blocking(chat_executor, index.retrieve_context, request.query, raw_data, threshold=request.threshold)
+
+    return {'query': answer['query'], 'response': answer['response'], 'trace': answer.get('trace')}
+
+@app.post('/chat/stream')
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+        This endpoint answers a question with `stream_context`, sending each piece of the answer
+        (plain text) as soon as it is generated. An error while generating it is sent as the last
+        piece, starting with STREAM_ERROR_MARKER (the status was already sent).
+    """
+    # Check the library before starting the response
+    library_paths(request.library_id)
+
+    loop = asyncio.get_running_loop()
+    pieces = asyncio.Queue()
+    cancelled = Event()
+    worker = run_blocking(chat_executor, stream_answer, request, loop, pieces, cancelled)
+
+    async def body():
+        try:
+            while (piece := await pieces.get()) is not None:
+                yield piece
+        finally:
+            # When the client disconnects, the worker stops (or never starts, if it is still queued)
+            cancelled.set()
+            worker.cancel()
+
+    return StreamingResponse(body(), media_type='text/plain; charset=utf-8')
+
+@app.post('/ingest', status_code=202)
+async def ingest(request: IngestRequest) -> dict:
+    """
+        This endpoint starts the ingestion of the three sources in the background. The progress
+        and the ID of the new library are returned by `GET /ingest/{job_id}`.
+    """
+    check_folder_existence(JOBS_PATH)
+    check_folder_existence(INGESTED_LIBRARIES_PATH)
+
+    job_id = uuid.uuid4().hex
+    write_json(f'{JOBS_PATH}/{job_id}.json', {'job_id': job_id, 'status': 'queued', 'events': [], 'library_id': None, 'error': None})
+    run_blocking(ingest_executor, run_ingestion_job, job_id, request)
+
+    return {'job_id': job_id, 'created_at': time.time()}
+
+@app.get('/ingest/{job_id}')
+async def ingest_status(job_id: str) -> dict:
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        raise HTTPException(status_code=400, detail=f'Invalid job ID {job_id!r}.')
+
+    status = read_json(f'{JOBS_PATH}/{job_id}.json')
+    if status is None:
+        raise HTTPException(status_code=404, detail=f'The job {job_id!r} does not exist.')
+
+    return status
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics() -> str:
+    """
+        This endpoint returns the latency histograms of each stage in the Prometheus text format.
+    """
+    return tracer.render_metrics()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('api:app', host='0.0.0.0', port=int(os.getenv('API_PORT', 8000)), workers=int(os.getenv('API_WORKERS', 1)))
@@ -1,13 +1,54 @@
 # Python libraries
 import streamlit as st
-import json
 import html
+import queue
+
+from threading import Thread
 
 # Local imports
+from modules.get_api_key import load_environment
+
+# Load .env before the local modules read their configuration
+load_environment()
+
+from modules.api_client import create_api_client
 from modules.indexing_data import IndexingData
-from modules.get_data import *
-from modules.video_processing import transcript_video
+from modules.ingestion_pipeline import ingest_sources, SOURCES
+from modules.library_registry import get_library, get_raw_data
 from modules.get_api_key import *
+from modules.managers.whisper_pool import preload_from_environment
+from modules.managers.trace_manager import start_metrics_server_from_environment
+
+# Default library and raw data, shared between all sessions
+DEFAULT_LIBRARY_PATH = 'data/libraries/first_approach'
+DEFAULT_RAW_DATA_PATH = 'data/raw_data.json'
+
+# If API_URL is set, the app is a client of the HTTP API (see api.py) and does not load libraries
+api_client = create_api_client()
+
+def current_index() -> IndexingData:
+    """
+        This function returns the library created in the Load Data tab if the user
+        provided one. Otherwise, it returns the default library shared by all sessions.
+
+        :return: An IndexingData object
+    """
+    if 'index' in st.session_state:
+        return st.session_state.index
+
+    return get_library(api_key=st.session_state.api_key, path=DEFAULT_LIBRARY_PATH)
+
+def current_raw_data() -> dict:
+    """
+        This function returns the raw data created in the Load Data tab if the user
+        provided one. Otherwise, it returns the default raw data shared by all sessions.
+
+        :return: A dictionary with the raw data
+    """
+    if 'raw_data' in st.session_state:
+        return st.session_state.raw_data
+
+    return get_raw_data(DEFAULT_RAW_DATA_PATH)
 
 # Function to retrieve bot response
 def bot_response(user_input: str) -> dict:
@@ -18,23 +59,113 @@ def bot_response(user_input: str) -> dict:
         :param user_input: A string representing the query/user input
         :return: A dict with the bot response
     """
-    return st.session_state.index.retrieve_context(user_input, st.session_state.raw_data, threshold=0.4)
+    return current_index().retrieve_context(user_input, current_raw_data(), threshold=0.4)
+
+def run_ingestion(txt_url: str, pdf_url: str, video_url: str) -> tuple[IndexingData, dict, dict or None]:
+    """
+        This function runs the ingestion pipeline (the three sources at the same time) in a
+        background thread and shows the progress of each source stage on screen.
+
+        :param txt_url: A string representing the text GitHub URL
+        :param pdf_url: A string representing the PDF GitHub URL
+        :param video_url: A string representing the video GitHub URL
+        :return: A tuple with the IndexingData library, the raw data dictionary and the trace of this
+        ingestion, if tracing is enabled (with the API, the library ID, None and None)
+    """
+    # One line on screen per source
+    placeholders = {source: st.empty() for source in SOURCES + ['library']}
+    progress = queue.Queue()
+    result = {'trace': None}
+
+    # The session state can only be read by the script thread
+    api_key = st.session_state.api_key
+
+    def worker():
+        try:
+            if api_client is not None:
+                # The library is created and kept by the service, only its ID is returned
+                result['value'] = api_client.ingest(
+                    txt_url, pdf_url, video_url, on_progress=lambda *event: progress.put(event)
+                ), None
+                return
+
+            def keep_trace(trace: dict):
+                result['trace'] = trace
+
+            result['value'] = ingest_sources(
+                txt_url, pdf_url, video_url,
+                api_key=api_key,
+                on_progress=lambda *event: progress.put(event),
+                on_trace=keep_trace,
+            )
+        except Exception as e:
+            result['error'] = e
+        finally:
+            progress.put(None)
+
+    Thread(target=worker, daemon=True).start()
+
+    # StreamLit elements can only be updated by the script thread
+    while (event := progress.get()) is not None:
+        source, stage, status, seconds = event
+        placeholders[source].markdown(f'**{source.title()}**: {stage} - {status} ({seconds:.1f}s)')
+
+    if 'error' in result:
+        raise result['error']
+
+    return (*result['value'], result['trace'])
+
+def bot_response_stream(user_input: str):
+    """
+        This function will retrieve the bot response based on the LangChain 
+        indexer as a stream of tokens.
+
+        :param user_input: A string representing the query/user input
+        :return: A StreamingAnswer that yields the response pieces
+    """
+    if api_client is not None:
+        return api_client.stream_answer(user_input, threshold=0.4, library_id=st.session_state.get('library_id'))
+
+    return current_index().stream_context(user_input, current_raw_data(), threshold=0.4)
+
+def display_trace(trace: dict):
+    """
+        This function displays the time of each stage of a trace (debug panel), with the
+        child stages indented under their parent.
 
-def display_chat(role: str, txt: str):
+        :param trace: A dictionary with the trace (see modules/managers/trace_manager.py)
+    """
+    depths = {}
+    lines = []
+
+    for span in trace['spans']:
+        depth = depths.get(span['parent_id'], -1) + 1
+        depths[span['span_id']] = depth
+
+        attributes = ', '.join(f'{key}={value}' for key, value in span['attributes'].items())
+        lines.append(f"{'&nbsp;' * 4 * depth}`{span['name']}`: {span['duration_ms']:.1f} ms (at {span['start_ms']:.1f} ms) {attributes}")
+
+    st.markdown('  \n'.join(lines))
+
+def display_chat(role: str, txt: str, container=None):
     """
         This function display on screen a simulation of a chat where user 
         input is on green background and assistant/bot is on a gray background.
 
         :param role: A string representing the sender role
         :param txt: A string representing the text to be displayed
+        :param container: A StreamLit element (e.g. `st.empty()`) where the message is
+        displayed. If not given, it is displayed in the page
     """
+    container = container or st
+
     if role == 'Assistant':
         role = 'TEACHER'
         # Escape HTML text to display it correctly to user instead of using the markdown itself
         txt = html.escape(str(txt["response"]))
-        st.markdown(f'<div style="background-color:#f1f0f0; padding:10px; border-radius:10px; margin-bottom:5px; max-width:70%;"><b>{role}</b>: {txt}</div>', unsafe_allow_html=True)
+        container.markdown(f'<div style="background-color:#f1f0f0; padding:10px; border-radius:10px; margin-bottom:5px; max-width:70%;"><b>{role}</b>: {txt}</div>', unsafe_allow_html=True)
     elif role == 'User':
-        st.markdown(f'<div style="background-color:#dcf8c6; padding:10px; border-radius:10px; margin-bottom:5px; max-width:70%; text-align:right; margin-left:auto;"><b>YOU</b>: {txt}</div>', unsafe_allow_html=True)
+        container.markdown(f'<div style="background-color:#dcf8c6; padding:10px; border-radius:10px; margin-bottom:5px; max-width:70%; text-align:right; margin-left:auto;"><b>YOU</b>: {txt}</div>', unsafe_allow_html=True)
 
 def disable_tab(condition:bool=True):
     """
@@ -57,6 +188,12 @@ def disable_tab(condition:bool=True):
 if 'disabled_tab' not in st.session_state:
     st.session_state.disabled_tab = True
 
+    # Load the Whisper models listed in WHISPER_PRELOAD (only once per process)
+    preload_from_environment()
+
+    # Serve the latency histograms if METRICS_PORT is set (only once per process)
+    start_metrics_server_from_environment()
+
 # Sidebar with navigation
 st.sidebar.title("Navigation")
 tabs = ["API Key", "Load Data", "Chat"]
@@ -110,41 +247,10 @@ elif tab_choice == "Load Data":
     error_message = 'This is not a valid URL.'
     success_message = 'Loaded successfully'
     
-    # Load text from a GitHub URL
+    # Get the GitHub URLs of each source
     txt = st.text_input('What is the text context GitHub URL?', value=None)
-    if txt:
-        try:
-            txt_content = get_text_from_github(txt)
-            st.session_state.txt_url = txt
-            st.success(success_message)
-        except:
-            st.warning(error_message)
-
-    # Load PDF from a GitHub URL
     pdf = st.text_input('What is the PDF context GitHub URL?', value=None)
-    if pdf:
-        try:
-            pdf_content = get_pdf_from_github(pdf)
-            st.session_state.pdf_url = pdf
-            st.success(success_message)
-        except:
-            st.warning(error_message)
-
-    # Load video from a GitHub URL
     video = st.text_input('What is the video context GitHub URL?', value=None)
-    if video:
-        try:
-            video_path = 'data/video/default_video.mp4'
-            # Download and save video
-            save_video_from_github(video, save_path=video_path)
-
-            # Transcript the video to text
-            video_content, segments = transcript_video(video_path, model_performance='balanced')
-            st.session_state.video_url = video
-
-            st.success(success_message)
-        except Exception as e:
-            st.warning(error_message)
 
     # Check if all variables are equal to None
     variables = [txt, pdf, video]
@@ -152,25 +258,26 @@ elif tab_choice == "Load Data":
     # Disabled tabs with
     if any(variables) and not all(variables) and not st.session_state.disabled_tab:
         disable_tab(condition=True)
-    elif all(variables) and 'video_url' in st.session_state:
-        if video_content and segments:
-            # Create data dict to insert into library
-            data={
-                txt_content['text']:'text',
-                pdf_content['text']:'pdf',
-                video_content:'video',
-            }
-
-            # Initialize Index class with api key if provided
-            st.session_state.index = IndexingData(api_key=st.session_state.api_key)
-            st.session_state.index.create_library(data)
-
-            # Create a raw data variable to check where the information is located
-            st.session_state.raw_data = {
-                'text': txt_content,
-                'pdf': pdf_content,
-                'video': segments,
-            }
+    elif all(variables) and st.session_state.get('loaded_urls') != variables:
+        try:
+            # Download and process the three sources at the same time
+            index, raw_data, ingestion_trace = run_ingestion(txt, pdf, video)
+        except Exception as e:
+            st.warning(f'{error_message} {e}')
+        else:
+            if api_client is not None:
+                st.session_state.library_id = index
+            else:
+                st.session_state.index = index
+                st.session_state.raw_data = raw_data
+            st.session_state.txt_url, st.session_state.pdf_url, st.session_state.video_url = variables
+            st.session_state.loaded_urls = variables
+            st.success(success_message)
+
+            # Time of each ingestion stage of this session (if tracing is enabled)
+            if ingestion_trace:
+                with st.expander('Debug: ingestion stage timings'):
+                    display_trace(ingestion_trace)
 
             # Enable tab changing
             disable_tab(condition=False)
@@ -188,14 +295,11 @@ elif tab_choice == "Chat":
             f'[Text Context]({st.session_state.txt_url}) | [PDF Context]({st.session_state.pdf_url}) | [Video Context]({st.session_state.video_url})'
         )
 
-    # Check if Index was initialized
-    if 'index' not in st.session_state:
-        st.session_state.index = IndexingData(api_key=st.session_state.api_key, path='data/libraries/first_approach')
-
-    if 'raw_data' not in st.session_state:
-        # Load dictionary from a .json file
-        with open('data/raw_data.json', 'r') as json_file:
-            st.session_state.raw_data = json.load(json_file)
+    # The default library and raw data are loaded once per process and shared between
+    # sessions (see modules/library_registry.py), so nothing is stored in the session here.
+    # With the API, the service keeps the libraries
+    if api_client is None:
+        current_index()
     
     # Display the chat history
     if "messages" not in st.session_state:
@@ -205,6 +309,15 @@ elif tab_choice == "Chat":
         role = message['role'].title()
         display_chat(role=role, txt=message['message'])
 
+        # Show how long the first token took to arrive
+        if role == 'Assistant' and message['message'].get('ttft') is not None:
+            st.caption(f"First token in {message['message']['ttft']:.2f}s, full answer in {message['message']['total_time']:.2f}s")
+
+        # Debug panel with the time of each stage (if tracing is enabled)
+        if role == 'Assistant' and message['message'].get('trace'):
+            with st.expander('Debug: stage timings'):
+                display_trace(message['message']['trace'])
+
     # Separate in two columns, one for user input and another to send button
     # This allows send button be in the same line of user input
     col1, col2 = st.columns([5,1], vertical_alignment='bottom')
@@ -216,18 +329,25 @@ elif tab_choice == "Chat":
     
     # Send button
     with col2:
-        if st.button("Send"):
-            if user_input:
-                # Append user message to chat history
-                st.session_state.messages.append({'role': 'user', 'message': user_input})
-
-                # Generate bot response and append to chat history
-                response = bot_response(user_input)
-                st.session_state.messages.append({'role': 'assistant', 'message': response})
-                
-                # Clear input box
-                user_input = None
-
-                # Rerun to display messages
-                st.rerun()
+        send = st.button("Send")
+
+    if send and user_input:
+        # Append user message to chat history
+        st.session_state.messages.append({'role': 'user', 'message': user_input})
+        display_chat(role='User', txt=user_input)
+
+        # Display the bot response while it is generated (token by token)
+        placeholder = st.empty()
+        answer = bot_response_stream(user_input)
+        for _ in answer:
+            display_chat(role='Assistant', txt={'response': answer.response}, container=placeholder)
+
+        # Append bot response to chat history
+        st.session_state.messages.append({'role': 'assistant', 'message': answer.to_dict()})
+
+        # Clear input box
+        user_input = None
+
+        # Rerun to display messages
+        st.rerun()
                 
\ No newline at end of file
@@ -0,0 +1,178 @@
+# Python libraries
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Local imports
+from modules.get_api_key import get_API, load_environment
+
+# Load .env before the local modules read their configuration
+load_environment()
+
+from modules.answer_cache import AnswerCache
+from modules.indexing_data import IndexingData
+from modules.library_registry import get_raw_data
+
+# Default library and raw data (the same of the Streamlit app)
+DEFAULT_LIBRARY_PATH = 'data/libraries/first_approach'
+DEFAULT_RAW_DATA_PATH = 'data/raw_data.json'
+
+# Fields where the question is searched in each input line (the first one found is used)
+QUESTION_FIELDS = ['query', 'question', 'title']
+
+def read_questions(path: str, field: str or None = None) -> list[dict]:
+    """
+        This function reads the questions of a JSONL file (one JSON object per line). Empty lines are
+        ignored and a line without a question raises a ValueError.
+
+        :param path: A string representing the JSONL file path
+        :param field: A string representing the field with the question. If not given, the first
+        field of QUESTION_FIELDS found in the line is used
+        :return: A list of dictionaries with the 'id' (the 'id' or 'request_id' field, or the line
+        number) and the 'query'
+    """
+    questions = []
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+
+            item = json.loads(line)
+            fields = [field] if field else QUESTION_FIELDS
+            query = next((item[name] for name in fields if item.get(name)), None)
+
+            if query is None:
+                raise ValueError(f'The line {number} of {path!r} has no question (fields {fields}).')
+
+            questions.append({'id': item.get('id', item.get('request_id', number)), 'query': query})
+
+    return questions
+
+def answer_question(index: IndexingData, raw_data: dict, question: dict, threshold: float) -> dict:
+    """
+        This function answers a question with `stream_context`, measuring the time until the first
+        piece of the answer (TTFT) and the total time.
+
+        :param index: The IndexingData library
+        :param raw_data: A dictionary with the raw data of the library
+        :param question: A dictionary with the 'id' and the 'query'
+        :param threshold: A float representing the confidence score of the search context
+        :return: A dictionary with the answer, its source location and timings (or the 'error')
+    """
+    start = time.perf_counter()
+
+    try:
+        answer = index.stream_context(question['query'], raw_data, threshold=threshold)
+        for _ in answer:
+            pass
+    except Exception as e:
+        return {**question, 'error': f'{type(e).__name__}: {e}', 'total_time': time.perf_counter() - start}
+
+    # The source location is written apart from the response (out of scope answers do not have it)
+    response = answer.response
+    if answer.location is not None:
+        response = response.removesuffix('\n' + answer.location)
+
+    return {
+        **question,
+        'response': response,
+        'location': answer.location,
+        'ttft': answer.ttft,
+        'total_time': answer.total_time,
+        'trace': answer.trace,
+    }
+
+def run_batch(index: IndexingData, raw_data: dict, questions: list[dict], output_path: str,
+              concurrency: int = 8, threshold: float = 0.4) -> dict:
+    """
+        This function answers many questions at the same time (at most `concurrency` of them) and
+        writes each answer in the output JSONL file as soon as it is ready.
+
+        :param index: The IndexingData library (loaded once and shared by every question)
+        :param raw_data: A dictionary with the raw data of the library
+        :param questions: A list of dictionaries with the 'id' and the 'query'
+        :param output_path: A string representing the output JSONL file path
+        :param concurrency: An integer representing how many questions are answered at the same time
+        :param threshold: A float representing the confidence score of the search context
+        :return: A dictionary with the throughput and the latency percentiles
+    """
+    if concurrency < 1:
+        raise ValueError(f'The concurrency must be at least 1, not {concurrency}.')
+
+    results = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as executor, \
+         open(output_path, 'w', encoding='utf-8') as output:
+        futures = [executor.submit(answer_question, index, raw_data, question, threshold) for question in questions]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+
+            output.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+            output.flush()
+
+            status = 'error' if 'error' in result else f"{result['total_time']:.2f}s"
+            print(f'[{done}/{len(questions)}] {result["id"]}: {status}', file=sys.stderr)
+
+    return summarize(results, time.perf_counter() - start)
+
+def summarize(results: list[dict], seconds: float) -> dict:
+    """
+        This function calculates the throughput and the p50/p90/p99 latencies of a batch.
+
+        :param results: A list with the dictionaries returned by `answer_question`
+        :param seconds: A float representing the wall time of the batch
+        :return: A dictionary with the summary
+    """
+    answered = [result for result in results if 'error' not in result]
+    summary = {
+        'questions': len(results),
+        'errors': len(results) - len(answered),
+        'seconds': seconds,
+        'questions_per_second': len(results) / seconds if seconds else 0.0,
+    }
+
+    for name in ['total_time', 'ttft']:
+        values = [result[name] for result in answered if result.get(name) is not None]
+        for percentile in [50, 90, 99]:
+            summary[f'{name}_p{percentile}'] = float(np.percentile(values, percentile)) if values else None
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Answers the questions of a JSONL file with a library.')
+    parser.add_argument('input', help='JSONL file with one question per line')
+    parser.add_argument('--output', default='answers.jsonl', help='JSONL file where the answers are written')
+    parser.add_argument('--field', default=None, help=f'field with the question (default: the first of {QUESTION_FIELDS})')
+    parser.add_argument('--library', default=DEFAULT_LIBRARY_PATH, help='folder of the saved library')
+    parser.add_argument('--raw-data', default=DEFAULT_RAW_DATA_PATH, help='raw data .json file of the library')
+    parser.add_argument('--concurrency', type=int, default=8, help='how many questions are answered at the same time')
+    parser.add_argument('--threshold', type=float, default=0.4)
+    parser.add_argument('--no-cache', action='store_true', help='answer every question without the answer cache')
+    args = parser.parse_args()
+
+    questions = read_questions(args.input, args.field)
+
+    # The library is loaded only once and shared by every question
+    index = IndexingData(
+        api_key=get_API(), path=args.library,
+        answer_cache=AnswerCache(max_size=0, similarity=None) if args.no_cache else None
+    )
+    raw_data = get_raw_data(args.raw_data)
+
+    summary = run_batch(index, raw_data, questions, args.output, concurrency=args.concurrency, threshold=args.threshold)
+
+    print(f"\n{summary['questions']} questions ({summary['errors']} errors) in {summary['seconds']:.1f}s "
+          f"-> {summary['questions_per_second']:.2f} questions/s")
+    for name in ['total_time', 'ttft']:
+        if summary[f'{name}_p50'] is not None:
+            print(f"{name:>10}: p50 {summary[f'{name}_p50']:.2f}s | p90 {summary[f'{name}_p90']:.2f}s | "
+                  f"p99 {summary[f'{name}_p99']:.2f}s")
@@ -0,0 +1,60 @@
+# Python libraries
+import argparse
+import time
+
+# Local imports
+from benchmarks.bench_text_splitter import create_corpus
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from modules.embedding_scheduler import EmbeddingScheduler
+
+def run(server: FakeOpenAIServer, texts: list[str], concurrency: int, batch_tokens: int) -> dict:
+    """
+        This function embeds the texts with the scheduler against the fake server.
+
+        :param server: A running FakeOpenAIServer
+        :param texts: A list of strings (chunks)
+        :param concurrency: An integer representing the maximum number of requests at the same time
+        :param batch_tokens: An integer representing the maximum number of tokens of a request
+        :return: A dictionary with the results
+    """
+    scheduler = EmbeddingScheduler(
+        api_key='fake', base_url=server.url, concurrency=concurrency, max_batch_tokens=batch_tokens,
+        backoff_factor=0.1,
+    )
+    checkpoints = []
+    requests, rate_limited = server.requests, server.rate_limited
+
+    start = time.perf_counter()
+    vectors = scheduler.embed({str(i): text for i, text in enumerate(texts)}, on_batch=checkpoints.append)
+    seconds = time.perf_counter() - start
+
+    assert len(vectors) == len(texts)
+
+    return {
+        'seconds': seconds,
+        'batches': len(checkpoints),
+        'requests': server.requests - requests,
+        'rate_limited': server.rate_limited - rate_limited,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the embedding scheduler against a local fake server.')
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds each request takes')
+    parser.add_argument('--rate-limit', type=float, default=0.1, help='fraction of requests answered with 429')
+    parser.add_argument('--batch-tokens', type=int, default=20_000)
+    args = parser.parse_args()
+
+    # Chunks of ~400 words, like the token splitter creates
+    texts = create_corpus(args.chunks, 400)
+    server = FakeOpenAIServer(dimension=256, latency=args.latency, rate_limit=args.rate_limit).start()
+
+    print(f'{args.chunks} chunks, {args.latency}s per request, {args.rate_limit:.0%} of requests rate limited')
+    try:
+        for concurrency in [1, 4, 8, 16]:
+            result = run(server, texts, concurrency, args.batch_tokens)
+            print(f"concurrency {concurrency:>2}: {result['seconds']:6.2f} s | {result['batches']} batches | "
+                  f"{result['requests']} requests ({result['rate_limited']} rate limited)")
+    finally:
+        server.stop()
@@ -0,0 +1,176 @@
+# Python libraries
+import argparse
+import tempfile
+import time
+import faiss
+import numpy as np
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain.docstore.document import Document
+
+# Local imports
+from benchmarks.stubs import StubEmbeddings, create_pdf_raw_data, create_stub_llm
+from modules.answer_cache import AnswerCache
+from modules.faiss_index import IndexSpec, build_index
+from modules.indexing_data import IndexingData
+
+def create_vectors(count: int, dimension: int, clusters: int = 256, seed: int = 42) -> np.ndarray:
+    """
+        This function creates synthetic embeddings grouped in clusters (like chunks of
+        the same lesson), normalized as OpenAI embeddings are.
+
+        :param count: An integer representing how many vectors are created
+        :param dimension: An integer representing the size of each vector
+        :param clusters: An integer representing how many groups of similar vectors exist
+        :param seed: An integer to make the vectors reproducible
+        :return: A NumPy float32 matrix with one vector per row
+    """
+    generator = np.random.default_rng(seed)
+    centers = generator.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[generator.integers(0, clusters, count)] + 0.5 * generator.standard_normal((count, dimension)).astype(np.float32)
+
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+        This function searches each query alone (as the chat does) and measures the latency.
+
+        :param index: A FAISS index with the vectors
+        :param queries: A NumPy float32 matrix with one query per row
+        :param k: An integer representing how many neighbors are searched
+        :return: A tuple with the neighbors of each query and the latency of each query in ms
+    """
+    neighbors = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, neighbors[i] = index.search(query[None, :], k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+
+    return neighbors, latencies
+
+def measure_mmr(index: faiss.Index, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+        This function runs LangChain's MMR search (the search the chat uses) on an index. It
+        reconstructs the vectors of the candidates, so it fails on indexes that can not do it.
+
+        :param index: A FAISS index with the vectors
+        :param queries: A NumPy float32 matrix with one query per row
+        :param k: An integer representing how many chunks are returned
+        :return: A NumPy array with the latency of each query in ms
+    """
+    ids = [str(row) for row in range(index.ntotal)]
+    library = FAISS(
+        StubEmbeddings(), index, InMemoryDocstore({id: Document(page_content=id) for id in ids}), dict(enumerate(ids))
+    )
+
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        library.max_marginal_relevance_search_by_vector(query.tolist(), k=k, fetch_k=4 * k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+
+    return latencies
+
+def check_delete(spec: IndexSpec, pages: int = 100) -> float:
+    """
+        This function removes a source from a small library (local embeddings, without network)
+        and adds another one, then searches the text of each chunk. If the rows of the index do
+        not match the chunks anymore, the chunks do not find themselves.
+
+        :param spec: An IndexSpec describing the index
+        :param pages: An integer representing the size of each source
+        :return: A float representing the fraction of chunks found as their own best match
+    """
+    with tempfile.TemporaryDirectory() as path:
+        index = IndexingData(
+            api_key='stub', embedding_backend='local', llm=create_stub_llm(), index_spec=spec,
+            embedding_store_path=path, answer_cache=AnswerCache(max_size=0, similarity=None)
+        )
+        for seed, source in enumerate(['first', 'second', 'third']):
+            index.add_source(source, create_pdf_raw_data(pages, seed=seed)['text'], 'text')
+            if source == 'second':
+                index.remove_source('first')
+
+        library = index.get_library
+        found = 0
+        for id in library.index_to_docstore_id.values():
+            best = library.similarity_search_by_vector(index.embed_query(library.docstore.search(id).page_content), k=1)
+            found += best[0].metadata['id'] == id
+
+        return found / len(library.index_to_docstore_id)
+
+def run(count: int, dimension: int, queries: int, k: int, specs: list[IndexSpec]) -> list[dict]:
+    """
+        This function compares approximate indexes with the flat (exact) baseline.
+
+        :param count: An integer representing how many vectors are indexed
+        :param dimension: An integer representing the size of each vector
+        :param queries: An integer representing how many queries are searched
+        :param k: An integer representing how many neighbors are searched (recall@k)
+        :param specs: A list with the IndexSpec of each approximate index
+        :return: A list with the results of each index
+    """
+    vectors = create_vectors(count, dimension)
+    query_vectors = create_vectors(queries, dimension, seed=7)
+
+    # Exact neighbors are the ground truth
+    flat = faiss.IndexFlatL2(dimension)
+    flat.add(vectors)
+    truth, latencies = measure(flat, query_vectors, k)
+    mmr_latencies = measure_mmr(flat, query_vectors, k)
+
+    results = [{'index': 'Flat', 'build_seconds': 0.0, 'recall': 1.0,
+                'p50_ms': float(np.percentile(latencies, 50)), 'p99_ms': float(np.percentile(latencies, 99)),
+                'mmr_p50_ms': float(np.percentile(mmr_latencies, 50))}]
+
+    for spec in specs:
+        start = time.perf_counter()
+        index = build_index(vectors, spec)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        neighbors, latencies = measure(index, query_vectors, k)
+        recall = np.mean([len(set(neighbors[i]) & set(truth[i])) / k for i in range(queries)])
+        mmr_latencies = measure_mmr(index, query_vectors, k)
+
+        results.append({
+            'index': f'{spec.factory} (nprobe={spec.nprobe}, efSearch={spec.ef_search})',
+            'build_seconds': build_seconds,
+            'recall': float(recall),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'mmr_p50_ms': float(np.percentile(mmr_latencies, 50)),
+        })
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare approximate FAISS indexes with the flat index.')
+    parser.add_argument('--vectors', type=int, default=200_000)
+    parser.add_argument('--dimension', type=int, default=1536, help='1536 is the size of OpenAI embeddings')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+
+    specs = [
+        IndexSpec('IVF1024,Flat', nprobe=8),
+        IndexSpec('IVF1024,Flat', nprobe=32),
+        IndexSpec('HNSW32', ef_search=64),
+        IndexSpec('HNSW32', ef_search=128),
+        IndexSpec('IVF1024,PQ64', nprobe=32, train_size=100_000),
+    ]
+
+    print(f'{args.vectors} vectors, {args.dimension} dimensions, {args.queries} queries, recall@{args.k}')
+    for result in run(args.vectors, args.dimension, args.queries, args.k, specs):
+        print(f"{result['index']:>42}: recall {result['recall']:.3f} | p50 {result['p50_ms']:7.3f} ms | "
+              f"p99 {result['p99_ms']:7.3f} ms | MMR p50 {result['mmr_p50_ms']:7.3f} ms | "
+              f"build {result['build_seconds']:6.1f} s")
+
+    # Small indexes, so the IVF clusters can be trained with the chunks of a few sources
+    print('\nChunks found as their own best match after removing a source and adding another:')
+    for spec in [IndexSpec('Flat'), IndexSpec('IVF4,Flat', nprobe=4), IndexSpec('HNSW32', ef_search=64)]:
+        print(f'{spec.factory:>42}: {check_delete(spec):.1%}')
@@ -0,0 +1,51 @@
+# Python libraries
+import argparse
+import sys
+import time
+
+# Local imports
+from modules.managers.whisper_pool import whisper_pool
+from modules.video_processing import (
+    SAMPLE_RATE, compare_transcriptions, decode_audio, shutdown_transcription_pools, transcribe_audio_parallel
+)
+
+def transcribe_sequential(audio, model_performance: str, language: str) -> list:
+    with whisper_pool.acquire(model_performance) as model:
+        result = model.transcribe(audio, language=language, temperature=0.0, word_timestamps=True)
+
+    return [[x['text'], x['start'], x['end']] for x in result['segments']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the parallel and the sequential transcription of a video.')
+    parser.add_argument('video', help='path of a local video (a long lecture)')
+    parser.add_argument('--model', default='speed', help='Whisper tier (speed, balanced or accuracy)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--window', type=float, default=300.0, help='seconds of each parallel window')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='seconds a segment can move')
+    parser.add_argument('--min-aligned', type=float, default=0.9, help='minimum fraction of aligned segments')
+    args = parser.parse_args()
+
+    audio = decode_audio(args.video)
+    print(f'{len(audio) / SAMPLE_RATE / 60:.1f} minutes of audio')
+
+    start = time.perf_counter()
+    sequential = transcribe_sequential(audio, args.model, 'pt')
+    print(f'sequential: {time.perf_counter() - start:8.1f} s | {len(sequential)} segments')
+
+    try:
+        # The second video reuses the pool, so its time has no model loading
+        for run in ['cold', 'warm']:
+            start = time.perf_counter()
+            parallel = transcribe_audio_parallel(audio, args.model, workers=args.workers, window_seconds=args.window)
+            print(f'parallel ({run}): {time.perf_counter() - start:8.1f} s | {len(parallel)} segments')
+    finally:
+        shutdown_transcription_pools()
+
+    comparison = compare_transcriptions(sequential, parallel, tolerance=args.tolerance)
+    print(f"aligned segments: {comparison['aligned']:.1%} of {comparison['segments']}")
+    for text, start, end in comparison['misaligned'][:10]:
+        print(f'  not found near {start:.1f}-{end:.1f}s: {text.strip()!r}')
+
+    if comparison['aligned'] < args.min_aligned:
+        sys.exit(1)
@@ -0,0 +1,82 @@
+# Python libraries
+import argparse
+import random
+import time
+
+# Local imports
+from modules.tokenize_text import create_text_splitter, create_token_splitter, tiktoken_len
+
+WORDS = (
+    'página estrutura conteúdo aprendizagem tabela lista vídeo texto semântica acessibilidade '
+    'html web dados marcação documento formatação hipertexto links navegador servidor'
+).split()
+
+def create_corpus(documents: int, words_per_document: int, seed: int = 42) -> list[str]:
+    """
+        This function creates a synthetic corpus with Portuguese words, paragraphs and
+        line breaks, so both splitters have separators to work with.
+
+        :param documents: An integer representing how many documents are created
+        :param words_per_document: An integer representing the size of each document
+        :param seed: An integer to make the corpus reproducible
+        :return: A list of strings
+    """
+    generator = random.Random(seed)
+    corpus = []
+
+    for _ in range(documents):
+        words = []
+        for i in range(words_per_document):
+            words.append(generator.choice(WORDS))
+            if i % 120 == 119:
+                words.append('\n\n')
+            elif i % 15 == 14:
+                words.append('.\n')
+
+        corpus.append(' '.join(words))
+
+    return corpus
+
+def run(documents: int, words_per_document: int) -> dict:
+    """
+        This function splits the same corpus with the recursive splitter and with the
+        token splitter and returns the throughput of both.
+
+        :param documents: An integer representing how many documents are created
+        :param words_per_document: An integer representing the size of each document
+        :return: A dictionary with the time and throughput of each splitter
+    """
+    corpus = create_corpus(documents, words_per_document)
+    total_tokens = sum(tiktoken_len(text) for text in corpus)
+
+    start = time.perf_counter()
+    recursive_splitter = create_text_splitter()
+    recursive_chunks = sum(len(recursive_splitter.split_text(text)) for text in corpus)
+    recursive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    token_chunks = sum(len(chunks) for chunks in create_token_splitter().split_texts_with_offsets(corpus))
+    token_time = time.perf_counter() - start
+
+    return {
+        'documents': documents,
+        'tokens': total_tokens,
+        'recursive': {'seconds': recursive_time, 'chunks': recursive_chunks, 'tokens_per_second': total_tokens / recursive_time},
+        'token': {'seconds': token_time, 'chunks': token_chunks, 'tokens_per_second': total_tokens / token_time},
+        'speedup': recursive_time / token_time,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the recursive splitter with the token splitter.')
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--words', type=int, default=50_000, help='Words per document')
+    args = parser.parse_args()
+
+    result = run(args.documents, args.words)
+
+    print(f"Corpus: {result['documents']} documents, {result['tokens']} tokens")
+    for name in ['recursive', 'token']:
+        stats = result[name]
+        print(f"{name:>9}: {stats['seconds']:8.2f} s | {stats['chunks']:6d} chunks | {stats['tokens_per_second']:12,.0f} tokens/s")
+    print(f"  speedup: {result['speedup']:.1f}x")
@@ -0,0 +1,179 @@
+# Python libraries
+import argparse
+import hashlib
+import json
+import math
+import random
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+def fake_embedding(text: str, dimension: int) -> list[float]:
+    """
+        This function creates a deterministic normalized vector for a text, so the same text
+        always has the same embedding.
+
+        :param text: A string
+        :param dimension: An integer representing the size of the vector
+        :return: A list of floats
+    """
+    generator = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vector = [generator.gauss(0, 1) for _ in range(dimension)]
+    norm = math.sqrt(sum(value * value for value in vector))
+
+    return [value / norm for value in vector]
+
+class FakeOpenAIServer():
+    def __init__(self, port: int = 0, dimension: int = 1536, latency: float = 0.05,
+                 rate_limit: float = 0.0, seed: int = 42, rate_limit_first: int = 0,
+                 fail_after: int or None = None) -> None:
+        """
+            This class is a local server that answers like the OpenAI embeddings API
+            (POST /v1/embeddings), to test and measure the embedding scheduler without calling
+            OpenAI. It can answer a fraction of the requests with a rate limit (429) and fail
+            after some requests (500), and it records the texts of each answered request and the
+            maximum number of requests at the same time.
+
+            Point the clients to it with `base_url=server.url` or the 'OPENAI_BASE_URL' variable.
+
+            :param port: An integer representing the port (0 chooses a free port)
+            :param dimension: An integer representing the size of the embeddings
+            :param latency: A float representing how many seconds each request takes
+            :param rate_limit: A float between 0 and 1 representing the fraction of requests
+            answered with a 429 error
+            :param seed: An integer to make the rate limit errors reproducible
+            :param rate_limit_first: An integer representing how many of the first requests are
+            answered with a 429 error
+            :param fail_after: An integer. If given, the requests after this number of answered
+            requests fail with a 500 error (e.g. to interrupt an embedding)
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_first = rate_limit_first
+        self.fail_after = fail_after
+        self.requests = 0
+        self.rate_limited = 0
+        self.batches = []
+        self.active = 0
+        self.max_active = 0
+
+        self.__generator = random.Random(seed)
+        self.__lock = Lock()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), self.__create_handler())
+        self.__thread = None
+
+    def __create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+                status = server.register_request()
+                if status == 429:
+                    return self.__send(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                                       {'Retry-After': '0.1'})
+                if status == 500:
+                    return self.__send(500, {'error': {'message': 'Server error', 'type': 'server_error'}})
+
+                texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+                with server.answering(texts):
+                    time.sleep(server.latency)
+
+                data = [
+                    {'object': 'embedding', 'index': i, 'embedding': fake_embedding(text, server.dimension)}
+                    for i, text in enumerate(texts)
+                ]
+                tokens = sum(len(text.split()) for text in texts)
+
+                self.__send(200, {
+                    'object': 'list', 'data': data, 'model': body.get('model'),
+                    'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+                })
+
+            def __send(self, status: int, payload: dict, headers: dict or None = None):
+                content = json.dumps(payload).encode('utf-8')
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def register_request(self) -> int:
+        """
+            This method counts a request and decides if it is rate limited or fails.
+
+            :return: An integer representing the HTTP status of the answer (200, 429 or 500)
+        """
+        with self.__lock:
+            self.requests += 1
+            limited = self.requests <= self.rate_limit_first or self.__generator.random() < self.rate_limit
+            self.rate_limited += limited
+
+            if limited:
+                return 429
+            if self.fail_after is not None and len(self.batches) >= self.fail_after:
+                return 500
+
+        return 200
+
+    @contextmanager
+    def answering(self, texts: list[str]):
+        """
+            This method records a request while it is answered.
+
+            :param texts: A list with the texts of the request
+        """
+        with self.__lock:
+            self.batches.append(texts)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.active -= 1
+
+    def start(self) -> 'FakeOpenAIServer':
+        self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.__server.server_address[1]}/v1'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local server that answers like the OpenAI embeddings API.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.port, args.dimension, args.latency, args.rate_limit).start()
+    print(f'Serving fake embeddings on {server.url} (press Ctrl+C to stop)')
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,92 @@
+# Python libraries
+import random
+import zlib
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake import FakeListLLM
+
+# Local imports
+from benchmarks.bench_text_splitter import WORDS
+
+class StubEmbeddings(Embeddings):
+    def __init__(self, dimension: int = 1536) -> None:
+        """
+            This class creates deterministic normalized vectors (the same text always has the same
+            vector) without network, with the size of OpenAI embeddings.
+
+            :param dimension: An integer representing the size of the vectors
+        """
+        self.__dimension = dimension
+
+    def __embed(self, text: str) -> list[float]:
+        vector = np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.__dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.__embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.__embed(text)
+
+def create_stub_llm() -> FakeListLLM:
+    """
+        This function creates a LLM that answers without network (always the same answer).
+
+        :return: A LangChain FakeListLLM
+    """
+    return FakeListLLM(responses=['Esta é uma resposta de teste baseada no contexto da aula.'])
+
+def create_sentence(generator: random.Random, words: int) -> str:
+    return ' '.join(generator.choice(WORDS) for _ in range(words)) + '. '
+
+def create_pdf_raw_data(pages: int, words_per_page: int = 350, seed: int = 42) -> dict:
+    """
+        This function creates the raw data of a synthetic PDF, like `get_pdf_from_github` returns.
+
+        :param pages: An integer representing how many pages are created
+        :param words_per_page: An integer representing the size of each page
+        :param seed: An integer to make the PDF reproducible
+        :return: A dictionary with the 'text', the 'pages_text' and the 'type'
+    """
+    generator = random.Random(seed)
+    pages_text = [
+        ''.join(create_sentence(generator, 14) for _ in range(words_per_page // 14)) + '\n'
+        for _ in range(pages)
+    ]
+
+    return {'text': ''.join(pages_text), 'pages_text': pages_text, 'type': 'pdf'}
+
+def create_video_raw_data(minutes: float, segment_seconds: float = 5.0, seed: int = 7) -> list:
+    """
+        This function creates the raw data of a synthetic video transcription, like
+        `transcript_video` returns (the text of each segment and its start and end times).
+
+        :param minutes: A float representing the length of the video
+        :param segment_seconds: A float representing the length of each segment
+        :param seed: An integer to make the transcription reproducible
+        :return: A list with the segments text and the segments times
+    """
+    generator = random.Random(seed)
+    count = int(minutes * 60 / segment_seconds)
+
+    texts = [create_sentence(generator, 12) for _ in range(count)]
+    times = [[i * segment_seconds, (i + 1) * segment_seconds] for i in range(count)]
+
+    return [texts, times]
+
+def create_queries(count: int, seed: int = 3) -> list[str]:
+    """
+        This function creates questions with words of the synthetic corpus (only words of the
+        corpus, so the lexical gate does not refuse them).
+
+        :param count: An integer representing how many questions are created
+        :param seed: An integer to make the questions reproducible
+        :return: A list of strings
+    """
+    generator = random.Random(seed)
+    return [f"{' '.join(generator.sample(WORDS, 3))}?" for _ in range(count)]
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,234 @@
+# Python libraries
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from langchain_community.vectorstores import FAISS
+
+# Local imports
+from benchmarks.stubs import StubEmbeddings, create_stub_llm, create_pdf_raw_data, create_video_raw_data, create_queries
+from modules.answer_cache import AnswerCache
+from modules.embedd_text import embedding_in_chunks
+from modules.indexing_data import IndexingData
+from modules.lexical_index import BM25Index
+from modules.managers.folder_manager import check_folder_existence
+from modules.managers.string_manager import find_most_similar_substrings, find_best_match_positions
+from modules.tokenize_text import tiktoken_len
+
+BASELINES_PATH = 'benchmarks/baselines'
+
+# Registered benchmarks: name -> (size parameter, setup function)
+BENCHMARKS = {}
+
+def benchmark(name: str, size: str):
+    """
+        This decorator registers a benchmark. The decorated function receives the size of the
+        synthetic corpus, prepares everything that is not measured and returns the function
+        that is measured.
+
+        :param name: A string representing the benchmark name
+        :param size: A string representing the size parameter ('pages' or 'minutes')
+    """
+    def register(setup):
+        BENCHMARKS[name] = (size, setup)
+        return setup
+
+    return register
+
+@benchmark('tiktoken_len', 'pages')
+def bench_tiktoken_len(pages: int):
+    pages_text = create_pdf_raw_data(pages)['pages_text']
+    return lambda: [tiktoken_len(text) for text in pages_text]
+
+@benchmark('embedding_in_chunks.pdf', 'pages')
+def bench_chunks_pdf(pages: int):
+    raw = create_pdf_raw_data(pages)
+    return lambda: embedding_in_chunks({raw['text']: 'pdf'}, raw_data={'pdf': raw})
+
+@benchmark('embedding_in_chunks.video', 'minutes')
+def bench_chunks_video(minutes: int):
+    raw = create_video_raw_data(minutes)
+    text = ''.join(raw[0])
+    return lambda: embedding_in_chunks({text: 'video'}, raw_data={'video': raw})
+
+@benchmark('find_most_similar_substrings', 'pages')
+def bench_most_similar(pages: int):
+    raw = create_pdf_raw_data(pages)
+    chunks = [doc.page_content for doc in embedding_in_chunks({raw['text']: 'pdf'})[:5]]
+    return lambda: [find_most_similar_substrings(chunk, raw['pages_text']) for chunk in chunks]
+
+@benchmark('find_best_match_positions', 'minutes')
+def bench_best_match(minutes: int):
+    raw = create_video_raw_data(minutes)
+    chunks = [doc.page_content for doc in embedding_in_chunks({''.join(raw[0]): 'video'})[:5]]
+    return lambda: [find_best_match_positions(chunk, raw[0]) for chunk in chunks]
+
+@benchmark('faiss.search', 'pages')
+def bench_faiss_search(pages: int):
+    raw = create_pdf_raw_data(pages)
+    texts = [doc.page_content for doc in embedding_in_chunks({raw['text']: 'pdf'})]
+    embeddings = StubEmbeddings()
+
+    library = FAISS.from_embeddings(zip(texts, embeddings.embed_documents(texts)), embeddings)
+    vectors = embeddings.embed_documents(create_queries(100))
+    return lambda: [library.similarity_search_with_score_by_vector(vector, k=5) for vector in vectors]
+
+@benchmark('bm25.search', 'pages')
+def bench_bm25_search(pages: int):
+    raw = create_pdf_raw_data(pages)
+    texts = [doc.page_content for doc in embedding_in_chunks({raw['text']: 'pdf'})]
+
+    index = BM25Index.build([str(i) for i in range(len(texts))], texts)
+    queries = create_queries(100)
+    return lambda: [index.search(query, top_k=5) for query in queries]
+
+@benchmark('retrieve_context', 'pages')
+def bench_retrieve_context(pages: int):
+    raw = create_pdf_raw_data(pages)
+    docs = embedding_in_chunks({raw['text']: 'pdf'}, raw_data={'pdf': raw})
+
+    # Local embeddings and a stub LLM (offline), without the answer cache
+    cache = AnswerCache(max_size=0, similarity=None)
+    index = IndexingData(api_key='stub', embedding_backend='local', llm=create_stub_llm(), answer_cache=cache)
+    index.create_library_from_documents(docs)
+
+    # An empty cache is falsy, so check it was not replaced by the default one (the times would be cache hits)
+    if index.get_answer_cache is not cache:
+        raise ValueError('The retrieve_context benchmark must run without the answer cache.')
+
+    # A high threshold, so every question reaches the LLM
+    queries = create_queries(20)
+    return lambda: [index.retrieve_context(query, {'pdf': raw}, threshold=2.0) for query in queries]
+
+def measure(function, rounds: int, warmup: int = 1) -> dict:
+    """
+        This function runs a function many times and returns statistics of its time.
+
+        :param function: A function without arguments
+        :param rounds: An integer representing how many times the function is measured
+        :param warmup: An integer representing how many times the function runs before measuring
+        :return: A dictionary with the statistics in seconds
+    """
+    for _ in range(warmup):
+        function()
+
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'rounds': rounds,
+        'min': min(times),
+        'max': max(times),
+        'mean': statistics.mean(times),
+        'median': statistics.median(times),
+        'stddev': statistics.stdev(times) if rounds > 1 else 0.0,
+    }
+
+def run(sizes: dict, rounds: int, only: str or None = None) -> dict:
+    """
+        This function runs every registered benchmark with each corpus size.
+
+        :param sizes: A dictionary with the sizes of each size parameter ('pages' and 'minutes')
+        :param rounds: An integer representing how many times each benchmark is measured
+        :param only: A string. If given, only benchmarks with it in the name run
+        :return: A dictionary with 'name[size=value]': statistics
+    """
+    results = {}
+
+    for name, (size, setup) in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+
+        for value in sizes[size]:
+            key = f'{name}[{size}={value}]'
+            results[key] = measure(setup(value), rounds)
+            print(f"{key:>50}: median {results[key]['median'] * 1000:10.2f} ms | "
+                  f"min {results[key]['min'] * 1000:10.2f} ms | stddev {results[key]['stddev'] * 1000:8.2f} ms")
+
+    return results
+
+def save_baseline(name: str, results: dict) -> str:
+    """
+        This function saves the results as a JSON baseline, with the commit and the machine.
+
+        :param name: A string representing the baseline name
+        :param results: A dictionary with the results of `run`
+        :return: A string representing the baseline path
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    check_folder_existence(BASELINES_PATH)
+    path = f'{BASELINES_PATH}/{name}.json'
+
+    with open(path, 'w') as json_file:
+        json.dump({
+            'commit': commit or None,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'results': results,
+        }, json_file, indent=2)
+
+    return path
+
+def compare_baseline(name: str, results: dict, tolerance: float) -> list[str]:
+    """
+        This function compares the results with a saved baseline (median times).
+
+        :param name: A string representing the baseline name
+        :param results: A dictionary with the results of `run`
+        :param tolerance: A float representing how much slower (e.g. 0.2 = 20%) a benchmark can be
+        :return: A list with the names of the benchmarks that regressed
+    """
+    with open(f'{BASELINES_PATH}/{name}.json', 'r') as json_file:
+        baseline = json.load(json_file)
+
+    print(f"\nComparison with {name!r} (commit {baseline.get('commit')}), tolerance {tolerance:.0%}")
+
+    regressions = []
+    for key, stats in results.items():
+        if key not in baseline['results']:
+            print(f'{key:>50}: new benchmark')
+            continue
+
+        ratio = stats['median'] / baseline['results'][key]['median']
+        status = 'REGRESSION' if ratio > 1 + tolerance else ('faster' if ratio < 1 - tolerance else 'same')
+        if status == 'REGRESSION':
+            regressions.append(key)
+
+        print(f'{key:>50}: {ratio:6.2f}x the baseline ({status})')
+
+    return regressions
+
+def parse_sizes(value: str) -> list[int]:
+    return [int(size) for size in value.split(',') if size]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the ingestion and query hot paths (offline).')
+    parser.add_argument('--pages', type=parse_sizes, default=[10, 100], help='PDF sizes, e.g. 10,1000,10000')
+    parser.add_argument('--minutes', type=parse_sizes, default=[1, 30], help='video sizes, e.g. 1,120')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--only', default=None, help='run only the benchmarks with this text in the name')
+    parser.add_argument('--save', default=None, help='save the results as a baseline with this name')
+    parser.add_argument('--compare', default=None, help='compare the results with the baseline with this name')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a regression')
+    args = parser.parse_args()
+
+    results = run({'pages': args.pages, 'minutes': args.minutes}, args.rounds, args.only)
+
+    if args.save:
+        print(f'\nBaseline saved in {save_baseline(args.save, results)}')
+
+    if args.compare and compare_baseline(args.compare, results, args.tolerance):
+        sys.exit(1)
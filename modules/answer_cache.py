@@ -0,0 +1,205 @@
+# Python libraries
+import os
+import re
+import unicodedata
+import numpy as np
+
+from concurrent.futures import Future
+from threading import Lock
+
+# Local imports
+from modules.managers.cache_manager import LRUCache
+
+def normalize_query(query: str) -> str:
+    """
+        This function normalizes a query so small differences (case, accents, spaces and
+        punctuation) do not create different cache entries. For example, 'O que é Python?'
+        and 'o que e python' are the same query.
+
+        :param query: A string representing the user query
+        :return: A string with the normalized query
+    """
+    query = unicodedata.normalize('NFKD', query.casefold())
+    query = ''.join(char for char in query if not unicodedata.combining(char))
+    query = re.sub(r'[^\w\s]', ' ', query)
+
+    return ' '.join(query.split())
+
+class AnswerCache():
+    def __init__(self, max_size: int = 512, ttl: float or None = 3600.0, similarity: float or None = 0.95) -> None:
+        """
+            This class caches the answers of a library in two tiers:
+
+             - exact: the normalized query was already answered
+             - semantic: a query with a similar embedding (cosine similarity above `similarity`)
+             was already answered
+
+            Answers leave the cache when it is full (LRU) or after `ttl` seconds. Every answer is
+            tied to the library generation, so the cache is cleared when the library changes. When
+            the same query is asked at the same time by many users, only one of them calls the
+            library and the others wait for its answer.
+
+            :param max_size: An integer representing how many answers the cache can hold
+            :param ttl: A float representing how many seconds an answer stays in the cache. If not
+            given, answers only leave the cache when it is full
+            :param similarity: A float representing the minimum cosine similarity between query
+            embeddings to reuse an answer. If not given, only the exact tier is used
+        """
+        self.__answers = LRUCache(max_size=max_size, ttl=ttl)
+        self.__similarity = similarity
+        self.__generation = None
+
+        # Queries being answered right now (key: Future)
+        self.__in_flight = {}
+        self.__lock = Lock()
+
+    def __check_generation(self, generation: int):
+        """
+            This method clears the cache if the library changed since the answers were cached.
+
+            :param generation: An integer representing the current library generation
+        """
+        with self.__lock:
+            if self.__generation != generation:
+                self.__answers.clear()
+                self.__generation = generation
+
+    def __search_similar(self, key: tuple, vector: np.ndarray) -> dict or None:
+        """
+            This method searches the answer of the most similar cached query (same threshold).
+
+            :param key: The exact key of the query (threshold, normalized query)
+            :param vector: A NumPy array with the normalized query embedding
+            :return: A dictionary with the answer or None if no query is similar enough
+        """
+        candidates = [(entry['vector'], entry['answer']) for (threshold, _), entry in self.__answers.items()
+                      if threshold == key[0] and entry['vector'] is not None]
+
+        if not candidates:
+            return None
+
+        similarities = np.stack([vector for vector, _ in candidates]) @ vector
+        best = int(np.argmax(similarities))
+
+        return candidates[best][1] if similarities[best] >= self.__similarity else None
+
+    def lookup(self, query: str, threshold: float, generation: int, embed=None) -> dict or None:
+        """
+            This method returns the cached answer of a query, if there is one.
+
+            :param query: A string representing the user query
+            :param threshold: A float representing the threshold used to answer the query
+            :param generation: An integer representing the current library generation
+            :param embed: A function that returns the embedding of a query. If not given, only the
+            exact tier is used
+            :return: A dictionary with the answer or None
+        """
+        self.__check_generation(generation)
+        key = (threshold, normalize_query(query))
+
+        entry = self.__answers.get(key)
+        if entry is not None:
+            return {**entry['answer'], 'query': query}
+
+        if embed is None or self.__similarity is None:
+            return None
+
+        answer = self.__search_similar(key, self.__normalize(embed(query)))
+
+        return {**answer, 'query': query} if answer is not None else None
+
+    def store(self, query: str, threshold: float, generation: int, answer: dict, embed=None):
+        """
+            This method caches the answer of a query.
+
+            :param query: A string representing the user query
+            :param threshold: A float representing the threshold used to answer the query
+            :param generation: An integer representing the library generation used to answer it
+            :param answer: A dictionary with the answer
+            :param embed: A function that returns the embedding of a query (for the semantic tier)
+        """
+        with self.__lock:
+            # The library changed while the answer was created
+            if self.__generation != generation:
+                return
+
+        vector = self.__normalize(embed(query)) if embed is not None and self.__similarity is not None else None
+        self.__answers.put((threshold, normalize_query(query)), {'answer': answer, 'vector': vector})
+
+    def get_or_compute(self, query: str, threshold: float, generation: int, compute, embed=None) -> dict:
+        """
+            This method returns the cached answer of a query or computes it. Identical queries
+            computed at the same time share the same call.
+
+            :param query: A string representing the user query
+            :param threshold: A float representing the threshold used to answer the query
+            :param generation: An integer representing the current library generation
+            :param compute: A function without arguments that returns the answer dictionary
+            :param embed: A function that returns the embedding of a query (for the semantic tier)
+            :return: A dictionary with the answer
+        """
+        answer = self.lookup(query, threshold, generation, embed=embed)
+        if answer is not None:
+            return answer
+
+        key = (generation, threshold, normalize_query(query))
+
+        with self.__lock:
+            future = self.__in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.__in_flight[key] = Future()
+
+        # Another request is answering the same query
+        if not owner:
+            return {**future.result(), 'query': query}
+
+        try:
+            answer = compute()
+            self.store(query, threshold, generation, answer, embed=embed)
+            future.set_result(answer)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                self.__in_flight.pop(key, None)
+
+        return answer
+
+    def clear(self):
+        """
+            This method removes every answer from the cache.
+        """
+        self.__answers.clear()
+
+    def __normalize(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+
+        return vector / norm if norm else vector
+
+    def __len__(self) -> int:
+        return len(self.__answers)
+
+def create_answer_cache() -> AnswerCache:
+    """
+        This function creates an AnswerCache configured by the 'ANSWER_CACHE_SIZE',
+        'ANSWER_CACHE_TTL' and 'ANSWER_CACHE_SIMILARITY' environment variables.
+        A TTL of 0 keeps the answers until the cache is full and a similarity of 0
+        disables the semantic tier.
+
+        :return: An AnswerCache object
+    """
+    ttl = float(os.getenv('ANSWER_CACHE_TTL', 3600))
+    similarity = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+
+    return AnswerCache(
+        max_size=int(os.getenv('ANSWER_CACHE_SIZE', 512)),
+        ttl=ttl or None,
+        similarity=similarity or None,
+    )
+
+
+if __name__ == '__main__':
+    pass
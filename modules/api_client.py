@@ -0,0 +1,109 @@
+# Python libraries
+import os
+import time
+import requests
+
+# Local imports
+from modules.indexing_data import StreamingAnswer
+
+# The answer of `POST /chat/stream` starts before it is generated (the status is always 200), so an
+# error while generating it is sent as the last piece, starting with this marker
+STREAM_ERROR_MARKER = '\n[ERROR] '
+
+class ApiClient():
+    def __init__(self, base_url: str, timeout: tuple = (5, 300), poll_interval: float = 1.0) -> None:
+        """
+            This class is a client of the HTTP API (see api.py), so the StreamLit app can only show
+            the answers while the libraries, the searches and the ingestion run in the service.
+
+            :param base_url: A string representing the service URL (e.g. 'http://127.0.0.1:8000')
+            :param timeout: A tuple with the connect and read timeouts in seconds
+            :param poll_interval: A float representing the seconds between ingestion status checks
+        """
+        self.__base_url = base_url.rstrip('/')
+        self.__timeout = timeout
+        self.__poll_interval = poll_interval
+        self.__session = requests.Session()
+
+    def __check(self, response: requests.Response):
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('detail')
+            except ValueError:
+                detail = response.text
+            raise ValueError(f'The API answered {response.status_code}: {detail}')
+
+    def stream_answer(self, query: str, threshold: float = 0.4, library_id: str or None = None) -> StreamingAnswer:
+        """
+            This method asks a question to the service and returns the answer while it is generated.
+
+            :param query: A string representing the user query
+            :param threshold: A float representing the similarity threshold
+            :param library_id: A string representing the library ID (None for the default library)
+            :return: A StreamingAnswer that yields the response pieces. It raises a ValueError if the
+            service fails while generating the answer
+        """
+        def pieces():
+            with self.__session.post(
+                f'{self.__base_url}/chat/stream', json={'query': query, 'threshold': threshold, 'library_id': library_id},
+                timeout=self.__timeout, stream=True
+            ) as response:
+                self.__check(response)
+                response.encoding = 'utf-8'
+
+                for piece in response.iter_content(chunk_size=None, decode_unicode=True):
+                    if piece.startswith(STREAM_ERROR_MARKER):
+                        raise ValueError(f'The API failed while answering: {piece[len(STREAM_ERROR_MARKER):]}')
+                    if piece:
+                        yield piece
+
+        return StreamingAnswer(query, pieces())
+
+    def ingest(self, txt_url: str, pdf_url: str, video_url: str, on_progress=None) -> str:
+        """
+            This method starts the ingestion of the three sources in the service and waits for it.
+
+            :param txt_url: A string representing the text GitHub URL
+            :param pdf_url: A string representing the PDF GitHub URL
+            :param video_url: A string representing the video GitHub URL
+            :param on_progress: A function called as `on_progress(source, stage, status, seconds)`
+            for each new event of the job
+            :return: A string representing the ID of the new library
+        """
+        response = self.__session.post(
+            f'{self.__base_url}/ingest', json={'txt_url': txt_url, 'pdf_url': pdf_url, 'video_url': video_url},
+            timeout=self.__timeout
+        )
+        self.__check(response)
+        job_id = response.json()['job_id']
+
+        seen = 0
+        while True:
+            response = self.__session.get(f'{self.__base_url}/ingest/{job_id}', timeout=self.__timeout)
+            self.__check(response)
+            status = response.json()
+
+            if on_progress is not None:
+                for event in status['events'][seen:]:
+                    on_progress(event['source'], event['stage'], event['status'], event['seconds'])
+            seen = len(status['events'])
+
+            if status['status'] == 'done':
+                return status['library_id']
+            if status['status'] == 'failed':
+                raise ValueError(status['error'])
+
+            time.sleep(self.__poll_interval)
+
+def create_api_client() -> ApiClient or None:
+    """
+        This function creates a client of the HTTP API if the 'API_URL' environment variable is set.
+
+        :return: An ApiClient object or None (the app runs the libraries itself)
+    """
+    url = os.getenv('API_URL')
+    return ApiClient(url) if url else None
+
+
+if __name__ == '__main__':
+    pass
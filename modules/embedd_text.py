@@ -1,41 +1,139 @@
 # Python libraries
-from uuid import uuid4
+import hashlib
+
+from collections import Counter
 from langchain.docstore.document import Document
 
 # Local imports
-from modules.tokenize_text import create_text_splitter
+from modules.tokenize_text import create_token_splitter
+from modules.managers.string_manager import build_offset_index, find_offset_span
+
+def chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """
+        This function creates a stable ID for a chunk derived from its content. The
+        same text in the same source always has the same ID, so a source can be
+        processed again and only the chunks that changed are replaced.
 
-def embedding_in_chunks(data: dict) -> list[Document]:
+        :param source: A string representing the source the chunk belongs to
+        :param text: The chunk text
+        :param occurrence: An integer representing how many times the same text
+        appeared before in the source
+        :return: A string with 32 hexadecimal characters
+    """
+    return hashlib.sha256(f'{source}\0{occurrence}\0{text}'.encode('utf-8')).hexdigest()[:32]
+
+def embedding_in_chunks(data: dict, raw_data: dict or None = None, source: str or None = None) -> list[Document]:
     """
         This function receives a data in dictionary format with
         txt and type for key:value. Then, the function will split the
         text using tokenization with 500 tokens and add into chunks in
         a Document format for Langchain processing.
 
+        If the raw data is given, the PDF page span and the video time span
+        of each chunk are saved in the metadata, so there is no need to
+        search them on each query.
+
         :param data: A dictionary with all key:value for chunks
+        :param raw_data: A dictionary with the raw data of each type ('pdf' with
+        'pages_text' and 'video' with the transcription segments)
+        :param source: A string representing the source of the chunks. If not
+        given, the type of each text is used
         :return: A list with Langchain's Document objects with page content
-        (splitted text) and metadata with 'id' (uuid4 string), 'type' (str),
-        and 'chunk' (int)
+        (splitted text) and metadata with 'id' (string derived from the content),
+        'source' (str), 'type' (str), 'chunk' (int), 'start_index' and 'end_index'
+        (int, character offsets) and
+        'page_start' and 'page_end' (int, only for PDF) and 'time_start' and
+        'time_end' (float seconds, only for video)
     """
     # Create chunks list to return
     chunks = []
 
     # Create a text splitter based on tokens size (chunks)
-    text_splitter = create_text_splitter()
+    text_splitter = create_token_splitter()
+
+    # Split all texts based on tokens (tokenized together in one batch)
+    splitted = text_splitter.split_texts_with_offsets(list(data.keys()))
+
+    # Append each text chunks
+    for (txt, type), text_chunks in zip(data.items(), splitted):
+        chunk_source = source or type
+        occurrences = Counter()
+
+        # Index with the character offset of each PDF page or video segment. It is only
+        # valid if the text is exactly the pages/segments joined together
+        page_offsets, segment_offsets = None, None
+        if type == 'pdf' and raw_data and 'pdf' in raw_data:
+            if ''.join(raw_data['pdf']['pages_text']) == txt:
+                page_offsets = build_offset_index(raw_data['pdf']['pages_text'])
+
+        elif type == 'video' and raw_data and 'video' in raw_data:
+            segments = raw_data['video']
+            if ''.join(segments[0]) == txt:
+                segment_offsets = build_offset_index(segments[0])
+
+        documents = []
+        for i, (text_chunk, start, end) in enumerate(text_chunks):
+            metadata = {
+                'id': chunk_id(chunk_source, text_chunk, occurrences[text_chunk]),
+                'source': chunk_source,
+                'type': type,
+                'chunk': i + len(chunks),
+                'start_index': start,
+                'end_index': end,
+            }
 
-    # Split the text and append in chunk
-    for txt, type in data.items():
-        # Split text based on tokens
-        texts = text_splitter.split_text(txt)
+            if page_offsets:
+                metadata['page_start'], metadata['page_end'] = find_offset_span(page_offsets, start, end)
+
+            if segment_offsets:
+                first, last = find_offset_span(segment_offsets, start, end)
+                metadata['time_start'] = float(segments[1][first][0])
+                metadata['time_end'] = float(segments[1][last][1])
+
+            documents.append(Document(page_content=text_chunk, metadata=metadata))
+            occurrences[text_chunk] += 1
+
+        chunks.extend(documents)
+
+    return chunks
+
+def embedding_in_pages(pages, type: str = 'pdf', source: str or None = None) -> list[Document]:
+    """
+        This function receives the pages of a document as an iterable (e.g. a
+        generator extracting them) and splits them in chunks with 500 tokens,
+        as if the pages were one text. The pages are consumed one by one, so
+        the whole document is never in memory. The page span of each chunk is
+        saved in the metadata.
+
+        :param pages: An iterable with the text of each page
+        :param type: A string representing the type of the document
+        :param source: A string representing the source of the chunks. If not
+        given, the type is used
+        :return: A list with Langchain's Document objects with page content
+        (splitted text) and metadata with 'id' (string derived from the content),
+        'source' (str), 'type' (str), 'chunk' (int) and 'page_start' and
+        'page_end' (int)
+    """
+    chunks = []
+    source = source or type
+    occurrences = Counter()
+
+    # Create a text splitter based on tokens size (chunks)
+    text_splitter = create_token_splitter()
 
-        chunks.extend([Document(
-            page_content=texts[i],
+    for text_chunk, page_start, page_end in text_splitter.split_stream(pages):
+        chunks.append(Document(
+            page_content=text_chunk,
             metadata={
-                'id': str(uuid4()),
+                'id': chunk_id(source, text_chunk, occurrences[text_chunk]),
+                'source': source,
                 'type': type,
-                'chunk': i + len(chunks)
+                'chunk': len(chunks),
+                'page_start': page_start,
+                'page_end': page_end,
             }
-        ) for i in range(len(texts))])
+        ))
+        occurrences[text_chunk] += 1
 
     return chunks
 
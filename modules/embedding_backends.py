@@ -0,0 +1,269 @@
+# Python libraries
+import os
+import re
+import zlib
+import unicodedata
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+# Local imports
+from modules.managers.folder_manager import check_folder_existence, temp_file_path
+
+# Embedding backends a library can use
+#  - 'openai': OpenAI embeddings API (network), cached in the embedding store
+#  - 'local': hashed TF-IDF projected with SVD (NumPy, CPU only, works offline)
+EMBEDDING_BACKENDS = ['openai', 'local']
+
+LOCAL_EMBEDDINGS_NAME = 'local_embeddings.npz'
+
+def default_embedding_backend() -> str:
+    """
+        This function returns the backend used by new libraries, set by the 'EMBEDDING_BACKEND'
+        environment variable (default 'openai').
+
+        :return: A string representing the backend
+    """
+    return os.getenv('EMBEDDING_BACKEND', 'openai').lower()
+
+def tokenize(text: str, bigrams: bool = True) -> list[str]:
+    """
+        This function splits a text in lowercase words without accents and adds the
+        pairs of consecutive words (bigrams).
+
+        :param text: A string
+        :param bigrams: A boolean indicating if the bigrams are added
+        :return: A list of strings with the words and bigrams
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    words = re.findall(r'\w+', ''.join(char for char in text if not unicodedata.combining(char)))
+
+    if not bigrams:
+        return words
+
+    return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+def segment_sum(keys: np.ndarray, values: np.ndarray, indexes: np.ndarray, dense: np.ndarray, size: int,
+                block_size: int = 65_536) -> np.ndarray:
+    """
+        This function multiplies a sparse matrix (one value per key/index pair) by a dense matrix,
+        adding the rows of `dense` weighted by the values for each key. The keys must be sorted.
+        The pairs are processed in blocks to keep the memory low.
+
+        :param keys: A NumPy array with the (sorted) output row of each value
+        :param values: A NumPy array with the sparse values
+        :param indexes: A NumPy array with the dense row multiplied by each value
+        :param dense: A NumPy matrix
+        :param size: An integer representing how many rows the result has
+        :param block_size: An integer representing how many pairs are processed at once
+        :return: A NumPy float32 matrix with `size` rows
+    """
+    result = np.zeros((size, dense.shape[1]), dtype=np.float32)
+
+    for start in range(0, len(keys), block_size):
+        block_keys = keys[start:start + block_size]
+        products = values[start:start + block_size, None] * dense[indexes[start:start + block_size]]
+
+        # Where each key starts in the block
+        boundaries = np.flatnonzero(np.r_[True, block_keys[1:] != block_keys[:-1]])
+        result[block_keys[boundaries]] += np.add.reduceat(products, boundaries, axis=0)
+
+    return result
+
+class LocalEmbeddings(Embeddings):
+    def __init__(self, dimension: int = 256, n_features: int = 2 ** 18, min_df: int = 2, seed: int = 0) -> None:
+        """
+            This class is a local embedding model that runs on CPU without network. Words and
+            bigrams are hashed in `n_features` columns and weighted by TF-IDF, then the vectors are
+            projected to `dimension` values with a truncated SVD (Latent Semantic Analysis). The
+            TF-IDF matrix is kept sparse, so big libraries fit in memory.
+
+            The model must be fitted with the chunks of the library (`fit`) before embedding, and
+            it is saved with the library, so queries use the same projection.
+
+            :param dimension: An integer representing the size of the embeddings
+            :param n_features: An integer representing how many hash columns are used
+            :param min_df: An integer representing in how many chunks a word must appear to be used
+            :param seed: An integer to make the SVD reproducible
+        """
+        self.__dimension = dimension
+        self.__n_features = n_features
+        self.__min_df = min_df
+        self.__seed = seed
+
+        # Only the hash columns kept when fitting are used
+        self.__columns, self.__idf, self.__components = None, None, None
+
+    def __hashed_counts(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            This method counts the hashed words of each text.
+
+            :param texts: A list of strings
+            :return: A tuple with the row, the hash column and the count of each (text, word) pair,
+            sorted by row
+        """
+        rows, columns = [], []
+        for row, text in enumerate(texts):
+            hashes = [zlib.crc32(token.encode('utf-8')) % self.__n_features for token in tokenize(text)]
+            rows.extend([row] * len(hashes))
+            columns.extend(hashes)
+
+        pairs = np.asarray(rows, dtype=np.int64) * self.__n_features + np.asarray(columns, dtype=np.int64)
+        pairs, counts = np.unique(pairs, return_counts=True)
+
+        return pairs // self.__n_features, pairs % self.__n_features, counts
+
+    def __tfidf(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            This method creates the normalized TF-IDF matrix of texts with the fitted columns, in
+            sparse format. Words that are not in the fitted columns are ignored.
+
+            :param texts: A list of strings
+            :return: A tuple with the row, the column position and the value of each non-zero entry,
+            sorted by row
+        """
+        rows, hashes, counts = self.__hashed_counts(texts)
+
+        positions = np.minimum(np.searchsorted(self.__columns, hashes), len(self.__columns) - 1)
+        known = self.__columns[positions] == hashes
+        rows, positions = rows[known], positions[known]
+
+        values = ((1 + np.log(counts[known])) * self.__idf[positions]).astype(np.float32)
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+
+        return rows, positions, values / norms[rows]
+
+    def fit(self, texts: list[str]) -> 'LocalEmbeddings':
+        """
+            This method learns the IDF weights and the SVD projection from the chunks of a library.
+
+            :param texts: A list of strings (chunks)
+            :return: The fitted LocalEmbeddings object
+        """
+        rows, hashes, _ = self.__hashed_counts(texts)
+
+        if not len(hashes):
+            raise ValueError('Not possible to fit the local embeddings without words.')
+
+        # Document frequency of each hash column, rare words are removed (if others remain)
+        columns, document_frequency = np.unique(hashes, return_counts=True)
+        frequent = document_frequency >= self.__min_df
+        if frequent.any():
+            columns, document_frequency = columns[frequent], document_frequency[frequent]
+
+        self.__columns = columns
+        self.__idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.__components = self.__truncated_svd(*self.__tfidf(texts), len(texts))
+
+        return self
+
+    def __truncated_svd(self, rows: np.ndarray, positions: np.ndarray, values: np.ndarray, n_rows: int) -> np.ndarray:
+        """
+            This method calculates the first right singular vectors of the sparse TF-IDF matrix with
+            a randomized SVD (a few sparse matrix products instead of the full decomposition).
+
+            :param rows: A NumPy array with the row of each non-zero entry (sorted)
+            :param positions: A NumPy array with the column position of each non-zero entry
+            :param values: A NumPy array with the value of each non-zero entry
+            :param n_rows: An integer representing how many rows (chunks) the matrix has
+            :return: A NumPy float32 matrix (columns x dimension) that projects the TF-IDF vectors
+        """
+        n_columns = len(self.__columns)
+        rank = min(self.__dimension, n_rows, n_columns)
+
+        # The transposed matrix is the same entries sorted by column
+        order = np.argsort(positions, kind='stable')
+        t_rows, t_positions, t_values = positions[order], rows[order], values[order]
+
+        def dot(dense):
+            return segment_sum(rows, values, positions, dense, n_rows)
+
+        def transposed_dot(dense):
+            return segment_sum(t_rows, t_values, t_positions, dense, n_columns)
+
+        generator = np.random.default_rng(self.__seed)
+        sample = dot(generator.standard_normal((n_columns, min(rank + 10, n_rows)), dtype=np.float32))
+
+        # Power iterations make the small singular values less important
+        for _ in range(2):
+            sample, _ = np.linalg.qr(sample)
+            sample = dot(transposed_dot(sample))
+
+        basis, _ = np.linalg.qr(sample)
+        _, _, vt = np.linalg.svd(transposed_dot(basis).T, full_matrices=False)
+
+        return np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+
+    def __embed(self, texts: list[str]) -> list[list[float]]:
+        if not self.is_fitted:
+            raise ValueError('The local embeddings must be fitted with the library chunks before embedding.')
+
+        rows, positions, values = self.__tfidf(texts)
+        vectors = segment_sum(rows, values, positions, self.__components, len(texts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        return (vectors / np.where(norms == 0, 1, norms)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+            This method embeds a list of texts.
+
+            :param texts: A list of strings
+            :return: A list of embeddings in the same order of the texts
+        """
+        return self.__embed(texts) if texts else []
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+            This method embeds a query.
+
+            :param text: A string
+            :return: A list of floats representing the embedding
+        """
+        return self.__embed([text])[0]
+
+    def save(self, path: str):
+        """
+            This method saves the fitted model in a library folder (NumPy arrays, without pickle).
+
+            :param path: A string representing where the library is saved
+        """
+        check_folder_existence(path)
+        temp_path = temp_file_path(os.path.join(path, LOCAL_EMBEDDINGS_NAME))
+
+        with open(temp_path, 'wb') as file:
+            np.savez(
+                file, columns=self.__columns, idf=self.__idf, components=self.__components,
+                config=np.asarray([self.__dimension, self.__n_features, self.__min_df, self.__seed], dtype=np.int64)
+            )
+
+        os.replace(temp_path, os.path.join(path, LOCAL_EMBEDDINGS_NAME))
+
+    @classmethod
+    def load(cls, path: str) -> 'LocalEmbeddings':
+        """
+            This method loads a model saved in a library folder.
+
+            :param path: A string representing where the library is saved
+            :return: A fitted LocalEmbeddings object
+        """
+        with np.load(os.path.join(path, LOCAL_EMBEDDINGS_NAME), allow_pickle=False) as arrays:
+            dimension, n_features, min_df, seed = arrays['config'].tolist()
+            embeddings = cls(dimension=dimension, n_features=n_features, min_df=min_df, seed=seed)
+            embeddings.__columns = arrays['columns']
+            embeddings.__idf = arrays['idf']
+            embeddings.__components = arrays['components']
+
+        return embeddings
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.__components is not None
+
+    @property
+    def get_model_name(self) -> str:
+        return f'local-tfidf-svd-{self.__dimension}'
+
+
+if __name__ == '__main__':
+    pass
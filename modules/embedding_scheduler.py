@@ -0,0 +1,233 @@
+# Python libraries
+import os
+import random
+import asyncio
+import openai
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Local imports
+from modules.tokenize_text import get_encoder
+
+# Errors that are worth trying again (rate limit, network and server errors)
+RETRY_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+def create_batches(items: dict, max_tokens: int, max_size: int, encoding_name: str = 'cl100k_base') -> list[dict]:
+    """
+        This function groups texts in batches that fit in a token budget, keeping the
+        order of the texts. A text bigger than the budget is sent alone.
+
+        :param items: A dictionary with key:text
+        :param max_tokens: An integer representing the maximum number of tokens of a batch
+        :param max_size: An integer representing the maximum number of texts of a batch
+        :param encoding_name: A string representing the tiktoken encoding of the embedding model
+        :return: A list of dictionaries with key:text
+    """
+    keys = list(items.keys())
+    lengths = [len(tokens) for tokens in get_encoder(encoding_name).encode_batch(list(items.values()), disallowed_special=())]
+
+    batches, batch, batch_tokens = [], {}, 0
+    for key, length in zip(keys, lengths):
+        if batch and (batch_tokens + length > max_tokens or len(batch) >= max_size):
+            batches.append(batch)
+            batch, batch_tokens = {}, 0
+
+        batch[key] = items[key]
+        batch_tokens += length
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+class EmbeddingScheduler():
+    def __init__(self, api_key: str, model: str = 'text-embedding-ada-002', base_url: str or None = None,
+                 max_batch_tokens: int = 50_000, max_batch_size: int = 2048, concurrency: int = 4,
+                 max_retries: int = 8, backoff_factor: float = 1.0, max_backoff: float = 60.0,
+                 timeout: float = 60.0) -> None:
+        """
+            This class embeds many texts with concurrent requests to the OpenAI embeddings API.
+            The texts are grouped in batches by a token budget and at most `concurrency` batches are
+            sent at the same time (asyncio).
+
+            When the API answers with a rate limit (429), every request waits (the 'Retry-After'
+            header or an exponential backoff with jitter) and the number of concurrent requests is
+            halved. It grows back by one after each successful batch. Each finished batch is given
+            to a callback, so it can be saved (checkpoint) before the next ones finish: if the
+            embedding fails, a retry only sends the batches that were not saved.
+
+            :param api_key: A string representing the OpenAI API key
+            :param model: A string representing the embedding model
+            :param base_url: A string representing the API URL. If not given, the 'OPENAI_BASE_URL'
+            environment variable or the OpenAI URL is used (a local fake server can be used in tests)
+            :param max_batch_tokens: An integer representing the maximum number of tokens of a request
+            :param max_batch_size: An integer representing the maximum number of texts of a request
+            :param concurrency: An integer representing the maximum number of requests at the same time
+            :param max_retries: An integer representing how many times a batch is retried
+            :param backoff_factor: A float used to calculate the wait between retries
+            :param max_backoff: A float representing the maximum wait between retries in seconds
+            :param timeout: A float representing the timeout of each request in seconds
+        """
+        self.__api_key = api_key
+        self.__model = model
+        self.__base_url = base_url
+        self.__max_batch_tokens = max_batch_tokens
+        self.__max_batch_size = max_batch_size
+        self.__concurrency = max(1, concurrency)
+        self.__max_retries = max_retries
+        self.__backoff_factor = backoff_factor
+        self.__max_backoff = max_backoff
+        self.__timeout = timeout
+
+    def __backoff(self, attempt: int, error: Exception) -> float:
+        """
+            This method calculates how long to wait before retrying a batch.
+
+            :param attempt: An integer representing how many times the batch failed
+            :param error: The error returned by the API
+            :return: A float representing the seconds to wait
+        """
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+
+        try:
+            return min(float(retry_after), self.__max_backoff)
+        except (TypeError, ValueError):
+            # Exponential backoff with full jitter
+            return random.uniform(0, min(self.__backoff_factor * 2 ** attempt, self.__max_backoff))
+
+    async def __run(self, batches: list[dict], on_batch) -> dict:
+        """
+            This method sends all batches with bounded (and adaptive) concurrency.
+
+            :param batches: A list of dictionaries with key:text
+            :param on_batch: A function called with a dictionary key:vector when a batch finishes
+            :return: A dictionary with key:vector
+        """
+        queue = asyncio.Queue()
+        for batch in batches:
+            queue.put_nowait(batch)
+
+        vectors = {}
+        loop = asyncio.get_running_loop()
+
+        # Shared by all workers: how many requests can run and until when everybody waits
+        state = {'limit': self.__concurrency, 'active': 0, 'resume_at': 0.0}
+        condition = asyncio.Condition()
+
+        async def request(client: openai.AsyncOpenAI, batch: dict) -> dict:
+            for attempt in range(self.__max_retries + 1):
+                # Wait for the rate limit pause and for a free request slot
+                while (delay := state['resume_at'] - loop.time()) > 0:
+                    await asyncio.sleep(delay)
+
+                async with condition:
+                    await condition.wait_for(lambda: state['active'] < state['limit'])
+                    state['active'] += 1
+
+                try:
+                    response = await client.embeddings.create(
+                        model=self.__model, input=list(batch.values()), encoding_format='float'
+                    )
+                except RETRY_ERRORS as e:
+                    if attempt == self.__max_retries:
+                        raise
+
+                    wait = self.__backoff(attempt, e)
+                    if isinstance(e, openai.RateLimitError):
+                        state['limit'] = max(1, state['limit'] // 2)
+                        state['resume_at'] = max(state['resume_at'], loop.time() + wait)
+                    else:
+                        await asyncio.sleep(wait)
+                    continue
+                finally:
+                    async with condition:
+                        state['active'] -= 1
+                        condition.notify_all()
+
+                async with condition:
+                    state['limit'] = min(self.__concurrency, state['limit'] + 1)
+                    condition.notify_all()
+
+                data = sorted(response.data, key=lambda item: item.index)
+                return dict(zip(batch.keys(), [item.embedding for item in data]))
+
+        async def worker(client: openai.AsyncOpenAI):
+            while not queue.empty():
+                batch = queue.get_nowait()
+                result = await request(client, batch)
+
+                # Checkpoint the batch before the next one
+                if on_batch:
+                    on_batch(result)
+                vectors.update(result)
+
+        async with openai.AsyncOpenAI(api_key=self.__api_key, base_url=self.__base_url,
+                                      timeout=self.__timeout, max_retries=0) as client:
+            workers = [asyncio.create_task(worker(client)) for _ in range(min(self.__concurrency, len(batches)))]
+
+            try:
+                await asyncio.gather(*workers)
+            except Exception:
+                for task in workers:
+                    task.cancel()
+                raise
+
+        return vectors
+
+    async def aembed(self, items: dict, on_batch=None) -> dict:
+        """
+            This method embeds texts asynchronously.
+
+            :param items: A dictionary with key:text
+            :param on_batch: A function called with a dictionary key:vector when a batch finishes
+            :return: A dictionary with key:vector
+        """
+        if not items:
+            return {}
+
+        batches = create_batches(items, self.__max_batch_tokens, self.__max_batch_size)
+
+        return await self.__run(batches, on_batch)
+
+    def embed(self, items: dict, on_batch=None) -> dict:
+        """
+            This method embeds texts, blocking until all batches finish. It can be called from
+            any thread, even one with a running event loop.
+
+            :param items: A dictionary with key:text
+            :param on_batch: A function called with a dictionary key:vector when a batch finishes
+            :return: A dictionary with key:vector
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aembed(items, on_batch))
+
+        # An event loop is already running in this thread, so a new one runs in another thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.aembed(items, on_batch)).result()
+
+    @property
+    def get_model(self) -> str:
+        return self.__model
+
+def create_embedding_scheduler(api_key: str, model: str = 'text-embedding-ada-002') -> EmbeddingScheduler:
+    """
+        This function creates an EmbeddingScheduler configured by the 'EMBEDDING_CONCURRENCY' and
+        'EMBEDDING_BATCH_TOKENS' environment variables.
+
+        :param api_key: A string representing the OpenAI API key
+        :param model: A string representing the embedding model
+        :return: An EmbeddingScheduler object
+    """
+    return EmbeddingScheduler(
+        api_key=api_key,
+        model=model,
+        concurrency=int(os.getenv('EMBEDDING_CONCURRENCY', 4)),
+        max_batch_tokens=int(os.getenv('EMBEDDING_BATCH_TOKENS', 50_000)),
+    )
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,154 @@
+# Python libraries
+import hashlib
+import sqlite3
+import numpy as np
+
+from threading import Lock
+from langchain_core.embeddings import Embeddings
+
+# Local imports
+from modules.managers.folder_manager import check_folder_existence
+
+DEFAULT_STORE_PATH = 'data/cache/embeddings.sqlite'
+
+def embedding_key(text: str, model_name: str) -> str:
+    """
+        This function creates the content address of an embedding. The same text
+        embedded by the same model always has the same key.
+
+        :param text: A string representing the embedded text
+        :param model_name: A string representing the embedding model
+        :return: A SHA-256 hex digest
+    """
+    return hashlib.sha256(f'{model_name}\0{text}'.encode('utf-8')).hexdigest()
+
+class EmbeddingStore():
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        """
+            This class is an on-disk (SQLite) store of embeddings keyed by the hash of the
+            text and the model name. Vectors are saved as float32 bytes.
+
+            :param path: A string representing where the SQLite file is saved
+        """
+        max_char = path.rfind('/')
+        if max_char > 0:
+            check_folder_existence(path[:max_char])
+
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.__lock, self.__connection:
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)'
+            )
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+            This method returns all stored vectors for the given keys. Keys not stored are
+            not present in the returned dictionary.
+
+            :param keys: A list of embedding keys
+            :return: A dictionary with key:vector (list of floats)
+        """
+        found = {}
+        keys = list(set(keys))
+
+        # SQLite limits how many variables a query can have
+        with self.__lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self.__connection.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(batch))})',
+                    batch
+                ).fetchall()
+
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+        return found
+
+    def put_many(self, items: dict):
+        """
+            This method saves vectors in the store.
+
+            :param items: A dictionary with key:vector (list of floats)
+        """
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)', rows
+            )
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model_name: str or None = None,
+                 scheduler=None) -> None:
+        """
+            This class wraps a LangChain embeddings object and saves every document embedding
+            in an EmbeddingStore. Only texts not yet in the store are sent to the embedding
+            backend, so processing the same material again costs almost no API calls.
+
+            :param embeddings: A LangChain Embeddings object (e.g. OpenAIEmbeddings)
+            :param store: An EmbeddingStore where the vectors are saved
+            :param model_name: A string representing the embedding model. If not given, the
+            `model` attribute of the embeddings object is used
+            :param scheduler: An EmbeddingScheduler used to embed the missing texts with concurrent
+            requests. Each finished batch is saved in the store at once, so a failed embedding
+            resumes from the saved batches. If not given, the embeddings object is used
+        """
+        self.__embeddings = embeddings
+        self.__store = store
+        self.__scheduler = scheduler
+        self.__model_name = model_name or getattr(embeddings, 'model', type(embeddings).__name__)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+            This method embeds a list of texts, sending to the backend only the texts not
+            found in the store.
+
+            :param texts: A list of strings
+            :return: A list of embeddings in the same order of the texts
+        """
+        keys = [embedding_key(text, self.__model_name) for text in texts]
+        vectors = self.__store.get_many(keys)
+
+        # Embed only texts missing in the store (each unique text once)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing[key] = text
+
+        if missing and self.__scheduler:
+            # Each batch is saved in the store when it finishes (checkpoint)
+            vectors.update(self.__scheduler.embed(missing, on_batch=self.__store.put_many))
+
+        elif missing:
+            new_vectors = self.__embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), new_vectors))
+
+            self.__store.put_many(new_items)
+            vectors.update(new_items)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+            This method embeds a query. Queries are not saved in the store.
+
+            :param text: A string
+            :return: A list of floats representing the embedding
+        """
+        return self.__embeddings.embed_query(text)
+
+    @property
+    def get_model_name(self) -> str:
+        return self.__model_name
+
+
+if __name__ == '__main__':
+    pass
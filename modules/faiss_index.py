@@ -0,0 +1,139 @@
+# Python libraries
+import faiss
+import numpy as np
+
+class IndexSpec():
+    def __init__(self, factory: str = 'Flat', nprobe: int or None = None, ef_search: int or None = None,
+                 train_size: int or None = None) -> None:
+        """
+            This class describes which FAISS index a library uses. The `factory` string follows the
+            FAISS index factory, for example:
+
+             - 'Flat' -> exact search (LangChain's default), time grows linearly with the chunks
+             - 'IVF1024,Flat' -> inverted lists, searches only `nprobe` of the 1024 clusters
+             - 'HNSW32' -> graph search with 32 neighbors per node, tuned by `ef_search`
+             - 'IVF4096,PQ32' -> inverted lists with vectors compressed to 32 bytes
+
+            :param factory: A string with the FAISS index factory description
+            :param nprobe: An integer representing how many clusters an IVF index searches
+            :param ef_search: An integer representing the size of the HNSW search queue
+            :param train_size: An integer representing the maximum number of vectors used to train
+            the index. If not given, all vectors are used
+        """
+        self.factory = factory
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_size = train_size
+
+    @classmethod
+    def from_value(cls, value) -> 'IndexSpec':
+        """
+            This method creates an IndexSpec from a factory string, a dictionary (as saved in the
+            manifest), an IndexSpec or None (flat index).
+
+            :param value: The index description
+            :return: An IndexSpec object
+        """
+        if value is None:
+            return cls()
+        if isinstance(value, IndexSpec):
+            return value
+        if isinstance(value, str):
+            return cls(factory=value)
+
+        return cls(**value)
+
+    def to_dict(self) -> dict:
+        return {
+            'factory': self.factory,
+            'nprobe': self.nprobe,
+            'ef_search': self.ef_search,
+            'train_size': self.train_size,
+        }
+
+    @property
+    def is_flat(self) -> bool:
+        return self.factory.replace(' ', '') in ['Flat', 'IDMap,Flat']
+
+def build_index(vectors: np.ndarray, spec: IndexSpec) -> faiss.Index:
+    """
+        This function creates and trains an empty FAISS index described by the spec. The vectors
+        are only used to train the index, they are not added.
+
+        :param vectors: A NumPy float32 matrix with one embedding per row
+        :param spec: An IndexSpec describing the index
+        :return: A trained FAISS index
+    """
+    index = faiss.index_factory(vectors.shape[1], spec.factory)
+
+    if not index.is_trained:
+        training = vectors
+        if spec.train_size and len(vectors) > spec.train_size:
+            rows = np.random.default_rng(0).choice(len(vectors), spec.train_size, replace=False)
+            training = vectors[rows]
+
+        try:
+            index.train(training)
+        except RuntimeError as e:
+            raise ValueError(f'Not possible to train the index {spec.factory!r} with {len(training)} vectors. Use a smaller number of clusters. Error: {e}')
+
+    apply_search_params(index, spec)
+    enable_reconstruct(index)
+
+    return index
+
+def enable_reconstruct(index: faiss.Index):
+    """
+        This function lets an IVF index (e.g. 'IVF1024,Flat' or 'IVF4096,PQ32') return its stored
+        vectors by row, which LangChain's MMR search needs (`index.reconstruct`). The direct map is
+        saved with the index, but libraries saved before it existed need it again after loading.
+        Other indexes are not changed.
+
+        :param index: A FAISS index
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        # Not an IVF index
+        return
+
+    if ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+def keep_rows(index: faiss.Index, rows: np.ndarray):
+    """
+        This function deletes rows of an index that can not renumber them (IVF keeps the old row
+        numbers and HNSW can not remove vectors). The vectors of the kept rows are read back
+        (compressed indexes return their decoded vectors, which have the same codes) and added again
+        to the emptied index in the same order, so the index is not trained again and nothing is
+        embedded again.
+
+        :param index: A trained FAISS index (IVF indexes need the direct map, see `enable_reconstruct`)
+        :param rows: A NumPy array with the sorted rows that are kept
+    """
+    vectors = index.reconstruct_batch(rows) if len(rows) else None
+
+    index.reset()
+
+    if vectors is not None:
+        index.add(vectors)
+
+def apply_search_params(index: faiss.Index, spec: IndexSpec):
+    """
+        This function sets the search parameters of the spec (nprobe and efSearch) in an index.
+        These parameters are not saved with the index, so they are set again after loading it.
+
+        :param index: A FAISS index
+        :param spec: An IndexSpec with the search parameters
+    """
+    parameters = faiss.ParameterSpace()
+
+    if spec.nprobe:
+        parameters.set_index_parameter(index, 'nprobe', spec.nprobe)
+
+    if spec.ef_search:
+        parameters.set_index_parameter(index, 'efSearch', spec.ef_search)
+
+
+if __name__ == '__main__':
+    pass
@@ -3,6 +3,14 @@ import os
 from dotenv import load_dotenv
 import openai
 
+def load_environment():
+    """
+        Load the .env file in the environment variables. The entry points (app.py, api.py and
+        batch_qa.py) call it before importing the other modules, because some of them read their
+        configuration (WHISPER_*, TRACING, API_URL...) when they are imported.
+    """
+    load_dotenv()
+
 def get_API() -> str:
     """
         Get OpenAI API key from .env
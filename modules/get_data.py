@@ -1,10 +1,15 @@
 # Python libraries
-import requests
+import os
 import fitz
-import io
+import tempfile
+import multiprocessing
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Local imports
-from modules.managers.folder_manager import check_folder_existence
+from modules.managers.folder_manager import delete_file
+from modules.managers.http_manager import fetch_client
 from modules.managers.string_manager import transform_github_url
 
 
@@ -21,17 +26,14 @@ def get_text_from_github(url: str) -> dict:
     # Adjusted URL to fetch the raw content
     url = transform_github_url(url)
 
-    # Make a GET request to fetch the raw file content
-    response = requests.get(url)
+    # Fetch the raw file content (from the cache if it did not change). It raises
+    # a ValueError if the request was not successful
+    response = fetch_client.get(url)
 
-    # Check if the request was successful (status code 200)
-    if response.status_code == 200:
-        # Retrieve the content of the file
-        file_content = response.text
+    # Retrieve the content of the file
+    file_content = response.text
 
-        return {'text': file_content, 'type': 'text'}
-    
-    raise ValueError(f"Failed to retrieve data from {url!r}. Status code: {response.status_code}")
+    return {'text': file_content, 'type': 'text'}
 
 def get_pdf_from_github(url: str) -> dict:
     """
@@ -47,54 +49,111 @@ def get_pdf_from_github(url: str) -> dict:
     # Adjusted URL to fetch the raw content
     url = transform_github_url(url)
 
-    # Make a GET request to fetch the raw PDF content
-    response = requests.get(url)
-
-    # Check if the request was successful (status code 200)
-    if response.status_code == 200:
-        # Use io.BytesIO to handle the PDF content in memory
-        pdf_file = io.BytesIO(response.content)
-        
-        # Open the PDF file using PyMuPDF
-        pdf_document = fitz.open(stream=pdf_file, filetype="pdf")
-        
-        # Extract text from each page
-        pdf_text = []
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            pdf_text.append(page.get_text())
-        
-        # Close the PDF document
-        pdf_document.close()
-
-        return {'text': ''.join(pdf_text), 'pages_text': pdf_text, 'type': 'pdf'}
-
-    raise ValueError(f"Failed to retrieve data from {url!r}. Status code: {response.status_code}")
-
-def save_video_from_github(url: str, save_path: str):
+    # Fetch the raw PDF content (from the cache if it did not change). It raises
+    # a ValueError if the request was not successful
+    response = fetch_client.get(url)
+
+    # Open the PDF file using PyMuPDF
+    pdf_document = fitz.open(stream=response.content, filetype="pdf")
+
+    # Extract text from each page
+    pdf_text = []
+    for page_num in range(pdf_document.page_count):
+        page = pdf_document[page_num]
+        pdf_text.append(page.get_text())
+
+    # Close the PDF document
+    pdf_document.close()
+
+    return {'text': ''.join(pdf_text), 'pages_text': pdf_text, 'type': 'pdf'}
+
+def _extract_pages(pdf_path: str, first: int, last: int) -> list[str]:
+    """
+        Extract the text of a range of pages from a PDF file. It runs in a worker
+        process, which opens the file by itself.
+
+        :param pdf_path: A string representing the PDF file path
+        :param first: The index of the first page
+        :param last: The index after the last page
+        :return: A list with the text of each page
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(first, last)]
+
+def iter_pdf_pages(pdf_path: str, workers: int or None = None, batch_pages: int = 8):
+    """
+        Extract the text of each page of a PDF file in parallel processes and yield
+        them in order. Only a few batches of pages are extracted ahead, so the memory
+        does not depend on the size of the PDF.
+
+        :param pdf_path: A string representing the PDF file path
+        :param workers: An integer representing how many processes extract pages. If
+        not given, it uses the number of CPU cores
+        :param batch_pages: An integer representing how many pages each task extracts
+        :return: A generator with the text of each page
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = pdf_document.page_count
+
+    workers = workers or os.cpu_count() or 1
+
+    # Spawn new processes, forking while other threads are running (e.g. ingestion) is not safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        pending = deque()
+
+        for first in range(0, page_count, batch_pages):
+            pending.append(executor.submit(_extract_pages, pdf_path, first, min(first + batch_pages, page_count)))
+
+            # Keep only two batches per worker in flight
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+def iter_pdf_pages_from_github(url: str, workers: int or None = None):
+    """
+        Receives a raw URL from github of a PDF file and yield the text of each
+        page. The PDF is streamed to a temporary file (never held in memory) and
+        the pages are extracted in parallel processes.
+
+        :param url: A string for GitHub content
+        :param workers: An integer representing how many processes extract pages
+        :return: A generator with the text of each page
+    """
+    # Adjusted URL to fetch the raw content
+    url = transform_github_url(url)
+
+    # Create a temporary file to save the PDF
+    file_descriptor, pdf_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(file_descriptor)
+
+    try:
+        # Download the PDF to the temporary file (from the cache if it did not change)
+        fetch_client.download(url, pdf_path)
+
+        yield from iter_pdf_pages(pdf_path, workers=workers)
+    finally:
+        delete_file(pdf_path)
+
+def save_video_from_github(url: str, save_path: str) -> str:
     """
         Retreive a video from a Github URL and save it as a local file. It is
-        necessary to save to process instead of saving it in memory.
+        necessary to save to process instead of saving it in memory. The SHA-256
+        of the video is calculated while it is downloaded (and cached with it).
 
         :param url: A Github URL to the video
         :param save_path: A string containing the local to save the file
+        :return: A string with the SHA-256 hex digest of the video content
     """
     # Adjusted URL to fetch the raw content
     url = transform_github_url(url)
 
-    # Make a GET request to fetch the raw video content
-    response = requests.get(url, stream=True)
-
-    # Check folder to save video
-    check_folder_existence(save_path[:save_path.rfind('/')])
+    # Download the video to the local file (from the cache if it did not change). It
+    # raises a ValueError if the request was not successful
+    response = fetch_client.download(url, save_path)
 
-    # Check if the request was successful (status code 200)
-    if response.status_code == 200:
-        # Save the video content to a local file
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
+    return response.sha256
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -1,12 +1,27 @@
 # Python libraries
 from langchain_openai import OpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.chains.retrieval_qa.base import RetrievalQA
+from langchain.docstore.document import Document
+from langchain_core.prompts import format_document
 from uuid import uuid4
+import os
+import time
+import numpy as np
 
 # Local imports
+from modules.answer_cache import AnswerCache, create_answer_cache
 from modules.embedd_text import embedding_in_chunks
+from modules.embedding_backends import EMBEDDING_BACKENDS, LOCAL_EMBEDDINGS_NAME, LocalEmbeddings, default_embedding_backend
+from modules.embedding_scheduler import create_embedding_scheduler
+from modules.embedding_store import CachedEmbeddings, EmbeddingStore, DEFAULT_STORE_PATH
+from modules.faiss_index import IndexSpec, build_index, apply_search_params, enable_reconstruct, keep_rows
+from modules.lexical_index import LEXICAL_INDEX_NAME, BM25Index, reciprocal_rank_fusion
+from modules.library_store import LIBRARY_VERSION, build_manifest, create_snapshot, library_files_path, read_manifest, save_library, load_library, make_writable
+from modules.managers.cache_manager import LRUCache
 from modules.managers.folder_manager import check_folder_existence
+from modules.managers.trace_manager import tracer
 from modules.managers.string_manager import find_most_similar_substrings, find_best_match_positions
 
 def convert_seconds_to_minute(seconds:float) -> tuple[int, int]:
@@ -19,8 +34,64 @@ def convert_seconds_to_minute(seconds:float) -> tuple[int, int]:
 
     return int(minutes), int(remaining_seconds)
 
+# Answers when no good context is found for a question
+OUT_OF_SCOPE_ANSWER = "Não sei. Sua pergunta está fora do escopo da aula."
+OUT_OF_SCOPE_RESPONSE = 'Não há documento de apoio para esta pergunta, pois ela foge do escopo da aula.'
+
+class StreamingAnswer():
+    def __init__(self, query: str, pieces) -> None:
+        """
+            This class wraps a streaming answer. Iterating over it yields each piece of the answer as
+            soon as it arrives, while the full response and the timings are recorded. The `location`
+            is where the context was found (the last line of the response), or None if the answer has
+            no context (e.g. out of scope questions).
+
+            :param query: A string representing the user query
+            :param pieces: A generator with the pieces (strings) of the answer
+        """
+        self.query = query
+        self.response = ''
+        self.ttft = None
+        self.total_time = None
+        self.trace = None
+        self.location = None
+
+        self.__pieces = pieces
+        self.__start = time.perf_counter()
+
+    def __iter__(self):
+        for piece in self.__pieces:
+            # Time to the first token (from the moment the question was asked)
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.__start
+
+            self.response += piece
+            yield piece
+
+        self.total_time = time.perf_counter() - self.__start
+
+    def close(self):
+        """
+            This method stops an answer that is still being generated (e.g. the user left), closing
+            the ChatGPT stream. The pieces not sent yet are not generated.
+        """
+        self.__pieces.close()
+
+    def to_dict(self) -> dict:
+        return {
+            'query': self.query,
+            'response': self.response,
+            'location': self.location,
+            'ttft': self.ttft,
+            'total_time': self.total_time,
+            'trace': self.trace,
+        }
+
 class IndexingData():
-    def __init__(self, api_key: str, path: str or None=None) -> None:
+    def __init__(self, api_key: str, path: str or None=None, query_cache_size: int=256,
+                 embedding_store_path: str=DEFAULT_STORE_PATH, index_spec: IndexSpec or str or dict or None=None,
+                 answer_cache: AnswerCache or None=None, embedding_backend: str or None=None,
+                 lexical_gate: float or None=None, llm=None) -> None:
         """
             This class is designed to create a library from a provided data. The data needs
             to be in Document format and splitted in chunks. After indexing the data, you can
@@ -30,31 +101,333 @@ class IndexingData():
 
             :param path: If given, it will try to load a saved library locally. If not given, it will
             create just in the `create_library` method.
+            :param query_cache_size: An integer representing how many query embeddings are kept in
+            memory, so the same question is not embedded twice
+            :param embedding_store_path: A string representing the on-disk embedding store. Chunks
+            already embedded are read from it instead of being sent to OpenAI again
+            :param index_spec: The FAISS index used by new libraries (an IndexSpec or a factory string
+            like 'IVF1024,Flat' or 'HNSW32'). If not given, new libraries use an exact (flat) index and
+            loaded libraries use the index saved in their manifest. If given when loading, its search
+            parameters (nprobe and efSearch) are used
+            :param answer_cache: An AnswerCache with the answers of repeated (or similar) questions. If
+            not given, it is configured by environment variables (see `create_answer_cache`)
+            :param embedding_backend: A string representing how chunks and queries are embedded:
+            'openai' (OpenAI API) or 'local' (TF-IDF + SVD on CPU, without network). If not given,
+            loaded libraries use the backend saved in their manifest and new libraries use the
+            'EMBEDDING_BACKEND' environment variable (default 'openai')
+            :param lexical_gate: A float between 0 and 1. Questions whose informative words are less than
+            this fraction in the library vocabulary (see `BM25Index.coverage`) are answered as out of
+            scope without calling the embedding API. If not given, the 'LEXICAL_GATE' environment
+            variable is used (default 0, disabled: generic questions like 'Me explique a aula' have
+            no word of the lesson)
+            :param llm: A LangChain LLM that answers the questions. If not given, OpenAI is used
         """
         # Check if OpenAI API Key was provided
         self.__OPENAI_API_KEY = api_key
+        self.__llm = llm
+
+        # The embedding backend of a saved library is in its manifest (old libraries use OpenAI)
+        saved_manifest = read_manifest(path) if path else None
+        if embedding_backend is None and saved_manifest:
+            embedding_backend = saved_manifest.get('embedding_backend', 'openai')
+
+        self.__embedding_backend = embedding_backend or default_embedding_backend()
+        if self.__embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f'The embedding backend {self.__embedding_backend!r} does not exist. Use one of {EMBEDDING_BACKENDS}.')
+
+        if self.__embedding_backend == 'local':
+            # The local model is fitted with the chunks of the library and saved with it
+            files_path = library_files_path(path, saved_manifest) if path else None
+            has_model = files_path and os.path.exists(os.path.join(files_path, LOCAL_EMBEDDINGS_NAME))
+            self.__embeddings = LocalEmbeddings.load(files_path) if has_model else LocalEmbeddings()
+        else:
+            # Chunks are embedded with concurrent batched requests (see EmbeddingScheduler)
+            openai_embeddings = OpenAIEmbeddings(api_key=self.__OPENAI_API_KEY)
+            self.__embeddings = CachedEmbeddings(
+                openai_embeddings,
+                EmbeddingStore(embedding_store_path),
+                scheduler=create_embedding_scheduler(self.__OPENAI_API_KEY, model=openai_embeddings.model)
+            )
+
+        # Cache of query embeddings (LRU)
+        self.__query_cache = LRUCache(max_size=query_cache_size)
+
+        # Cache of answers, cleared when the library generation changes
+        self.__answer_cache = answer_cache if answer_cache is not None else create_answer_cache()
+
+        # Out-of-scope questions are refused by the lexical index before being embedded
+        self.__lexical_gate = lexical_gate if lexical_gate is not None else float(os.getenv('LEXICAL_GATE', 0))
+
+        # Approximate index configuration (None means flat or the saved one)
+        self.__index_spec = IndexSpec.from_value(index_spec) if index_spec is not None else None
+
+        # The generation changes every time the library changes
+        self.__library, self.__QA, self.__manifest, self.__lexical = None, None, None, None
+        self.__mapped = False
+        self.__generation = 0
+        self.__saved_generations = {}
         
         # Check if a path was provided. If yes, it will load a pre-saved context
         if path:
-            self.__library = self.__load_local(path)
-            self.__QA = self.__create_QA()
+            library, manifest, mapped, lexical = self.__load_local(path, saved_manifest)
+            self.__set_library(library, manifest, lexical)
+            self.__mapped = mapped
+            self.__saved_generations[os.path.abspath(path)] = self.__generation
 
-    def create_library(self, data: dict):
+    def create_library(self, data: dict, raw_data: dict or None=None):
         """
             This method receives a data in dictionary with a format where `'key'=raw` text string and
             `'value'='type'` (in string like "text"). It will process in smalled chunks with 500 tokens
             each and create a Langchain Document object.
 
-            It will create the `__library` and `__QA` instances to get a response from OpenAI's ChatGPT
+            It will create the `__library` and `__QA` instances to get a response from OpenAI's ChatGPT.
+            Chunks already embedded before are read from the embedding store.
+
+            If the raw data is given, the location of each chunk (PDF pages or video times) is saved in its
+            metadata and persisted with the library, so it is not searched on each query.
 
             :param data: A dictionary with raw data and its type
+            :param raw_data: A dictionary with the raw data, its type and other important metadata to reference
         """
         # Get data um Document format
-        docs = embedding_in_chunks(data=data)
+        docs = embedding_in_chunks(data=data, raw_data=raw_data)
+
+        self.create_library_from_documents(docs)
 
-        # Create the library and retriever with context
-        self.__library = FAISS.from_documents(docs, OpenAIEmbeddings(api_key=self.__OPENAI_API_KEY))
+    def create_library_from_documents(self, docs: list[Document]):
+        """
+            This method creates the `__library` and `__QA` instances from chunks already splitted in
+            Document format (e.g. by `embedding_in_chunks`).
+
+            :param docs: A list with Langchain's Document objects
+        """
+        # Create the library and retriever with context (chunk IDs are derived from the content)
+        ids = [doc.metadata['id'] for doc in docs]
+        spec = self.__index_spec or IndexSpec()
+
+        # The local embedding model learns the vocabulary of the new library (the old query
+        # embeddings are not valid anymore)
+        if self.__embedding_backend == 'local':
+            self.__embeddings.fit([doc.page_content for doc in docs])
+            self.__query_cache.clear()
+
+        if spec.is_flat:
+            library = FAISS.from_documents(docs, self.__embeddings, ids=ids)
+        else:
+            # Approximate indexes need to be trained with the vectors before adding them
+            vectors = self.embed_documents(docs)
+            index = build_index(np.asarray(vectors, dtype=np.float32), spec)
+
+            library = FAISS(self.__embeddings, index, InMemoryDocstore(), {})
+            library.add_embeddings(
+                zip([doc.page_content for doc in docs], vectors),
+                metadatas=[doc.metadata for doc in docs],
+                ids=ids
+            )
+
+        self.__index_spec = spec
+        # The BM25 index is created with the library (hybrid search)
+        lexical = BM25Index.build(ids, [doc.page_content for doc in docs])
+
+        self.__set_library(library, build_manifest(
+            ids, docs, self.__embeddings.get_model_name, spec.to_dict(), embedding_backend=self.__embedding_backend
+        ), lexical)
+
+    def __set_library(self, library: FAISS, manifest: dict, lexical: BM25Index):
+        """
+            This method replaces the library, its manifest and its lexical index, creating the QA
+            object again.
+
+            :param library: A FAISS library
+            :param manifest: A dictionary with the library manifest
+            :param lexical: A BM25Index with the chunks of the library
+        """
+        self.__library = library
+        self.__manifest = manifest
+        self.__lexical = lexical
+        self.__mapped = False
         self.__QA = self.__create_QA()
+        self.__generation += 1
+
+    def replace_source(self, source: str, text: str, type: str, raw: dict or list or None = None) -> dict:
+        """
+            This method adds a source (e.g. a new lecture video) to the library or replaces it if the
+            source already exists. The chunk IDs are derived from their content, so only the chunks
+            that changed are deleted or embedded and added, the others are kept. Libraries with the
+            local backend are created again when chunks are added, because the model is fitted again
+            with the new words (every chunk is embedded again on CPU).
+
+            :param source: A string representing the source name (e.g. 'pdf' or an URL)
+            :param text: A string with all the source text
+            :param type: A string representing the source type ('text', 'pdf' or 'video')
+            :param raw: The raw data of the source (see `embedding_in_chunks`)
+            :return: A dictionary with how many chunks were 'added', 'removed' and 'kept'
+        """
+        docs = embedding_in_chunks(data={text: type}, raw_data={type: raw} if raw else None, source=source)
+
+        return self.__update_source(source, docs)
+
+    def add_source(self, source: str, text: str, type: str, raw: dict or list or None = None) -> dict:
+        """
+            This method adds a new source to the library. It raises a ValueError if the source already
+            exists (use `replace_source` to update it).
+
+            :param source: A string representing the source name (e.g. 'pdf' or an URL)
+            :param text: A string with all the source text
+            :param type: A string representing the source type ('text', 'pdf' or 'video')
+            :param raw: The raw data of the source (see `embedding_in_chunks`)
+            :return: A dictionary with how many chunks were 'added', 'removed' and 'kept'
+        """
+        if self.__manifest and source in self.__manifest['sources']:
+            raise ValueError(f'The source {source!r} already exists in the library.')
+
+        return self.replace_source(source, text, type, raw)
+
+    def remove_source(self, source: str) -> dict:
+        """
+            This method deletes all chunks of a source from the library. It raises a ValueError if the
+            source does not exist.
+
+            :param source: A string representing the source name
+            :return: A dictionary with how many chunks were 'added', 'removed' and 'kept'
+        """
+        if not self.__manifest or source not in self.__manifest['sources']:
+            raise ValueError(f'The source {source!r} does not exist in the library.')
+
+        return self.__update_source(source, [])
+
+    def __update_source(self, source: str, docs: list[Document]) -> dict:
+        """
+            This method makes the chunks of a source in the library equal to the given chunks,
+            deleting and adding only the difference.
+
+            :param source: A string representing the source name
+            :param docs: A list with all Langchain's Document objects of the source
+            :return: A dictionary with how many chunks were 'added', 'removed' and 'kept'
+        """
+        if self.__library is None:
+            self.create_library_from_documents(docs)
+            return {'added': len(docs), 'removed': 0, 'kept': 0}
+
+        # A memory-mapped index is read-only, it is copied to memory before the first change
+        if self.__mapped:
+            make_writable(self.__library)
+            self.__mapped = False
+
+        old_ids = set(self.__manifest['sources'].get(source, {}).get('chunks', []))
+        new_ids = [doc.metadata['id'] for doc in docs]
+
+        to_delete = list(old_ids.difference(new_ids))
+        to_add = [doc for doc in docs if doc.metadata['id'] not in old_ids]
+
+        if to_add and self.__embedding_backend == 'local':
+            # The local model only knows the words of the chunks it was fitted with, so the library
+            # is created again with every chunk (fitting the model with the new words)
+            removed = set(to_delete)
+            docs = [
+                self.__library.docstore.search(id) for _, id in sorted(self.__library.index_to_docstore_id.items())
+                if id not in removed
+            ] + to_add
+            self.create_library_from_documents(docs)
+
+            return {'added': len(to_add), 'removed': len(to_delete), 'kept': len(new_ids) - len(to_add)}
+
+        if to_delete:
+            self.__delete_chunks(to_delete)
+
+        if to_add:
+            self.__library.add_documents(to_add, ids=[doc.metadata['id'] for doc in to_add])
+
+        # Update the manifest
+        if docs:
+            self.__manifest['sources'][source] = {'type': docs[0].metadata['type'], 'chunks': new_ids}
+        else:
+            self.__manifest['sources'].pop(source, None)
+
+        if to_delete or to_add:
+            # Only the chunks of this source are tokenized again
+            self.__lexical = self.__lexical.update(
+                to_delete, [doc.metadata['id'] for doc in to_add], [doc.page_content for doc in to_add]
+            )
+            self.__generation += 1
+
+        return {'added': len(to_add), 'removed': len(to_delete), 'kept': len(new_ids) - len(to_add)}
+
+    def __delete_chunks(self, ids: list[str]):
+        """
+            This method deletes chunks from the library, renumbering the rows of the index as
+            LangChain does. Only the flat index removes vectors this way (HNSW can not remove them
+            and IVF keeps the old row numbers), so the other indexes keep the vectors of the
+            remaining rows, without training them again (see `keep_rows`).
+
+            :param ids: A list with the chunk IDs
+        """
+        if self.__index_spec.is_flat:
+            self.__library.delete(ids)
+            return
+
+        removed = set(ids)
+        rows = [row for row, id in sorted(self.__library.index_to_docstore_id.items()) if id not in removed]
+
+        keep_rows(self.__library.index, np.asarray(rows, dtype=np.int64))
+        self.__library.docstore.delete(ids)
+        self.__library.index_to_docstore_id = {
+            new_row: self.__library.index_to_docstore_id[row] for new_row, row in enumerate(rows)
+        }
+
+    def __build_lexical_index(self, library: FAISS) -> BM25Index:
+        """
+            This method creates the BM25 index with every chunk of a library, in the index order.
+
+            :param library: A FAISS library
+            :return: A BM25Index object
+        """
+        ids = [library.index_to_docstore_id[row] for row in range(len(library.index_to_docstore_id))]
+
+        return BM25Index.build(ids, [library.docstore.search(id).page_content for id in ids])
+
+    def embed_documents(self, docs: list[Document]) -> list[list[float]]:
+        """
+            This method embeds chunks and saves them in the embedding store, without creating a
+            library. Creating a library later with the same chunks will not call OpenAI again.
+
+            The local backend is only fitted when the library is created, so before that nothing is
+            embedded (an empty list is returned).
+
+            :param docs: A list with Langchain's Document objects
+            :return: A list with the embedding of each chunk
+        """
+        if self.__embedding_backend == 'local' and not self.__embeddings.is_fitted:
+            return []
+
+        return self.__embeddings.embed_documents([doc.page_content for doc in docs])
+
+    def embed_query(self, query: str) -> list[float]:
+        """
+            This method returns the embedding of a query. The embeddings are kept in a LRU cache,
+            so each query is sent to OpenAI only once.
+
+            :param query: A string text
+            :return: A list of floats representing the query embedding
+        """
+        embedding = self.__query_cache.get(query)
+
+        if embedding is None:
+            embedding = self.__embeddings.embed_query(query)
+            self.__query_cache.put(query, embedding)
+
+        return embedding
+
+    def __trace_embed_query(self, query: str) -> list[float]:
+        """
+            This method is `embed_query` inside a span. The first call of a question (the answer cache
+            lookup) is the one that sends it to OpenAI, the next ones are LRU cache hits.
+
+            :param query: A string text
+            :return: A list of floats representing the query embedding
+        """
+        with tracer.span('retrieve_context.embed_query'):
+            return self.embed_query(query)
 
     def search_index(self, query: str, top_k: int = 5) -> dict:
         """
@@ -97,7 +470,7 @@ class IndexingData():
 
         # Create a Question&Answer object to get ChatGPT response
         qa = RetrievalQA.from_chain_type(
-            llm=OpenAI(api_key=self.__OPENAI_API_KEY),
+            llm=self.__llm or OpenAI(api_key=self.__OPENAI_API_KEY),
             chain_type='stuff',
             retriever=retriever,
             return_source_documents=True
@@ -105,79 +478,153 @@ class IndexingData():
 
         return qa
     
-    def retrieve_from_GPT(self, query: str, threshold: float) -> tuple[dict, bool]: 
+    def __is_out_of_scope(self, query: str) -> bool:
         """
-            This method receives a query (question for ChatGPT) and return an answer based on the
-            provided context to library. To avoid hallucination, first of all the method search for
-            the best 3 context in library and, if not found any good context (p>threshold), it return
-            a response of "I don't know".
+            This method checks locally (lexical index) if a question is clearly outside the library
+            vocabulary, so it can be refused without embedding it or calling ChatGPT.
 
             :param query: A string that will be provided to ChatGPT
-            :param threshold: A flod representing the minimum confidence of the context found (close to 0 = best)
+            :return: A boolean indicating if the question is out of scope
+        """
+        with tracer.span('retrieve_context.lexical_gate'):
+            return bool(self.__lexical_gate) and self.__lexical.coverage(query) < self.__lexical_gate
+
+    def __select_context(self, query: str, threshold: float, gated: bool = False) -> list[Document] or None:
+        """
+            This method selects the context of a query. Questions clearly outside the library
+            vocabulary are refused by the lexical index, without embedding them. Otherwise, the query
+            is embedded only once: the same vector is used for the threshold search (best 3 context)
+            and for the MMR search, whose results are combined with the BM25 results (Reciprocal
+            Rank Fusion).
+
+            :param query: A string that will be provided to ChatGPT
+            :param threshold: A float representing the minimum confidence of the context found (close to 0 = best)
+            :param gated: A boolean indicating if the lexical gate already accepted the query
+            :return: A list with the selected Documents or None if no good context was found
         """
+        if not gated and self.__is_out_of_scope(query):
+            return None
+
+        # Embed the query only once for both searches
+        embedding = self.__trace_embed_query(query)
+
         # Retrieve documents
-        retrieved_docs = self.__library.similarity_search_with_score(query, k=3)
+        with tracer.span('retrieve_context.similarity_gate'):
+            retrieved_docs = self.__library.similarity_search_with_score_by_vector(embedding, k=3)
 
         # Implementing confidence threshold logic
         confident_docs = [doc[1] for doc in retrieved_docs if doc[1] < threshold]
 
         if not confident_docs:
+            return None
+
+        # Select the context with the same search used by the QA retriever (MMR) and with BM25
+        with tracer.span('retrieve_context.mmr'):
+            vector_docs = self.__library.max_marginal_relevance_search_by_vector(embedding, k=5)
+
+        with tracer.span('retrieve_context.bm25'):
+            lexical_docs = [
+                doc for doc in (self.__library.docstore.search(id) for id, _ in self.__lexical.search(query, top_k=5))
+                if isinstance(doc, Document)
+            ]
+
+        # Old chunks do not have an ID in the metadata, so the chunks are matched by their text
+        docs = {doc.page_content: doc for doc in lexical_docs + vector_docs}
+        ranking = reciprocal_rank_fusion([
+            [doc.page_content for doc in vector_docs],
+            [doc.page_content for doc in lexical_docs],
+        ])
+
+        return [docs[text] for text in ranking[:5]]
+
+    def __create_prompt(self, query: str, source_documents: list[Document]) -> str:
+        """
+            This method creates the same prompt the QA chain sends to ChatGPT ('stuff' chain).
+
+            :param query: A string that will be provided to ChatGPT
+            :param source_documents: A list with the context Documents
+            :return: A string with the prompt
+        """
+        chain = self.__QA.combine_documents_chain
+
+        context = chain.document_separator.join(
+            format_document(doc, chain.document_prompt) for doc in source_documents
+        )
+
+        return chain.llm_chain.prompt.format(**{chain.document_variable_name: context, 'question': query})
+
+    def retrieve_from_GPT(self, query: str, threshold: float, gated: bool = False) -> tuple[dict, bool]: 
+        """
+            This method receives a query (question for ChatGPT) and return an answer based on the
+            provided context to library. To avoid hallucination, first of all the method search for
+            the best 3 context in library and, if not found any good context (p>threshold), it return
+            a response of "I don't know".
+
+            The query is embedded only once. The same vector is used for the threshold search and for
+            the MMR search, and the selected documents are sent directly to ChatGPT.
+
+            :param query: A string that will be provided to ChatGPT
+            :param threshold: A flod representing the minimum confidence of the context found (close to 0 = best)
+            :param gated: A boolean indicating if the lexical gate already accepted the query
+        """
+        source_documents = self.__select_context(query, threshold, gated=gated)
+
+        if not source_documents:
             return (
                 {
                     'query': query,
-                    'run_name': str(uuid4),
-                    'result': "Não sei. Sua pergunta está fora do escopo da aula.",
+                    'run_name': str(uuid4()),
+                    'result': OUT_OF_SCOPE_ANSWER,
                     'source_documents': None
                 },
                 False
             )
 
+        # Send the selected context directly to ChatGPT, without retrieving it again
+        with tracer.span('retrieve_context.llm'):
+            answer = self.__QA.combine_documents_chain.invoke(
+                {
+                    'input_documents': source_documents,
+                    'question': query,
+                },
+                config={'run_name': str(uuid4())}
+            )
+
         return (
-            self.__QA.invoke({
+            {
                 'query': query,
-                'run_name': str(uuid4()),
-                'language': 'portuguese',
-            }), 
+                'result': answer[self.__QA.combine_documents_chain.output_key],
+                'source_documents': source_documents
+            },
             True
         )
-    
-    def retrieve_context(self, query: str, raw_data: dict, threshold: float=0.3) -> dict:
+
+    def __source_location(self, doc: Document, raw_data: dict) -> str:
         """
-            This method will get the response from ChatGPT based on a user query and the context
-            provided to library. It needs the user query, and raw data to find where the context exists
-            so user can check the reference. The threshold argument is optional and closing it to zero
-            means that the model will search for only the best context. Higher values mean a more random
-            context.
+            This method creates the sentence telling the user where the context of the answer is
+            located (text, PDF pages or video minutes).
 
-            :param query: A string that will be provided to ChatGPT
+            :param doc: The Document used as the main context of the answer
             :param raw_data: A dictionary with the raw data, its type and other important metadata to reference
-            :param threshold: A float representing the confidence score of the search context
+            :return: A string with the location
         """
-        # Get answer from ChatGPT
-        answer, source_documents = self.retrieve_from_GPT(query, threshold)
+        # Get context from answer
+        doc_metadata = doc.metadata
+        doc_type, doc_text = doc_metadata['type'], doc.page_content
 
-        # Initialize the string that will be returned
         response = ''
 
-        # Check if the answer is outside the knowledge
-        if not source_documents:
-            response  = f'Não há documento de apoio para esta pergunta, pois ela foge do escopo da aula.'
-            return {
-                'query': query,
-                'response': response,
-            }
-
-        # Get context from answer
-        doc_type, doc_text = answer['source_documents'][0].metadata['type'], answer['source_documents'][0].page_content
-
         # Try to find where the context has been provided
         if doc_type == 'text':
             response = 'O documento de apoio pode ser encontrado no arquivo de texto.'
 
         elif doc_type == 'pdf':
-            pdf_content = raw_data['pdf']
+            # Libraries created with the raw data already have the pages in the metadata
+            if 'page_start' in doc_metadata:
+                page = sorted({doc_metadata['page_start'], doc_metadata['page_end']})
+            else:
+                page = find_most_similar_substrings(doc_text, raw_data['pdf']['pages_text'])
 
-            page = find_most_similar_substrings(doc_text, pdf_content['pages_text'])
             if len(page) > 1:
                 pg1, pg2 = min(page), max(page)
                 response = f'O documento de apoio encontra-se entre as páginas {pg1} e {pg2} do PDF'
@@ -185,45 +632,228 @@ class IndexingData():
                 response  = f'O documento de apoio encontra-se na a página {page[0]} do PDF'
 
         elif doc_type == 'video':
-            segments = raw_data['video']
-            times = find_best_match_positions(doc_text, segments[0])
-            start_m, start_s = convert_seconds_to_minute(float(segments[1][times[0]][0]))
-            end_m, end_s   = convert_seconds_to_minute(float(segments[1][times[0]][1]))
+            # Libraries created with the raw data already have the times in the metadata
+            if 'time_start' in doc_metadata:
+                start, end = doc_metadata['time_start'], doc_metadata['time_end']
+            else:
+                segments = raw_data['video']
+                times = find_best_match_positions(doc_text, segments[0])
+                start, end = float(segments[1][times[0]][0]), float(segments[1][times[0]][1])
+
+            start_m, start_s = convert_seconds_to_minute(start)
+            end_m, end_s   = convert_seconds_to_minute(end)
             response = f'O documento de apoio está no vídeo entre os minutos {start_m}:{start_s}-{end_m}:{end_s}'
 
+        return response
+
+    def retrieve_context(self, query: str, raw_data: dict, threshold: float=0.3) -> dict:
+        """
+            This method will get the response from ChatGPT based on a user query and the context
+            provided to library. It needs the user query, and raw data to find where the context exists
+            so user can check the reference. The threshold argument is optional and closing it to zero
+            means that the model will search for only the best context. Higher values mean a more random
+            context.
+
+            Answers are cached: the same (or a very similar) question is answered without calling
+            ChatGPT again, and identical questions asked at the same time share one call. Questions
+            refused by the lexical gate are answered before the cache, without embedding them.
+
+            :param query: A string that will be provided to ChatGPT
+            :param raw_data: A dictionary with the raw data, its type and other important metadata to reference
+            :param threshold: A float representing the confidence score of the search context
+            :return: A dictionary with the 'query' and the 'response'. If tracing is enabled, the time of
+            each stage is in 'trace'
+        """
+        with tracer.span('retrieve_context', threshold=threshold) as span:
+            # The semantic tier of the cache embeds the query, so out of scope questions are refused first
+            if self.__is_out_of_scope(query):
+                answer = {'query': query, 'response': OUT_OF_SCOPE_RESPONSE}
+            else:
+                answer = self.__answer_cache.get_or_compute(
+                    query, threshold, self.__generation,
+                    compute=lambda: self.__answer_query(query, raw_data, threshold),
+                    embed=self.__trace_embed_query,
+                )
+
+        trace = span.to_dict()
+
+        return {**answer, 'trace': trace} if trace else answer
+
+    def __answer_query(self, query: str, raw_data: dict, threshold: float) -> dict:
+        """
+            This method gets the response from ChatGPT without the answer cache (see `retrieve_context`).
+
+            :param query: A string that will be provided to ChatGPT
+            :param raw_data: A dictionary with the raw data, its type and other important metadata to reference
+            :param threshold: A float representing the confidence score of the search context
+        """
+        # Get answer from ChatGPT (the lexical gate was checked by `retrieve_context`)
+        answer, source_documents = self.retrieve_from_GPT(query, threshold, gated=True)
+
+        # Check if the answer is outside the knowledge
+        if not source_documents:
+            return {
+                'query': query,
+                'response': OUT_OF_SCOPE_RESPONSE,
+            }
+
         # Create a good response based on the provided ChatGPT's response + where the context was found
-        response = answer['result'] + '\n' + response
+        with tracer.span('retrieve_context.source_location'):
+            location = self.__source_location(answer['source_documents'][0], raw_data)
+
+        response = answer['result'] + '\n' + location
 
         return {
             'query': query,
             'response': response,
+            'location': location,
         }
 
+    def stream_context(self, query: str, raw_data: dict, threshold: float=0.3) -> 'StreamingAnswer':
+        """
+            This method is the streaming version of `retrieve_context`. It returns an iterable that
+            yields the ChatGPT answer in pieces (tokens) as soon as they arrive, and the line with
+            where the context is located at the end. The time until the first piece (TTFT) is measured.
+            Cached answers are sent in one piece and complete answers are added to the cache.
+
+            :param query: A string that will be provided to ChatGPT
+            :param raw_data: A dictionary with the raw data, its type and other important metadata to reference
+            :param threshold: A float representing the confidence score of the search context
+            :return: A StreamingAnswer object
+        """
+        generation = self.__generation
+
+        def pieces():
+            # Out of scope questions are refused before the cache lookup, which embeds the query
+            if self.__is_out_of_scope(query):
+                yield OUT_OF_SCOPE_RESPONSE
+                return
+
+            # A cached answer is sent at once
+            cached = self.__answer_cache.lookup(query, threshold, generation, embed=self.__trace_embed_query)
+            if cached is not None:
+                answer.location = cached.get('location')
+                yield cached['response']
+                return
+
+            source_documents = self.__select_context(query, threshold, gated=True)
+
+            # Check if the answer is outside the knowledge
+            if not source_documents:
+                response = OUT_OF_SCOPE_RESPONSE
+                yield response
+            else:
+                response = ''
+                prompt = self.__create_prompt(query, source_documents)
+
+                # The LLM span also has the time the caller takes to show each token
+                with tracer.span('retrieve_context.llm', streaming=True):
+                    for token in self.__QA.combine_documents_chain.llm_chain.llm.stream(prompt):
+                        response += token
+                        yield token
+
+                with tracer.span('retrieve_context.source_location'):
+                    answer.location = self.__source_location(source_documents[0], raw_data)
+
+                response += '\n' + answer.location
+                yield '\n' + answer.location
+
+            # Only complete answers are cached
+            self.__answer_cache.store(
+                query, threshold, generation, {'query': query, 'response': response, 'location': answer.location},
+                embed=self.embed_query
+            )
+
+        def generate():
+            span = tracer.span('stream_context', threshold=threshold)
+            try:
+                with span:
+                    yield from pieces()
+            finally:
+                answer.trace = span.to_dict()
+
+        answer = StreamingAnswer(query, generate())
+
+        return answer
+
     def save_local(self, path: str):
         """
             This method will save the loaded library to a local file and it can be loaded later without
-            pre-processing the raw data again.
+            pre-processing the raw data again. A manifest with the format version, the embedding model
+            and the chunks of each source is saved with it.
+
+            The library is saved in a memory-mapped format without pickle: the vectors in `index.faiss`
+            and the chunks in `docstore.jsonl` with an offset index. Loading it is almost instantaneous
+            and processes loading the same library share its memory. Each save writes a new snapshot
+            folder and then points the manifest to it, so a process loading the library never mixes
+            the files of two saves.
+
+            If the library did not change since it was saved (or loaded) in the same path, nothing is
+            written again.
 
             :param path: A string representing where the local file will be saved
         """
+        saved = self.__saved_generations.get(os.path.abspath(path)) == self.__generation
+        manifest = read_manifest(path)
+        if saved and manifest and os.path.exists(os.path.join(library_files_path(path, manifest), LEXICAL_INDEX_NAME)):
+            return
+
         max_char = path.rfind('/')
         if max_char <= 0: max_char = len(path)
 
         check_folder_existence(path[:max_char])
         
-        self.__library.save_local(path)
+        # Every file of this save is written in a new snapshot folder
+        snapshot_path = create_snapshot(path)
 
-    def __load_local(self, path: str) -> FAISS:
+        # The local embedding model is needed to embed the queries after loading
+        if self.__embedding_backend == 'local':
+            self.__embeddings.save(snapshot_path)
+
+        self.__lexical.save(snapshot_path)
+
+        # Memory-mapped format, without pickle. The manifest points to the new snapshot at the end
+        # (see modules/library_store.py)
+        save_library(self.__library, path, self.__manifest, snapshot_path)
+
+        self.__saved_generations[os.path.abspath(path)] = self.__generation
+
+    def __load_local(self, path: str, manifest: dict or None) -> tuple[FAISS, dict, bool, BM25Index]:
         """
-            This method will load a saved library.
+            This method will load a saved library and its manifest. Libraries saved before the
+            manifest existed get one created from their chunks.
 
             :param path: A string representing where the local library is saved
+            :param manifest: A dictionary with the manifest read when the library started loading
+            (None for old libraries). Every file is read from the snapshot it points to
+            :return: A tuple with the FAISS library, its manifest, if the index is memory-mapped and its
+            lexical (BM25) index
         """
-        return FAISS.load_local(
-            path,
-            OpenAIEmbeddings(api_key=self.__OPENAI_API_KEY),
-            allow_dangerous_deserialization=True
-        )
+        if manifest and manifest['version'] > LIBRARY_VERSION:
+            raise ValueError(f"The library in {path!r} has the version {manifest['version']}, but only versions up to {LIBRARY_VERSION} are supported.")
+
+        # The vectors and the chunks are memory-mapped (old libraries are unpickled)
+        library, mapped = load_library(path, self.__embeddings, manifest)
+
+        if not manifest:
+            ids = list(library.index_to_docstore_id.values())
+            docs = [library.docstore.search(id) for id in ids]
+            manifest = build_manifest(ids, docs, self.__embeddings.get_model_name, embedding_backend=self.__embedding_backend)
+
+        # Search parameters are not saved with the index, so they are set again
+        if self.__index_spec is None:
+            self.__index_spec = IndexSpec.from_value(manifest.get('index'))
+        apply_search_params(library.index, self.__index_spec)
+        enable_reconstruct(library.index)
+
+        # Libraries saved before the lexical index existed get one created from their chunks
+        files_path = library_files_path(path, manifest)
+        if os.path.exists(os.path.join(files_path, LEXICAL_INDEX_NAME)):
+            lexical = BM25Index.load(files_path)
+        else:
+            lexical = self.__build_lexical_index(library)
+
+        return library, manifest, mapped, lexical
        
     @property
     def get_library(self) -> FAISS:
@@ -233,6 +863,22 @@ class IndexingData():
     def get_QA(self) -> RetrievalQA:
         return self.__QA
 
+    @property
+    def get_manifest(self) -> dict:
+        return self.__manifest
+
+    @property
+    def get_embedding_backend(self) -> str:
+        return self.__embedding_backend
+
+    @property
+    def get_answer_cache(self) -> AnswerCache:
+        return self.__answer_cache
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
 
 if __name__ == '__main__':
     IndexingData()
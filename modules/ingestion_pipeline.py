@@ -0,0 +1,196 @@
+# Python libraries
+import os
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+# Local imports
+from modules.embedd_text import embedding_in_chunks, embedding_in_pages
+from modules.get_data import get_text_from_github, get_pdf_from_github, iter_pdf_pages_from_github, save_video_from_github
+from modules.indexing_data import IndexingData
+from modules.managers.trace_manager import tracer
+from modules.video_processing import transcript_video
+
+# Sources processed by the pipeline, in the order they are merged into the library
+SOURCES = ['text', 'pdf', 'video']
+
+# Folder where the videos are downloaded before being transcribed
+VIDEO_FOLDER = 'data/video'
+
+class IngestionPipeline():
+    def __init__(self, api_key: str, on_progress=None, model_performance: str = 'balanced',
+                 video_path: str = f'{VIDEO_FOLDER}/default_video.mp4', stream_pdf: bool = False,
+                 on_trace=None) -> None:
+        """
+            This class downloads and processes the text, PDF and video sources at the same time.
+            Each source runs in its own thread: the text and the PDF are splitted and embedded while
+            the video is still being transcribed. At the end, all chunks are merged in one
+            IndexingData library (the embeddings are read from the embedding store, so nothing is
+            embedded twice). The total time is the time of the slowest source.
+
+            :param api_key: A string representing the OpenAI API key
+            :param on_progress: A function called as `on_progress(source, stage, status, seconds)` when
+            a stage starts ('started'), finishes ('done') or fails ('failed'). It is called from the
+            worker threads
+            :param model_performance: A string representing the Whisper model selection
+            :param video_path: A string containing the local to save the video
+            :param stream_pdf: A boolean indicating if the PDF pages are extracted in parallel and
+            streamed to the splitter (for large documents). In this mode the raw data of the PDF
+            does not keep the pages text, the chunks metadata has the pages
+            :param on_trace: A function called with the trace of each run (only if tracing is enabled).
+            The traces of other runs of the process are not sent to it
+        """
+        self.__index = IndexingData(api_key=api_key)
+        self.__stream_pdf = stream_pdf
+        self.__on_progress = on_progress
+        self.__model_performance = model_performance
+        self.__video_path = video_path
+        self.__on_trace = on_trace
+
+    def __stage(self, source: str, stage: str, function, *args, **kwargs):
+        """
+            This method runs one stage of a source, reporting when it starts and finishes.
+
+            :param source: A string representing the source ('text', 'pdf' or 'video')
+            :param stage: A string representing the stage ('download', 'transcribe', 'split', ...)
+            :param function: The function of the stage
+            :return: What the function returns
+        """
+        self.__report(source, stage, 'started', 0.0)
+        start = time.perf_counter()
+
+        try:
+            with tracer.span(f'ingestion.{source}.{stage}', source=source):
+                result = function(*args, **kwargs)
+        except Exception:
+            self.__report(source, stage, 'failed', time.perf_counter() - start)
+            raise
+
+        self.__report(source, stage, 'done', time.perf_counter() - start)
+
+        return result
+
+    def __report(self, source: str, stage: str, status: str, seconds: float):
+        if self.__on_progress:
+            self.__on_progress(source, stage, status, seconds)
+
+    def __process(self, source: str, url: str) -> tuple:
+        """
+            This method downloads, splits and embeds one source.
+
+            :param source: A string representing the source ('text', 'pdf' or 'video')
+            :param url: A string representing the GitHub URL of the source
+            :return: A tuple with the raw data of the source and its chunks
+        """
+        if source == 'text':
+            raw = self.__stage(source, 'download', get_text_from_github, url)
+            text = raw['text']
+
+        elif source == 'pdf' and self.__stream_pdf:
+            # Download, extraction and splitting happen together, page by page
+            docs = self.__stage(source, 'extract and split', embedding_in_pages, iter_pdf_pages_from_github(url), 'pdf')
+            self.__stage(source, 'embed', self.__index.embed_documents, docs)
+
+            return {'type': 'pdf'}, docs
+
+        elif source == 'pdf':
+            raw = self.__stage(source, 'download', get_pdf_from_github, url)
+            text = raw['text']
+
+        else:
+            video_hash = self.__stage(source, 'download', save_video_from_github, url, save_path=self.__video_path)
+            text, raw = self.__stage(
+                source, 'transcribe', transcript_video, self.__video_path,
+                model_performance=self.__model_performance, content_hash=video_hash
+            )
+
+        docs = self.__stage(source, 'split', embedding_in_chunks, {text: source}, raw_data={source: raw})
+        self.__stage(source, 'embed', self.__index.embed_documents, docs)
+
+        return raw, docs
+
+    def run(self, txt_url: str, pdf_url: str, video_url: str) -> tuple[IndexingData, dict]:
+        """
+            This method runs the pipeline for the three sources and creates the library.
+
+            :param txt_url: A string representing the text GitHub URL
+            :param pdf_url: A string representing the PDF GitHub URL
+            :param video_url: A string representing the video GitHub URL
+            :return: A tuple with the IndexingData library and the raw data dictionary
+        """
+        urls = {'text': txt_url, 'pdf': pdf_url, 'video': video_url}
+
+        span = tracer.span('ingestion')
+        try:
+            with span:
+                return self.__run(urls)
+        finally:
+            # Failed runs also have a trace (the failed stage has the 'error' attribute)
+            if self.__on_trace and span.to_dict():
+                self.__on_trace(span.to_dict())
+
+    def __run(self, urls: dict) -> tuple[IndexingData, dict]:
+        # Each thread runs in a copy of the current context, so its stages are in the ingestion trace
+        with ThreadPoolExecutor(max_workers=len(SOURCES), thread_name_prefix='ingestion') as executor:
+            futures = {
+                source: executor.submit(copy_context().run, self.__process, source, urls[source])
+                for source in SOURCES
+            }
+            results = {source: future.result() for source, future in futures.items()}
+
+        # Merge all chunks in one library (numbering the chunks again)
+        docs = []
+        for source in SOURCES:
+            for doc in results[source][1]:
+                doc.metadata['chunk'] = len(docs)
+                docs.append(doc)
+
+        self.__stage('library', 'index', self.__index.create_library_from_documents, docs)
+
+        raw_data = {source: results[source][0] for source in SOURCES}
+
+        return self.__index, raw_data
+
+def ingest_sources(txt_url: str, pdf_url: str, video_url: str, api_key: str, on_progress=None,
+                   model_performance: str = 'balanced', stream_pdf: bool or None = None,
+                   on_trace=None, video_path: str or None = None) -> tuple[IndexingData, dict]:
+    """
+        This function downloads and processes the three sources concurrently and creates
+        a library with all of them (see IngestionPipeline).
+
+        :param txt_url: A string representing the text GitHub URL
+        :param pdf_url: A string representing the PDF GitHub URL
+        :param video_url: A string representing the video GitHub URL
+        :param api_key: A string representing the OpenAI API key
+        :param on_progress: A function called as `on_progress(source, stage, status, seconds)`
+        :param model_performance: A string representing the Whisper model selection
+        :param stream_pdf: A boolean indicating if the PDF is streamed page by page. If not given,
+        it uses the 'PDF_STREAMING' environment variable (default false)
+        :param on_trace: A function called with the trace of this ingestion (if tracing is enabled)
+        :param video_path: A string representing where the video is saved. Ingestions running at the
+        same time need different files, so if not given, each call uses a new one. The file is
+        deleted at the end (the transcription is cached by the video hash)
+        :return: A tuple with the IndexingData library and the raw data dictionary
+    """
+    if stream_pdf is None:
+        stream_pdf = os.getenv('PDF_STREAMING', '').lower() in ['1', 'true', 'yes']
+
+    if video_path is None:
+        video_path = f'{VIDEO_FOLDER}/{uuid.uuid4().hex}.mp4'
+
+    pipeline = IngestionPipeline(
+        api_key=api_key, on_progress=on_progress, model_performance=model_performance,
+        video_path=video_path, stream_pdf=stream_pdf, on_trace=on_trace
+    )
+
+    try:
+        return pipeline.run(txt_url, pdf_url, video_url)
+    finally:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,269 @@
+# Python libraries
+import os
+import hashlib
+import numpy as np
+
+# Local imports
+from modules.embedding_backends import tokenize
+from modules.managers.folder_manager import check_folder_existence, temp_file_path
+
+LEXICAL_INDEX_NAME = 'lexical_index.npz'
+
+# Words that do not say what a question is about (Portuguese and English, lowercase without accents)
+STOP_WORDS = frozenset('''
+    a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para pra
+    com sem sob sobre entre ate ao aos e ou mas se que quem qual quais quanto quantos quanta quantas
+    como quando onde porque por que nao sim ja mais menos muito muita muitos muitas pouco eu tu ele
+    ela nos vos eles elas voce voces me te lhe meu minha seu sua nosso nossa isso isto esse essa este
+    esta aquele aquela aquilo la aqui ali e sao ser foi era sera ter tem tinha ha pode posso podem
+    faz fazer fala falar diga explique explica explicar sabe saber mim ti
+    the an of to in on at by for with from about into is are was were be been being do does did
+    what which who whom whose how when where why can could would should will shall may might must
+    i you he she it we they me my your his her its our their this that these those and or not no
+    yes tell explain please
+'''.split())
+
+def term_hashes(terms: list[str]) -> np.ndarray:
+    """
+        This function converts words in 64-bit hashes, so the vocabulary is stored as a
+        sorted integer array instead of strings.
+
+        :param terms: A list of strings
+        :return: A NumPy int64 array with the hash of each word
+    """
+    return np.asarray(
+        [int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little', signed=True) for term in terms],
+        dtype=np.int64
+    )
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+        This function combines rankings of chunk IDs (e.g. vector and BM25 results) with the
+        Reciprocal Rank Fusion: each chunk scores the sum of 1 / (k + rank) in every ranking.
+
+        :param rankings: A list with the rankings (lists of chunk IDs, best first)
+        :param k: An integer that reduces the weight of the first positions
+        :return: A list with the chunk IDs sorted by the fused score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank + 1)
+
+    return sorted(scores, key=scores.get, reverse=True)
+
+class BM25Index():
+    def __init__(self, ids: np.ndarray, terms: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                 frequencies: np.ndarray, lengths: np.ndarray, k1: float = 1.5, b: float = 0.75) -> None:
+        """
+            This class is a lexical (BM25) inverted index stored in NumPy arrays. The postings of
+            the term `terms[i]` are `postings[offsets[i]:offsets[i + 1]]` (the chunk rows where the
+            term appears) with their term frequencies. Use `build` to create it from chunks.
+
+            :param ids: A NumPy array with the ID of each chunk (row)
+            :param terms: A NumPy int64 array with the sorted hash of each term
+            :param offsets: A NumPy int64 array with where the postings of each term start
+            :param postings: A NumPy int32 array with the chunk rows of each term
+            :param frequencies: A NumPy float32 array with how many times the term is in the chunk
+            :param lengths: A NumPy float32 array with the number of words of each chunk
+            :param k1: A float representing how fast the score saturates with the term frequency
+            :param b: A float representing how much the chunk length normalizes the score
+        """
+        self.__ids = ids
+        self.__terms = terms
+        self.__offsets = offsets
+        self.__postings = postings
+        self.__frequencies = frequencies
+        self.__lengths = lengths
+        self.__k1 = k1
+        self.__b = b
+
+        # Inverse document frequency of each term
+        n_docs = len(ids)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self.__idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        self.__average_length = float(lengths.mean()) if n_docs else 0.0
+
+    @classmethod
+    def build(cls, ids: list[str], texts: list[str], k1: float = 1.5, b: float = 0.75) -> 'BM25Index':
+        """
+            This method creates the inverted index of the chunks of a library.
+
+            :param ids: A list with the ID of each chunk
+            :param texts: A list with the text of each chunk
+            :param k1: A float representing how fast the score saturates with the term frequency
+            :param b: A float representing how much the chunk length normalizes the score
+            :return: A BM25Index object
+        """
+        rows, hashes, lengths = [], [], []
+        for row, text in enumerate(texts):
+            words = tokenize(text, bigrams=False)
+            rows.extend([row] * len(words))
+            hashes.append(term_hashes(words))
+            lengths.append(len(words))
+
+        hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int32)
+
+        # Sort the (term, chunk) pairs by term and count the repeated pairs
+        order = np.lexsort((rows, hashes))
+        hashes, rows = hashes[order], rows[order]
+
+        new_pair = np.r_[True, (hashes[1:] != hashes[:-1]) | (rows[1:] != rows[:-1])] if len(hashes) else np.empty(0, dtype=bool)
+        starts = np.flatnonzero(new_pair)
+        frequencies = np.diff(np.r_[starts, len(hashes)]).astype(np.float32)
+
+        return cls.__from_pairs(
+            np.asarray(ids, dtype=str), hashes[starts], rows[starts], frequencies, np.asarray(lengths, dtype=np.float32), k1, b
+        )
+
+    @classmethod
+    def __from_pairs(cls, ids: np.ndarray, pair_terms: np.ndarray, postings: np.ndarray, frequencies: np.ndarray,
+                     lengths: np.ndarray, k1: float, b: float) -> 'BM25Index':
+        """
+            This method creates the index from its (term, chunk row, frequency) entries, sorted by
+            term and row.
+
+            :return: A BM25Index object
+        """
+        terms, term_starts = np.unique(pair_terms, return_index=True)
+        offsets = np.r_[term_starts, len(postings)].astype(np.int64)
+
+        return cls(ids, terms, offsets, postings.astype(np.int32), frequencies, lengths, k1, b)
+
+    def update(self, removed_ids: list[str], ids: list[str], texts: list[str]) -> 'BM25Index':
+        """
+            This method creates the index of the library after a source changes: the postings of the
+            removed chunks are dropped and only the new chunks are tokenized, then both are merged.
+
+            :param removed_ids: A list with the IDs of the removed chunks
+            :param ids: A list with the ID of each new chunk
+            :param texts: A list with the text of each new chunk
+            :return: A new BM25Index object
+        """
+        added = BM25Index.build(ids, texts, self.__k1, self.__b)
+
+        # Rows of the kept chunks, renumbered in the same order
+        keep = ~np.isin(self.__ids, np.asarray(removed_ids, dtype=str))
+        new_rows = np.cumsum(keep) - 1
+        kept = keep[self.__postings]
+
+        pair_terms = np.r_[np.repeat(self.__terms, np.diff(self.__offsets))[kept], np.repeat(added.__terms, np.diff(added.__offsets))]
+        postings = np.r_[new_rows[self.__postings[kept]], added.__postings + int(keep.sum())]
+        frequencies = np.r_[self.__frequencies[kept], added.__frequencies]
+
+        order = np.lexsort((postings, pair_terms))
+
+        return BM25Index.__from_pairs(
+            np.r_[self.__ids[keep].astype(str), added.__ids], pair_terms[order], postings[order], frequencies[order],
+            np.r_[self.__lengths[keep], added.__lengths], self.__k1, self.__b
+        )
+
+    def __query_terms(self, query: str or list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+            This method finds the words of a query in the vocabulary.
+
+            :param query: A string or a list with its words
+            :return: A tuple with the position of each known word and a boolean mask of known words
+        """
+        words = tokenize(query, bigrams=False) if isinstance(query, str) else query
+        hashes = term_hashes(words)
+        if not len(hashes) or not len(self.__terms):
+            return np.empty(0, dtype=np.int64), np.zeros(len(hashes), dtype=bool)
+
+        positions = np.minimum(np.searchsorted(self.__terms, hashes), len(self.__terms) - 1)
+        known = self.__terms[positions] == hashes
+
+        return positions[known], known
+
+    def coverage(self, query: str) -> float:
+        """
+            This method measures how much of the query is in the library vocabulary: the fraction of
+            its informative words (not STOP_WORDS or numbers) that are in the library. Words are not
+            stemmed, so synonyms, inflections and other languages count as unknown words.
+
+            :param query: A string
+            :return: A float between 0 (no informative word is known) and 1 (every informative word
+            is known, or the query has none)
+        """
+        words = [word for word in tokenize(query, bigrams=False) if word not in STOP_WORDS and not word.isdigit()]
+        if not words:
+            return 1.0
+
+        _, known = self.__query_terms(words)
+
+        return float(known.mean())
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[str, float]]:
+        """
+            This method returns the chunks with the best BM25 score for a query.
+
+            :param query: A string
+            :param top_k: An integer representing how many chunks are returned
+            :return: A list of (chunk ID, score) tuples, best first
+        """
+        positions, _ = self.__query_terms(query)
+        if not len(positions):
+            return []
+
+        # Postings of every query term (repeated words count again, as in BM25)
+        slices = [np.arange(self.__offsets[position], self.__offsets[position + 1]) for position in positions]
+        entries = np.concatenate(slices)
+        idf = np.repeat(self.__idf[positions], [len(entry) for entry in slices])
+
+        rows = self.__postings[entries]
+        frequencies = self.__frequencies[entries]
+        normalization = self.__k1 * (1 - self.__b + self.__b * self.__lengths[rows] / self.__average_length)
+
+        scores = np.zeros(len(self.__ids), dtype=np.float32)
+        np.add.at(scores, rows, idf * frequencies * (self.__k1 + 1) / (frequencies + normalization))
+
+        top_k = min(top_k, int((scores > 0).sum()))
+        if not top_k:
+            return []
+
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        return [(str(self.__ids[row]), float(scores[row])) for row in best]
+
+    def save(self, path: str):
+        """
+            This method saves the index in a library folder (NumPy arrays, without pickle).
+
+            :param path: A string representing where the library is saved
+        """
+        check_folder_existence(path)
+        temp_path = temp_file_path(os.path.join(path, LEXICAL_INDEX_NAME))
+
+        with open(temp_path, 'wb') as file:
+            np.savez(
+                file, ids=self.__ids, terms=self.__terms, offsets=self.__offsets, postings=self.__postings,
+                frequencies=self.__frequencies, lengths=self.__lengths,
+                params=np.asarray([self.__k1, self.__b], dtype=np.float64)
+            )
+
+        os.replace(temp_path, os.path.join(path, LEXICAL_INDEX_NAME))
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """
+            This method loads an index saved in a library folder.
+
+            :param path: A string representing where the library is saved
+            :return: A BM25Index object
+        """
+        with np.load(os.path.join(path, LEXICAL_INDEX_NAME), allow_pickle=False) as arrays:
+            k1, b = arrays['params'].tolist()
+
+            return cls(
+                arrays['ids'], arrays['terms'], arrays['offsets'], arrays['postings'],
+                arrays['frequencies'], arrays['lengths'], k1, b
+            )
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,113 @@
+# Python libraries
+import json
+import os
+from threading import Lock
+
+# Local imports
+from modules.indexing_data import IndexingData
+
+# Process-wide registries shared by every Streamlit session (one entry per file/folder)
+_libraries = {}
+_raw_data = {}
+
+# Guards the registries themselves, each entry has its own lock to load in parallel
+_registry_lock = Lock()
+
+
+def _files_signature(path: str) -> tuple:
+    """
+        This function creates a signature for a file or a folder based on the name,
+        size and modification time of each file. If any file changes on disk, the
+        signature changes too.
+
+        :param path: A string representing a file or a folder path
+        :return: A tuple that can be compared with a previous signature
+    """
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return ((os.path.basename(path), stat.st_size, stat.st_mtime_ns),)
+
+    signature = []
+    for filename in sorted(os.listdir(path)):
+        stat = os.stat(os.path.join(path, filename))
+        signature.append((filename, stat.st_size, stat.st_mtime_ns))
+
+    return tuple(signature)
+
+def _get_entry(registry: dict, key: tuple) -> dict:
+    """
+        This function returns the registry entry for a key, creating an empty one
+        with its own lock if it does not exist yet.
+
+        :param registry: The registry dictionary (libraries or raw data)
+        :param key: A hashable key representing the entry
+        :return: A dictionary with 'lock', 'signature' and 'value' keys
+    """
+    with _registry_lock:
+        if key not in registry:
+            registry[key] = {'lock': Lock(), 'signature': None, 'value': None}
+
+        return registry[key]
+
+def get_library(api_key: str, path: str) -> IndexingData:
+    """
+        This function returns an IndexingData loaded from a saved library. The library
+        is loaded only once per process and shared between all sessions. It will be
+        loaded again only if the files in the library folder change on disk.
+
+        The returned object must be treated as read-only, because other sessions are
+        using the same instance.
+
+        :param api_key: A string representing the OpenAI API key
+        :param path: A string representing where the local library is saved
+        :return: A shared IndexingData object
+    """
+    entry = _get_entry(_libraries, (os.path.abspath(path), api_key))
+
+    with entry['lock']:
+        signature = _files_signature(path)
+
+        # Load the library only if it was never loaded or its files changed
+        if entry['signature'] != signature:
+            entry['value'] = IndexingData(api_key=api_key, path=path)
+            entry['signature'] = signature
+
+        return entry['value']
+
+def get_raw_data(path: str) -> dict:
+    """
+        This function returns the raw data dictionary saved in a .json file. The file
+        is read only once per process and shared between all sessions. It will be read
+        again only if the file changes on disk.
+
+        The returned dictionary must be treated as read-only, because other sessions
+        are using the same object.
+
+        :param path: A string representing the .json file path
+        :return: A shared dictionary with the raw data
+    """
+    entry = _get_entry(_raw_data, (os.path.abspath(path),))
+
+    with entry['lock']:
+        signature = _files_signature(path)
+
+        # Read the file only if it was never read or it changed
+        if entry['signature'] != signature:
+            with open(path, 'r') as json_file:
+                entry['value'] = json.load(json_file)
+            entry['signature'] = signature
+
+        return entry['value']
+
+def clear_registry():
+    """
+        This function removes every shared library and raw data from the registries,
+        so they will be loaded again on the next call.
+    """
+    with _registry_lock:
+        _libraries.clear()
+        _raw_data.clear()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,273 @@
+# Python libraries
+import os
+import json
+import mmap
+import uuid
+import shutil
+import faiss
+import numpy as np
+
+from langchain.docstore.document import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+# Local imports
+from modules.managers.folder_manager import check_folder_existence, read_json, write_json
+
+# Version of the saved library format (libraries without a manifest are version 0)
+#  - 1: LangChain's format (index.faiss + pickled index.pkl) with a manifest
+#  - 2: memory-mapped format (index.faiss + docstore.jsonl with an offset index), no pickle
+#  - 3: the manifest has the embedding backend (local libraries also save their embedding model)
+#  - 4: each save is written in its own snapshot folder, which the manifest points to
+LIBRARY_VERSION = 4
+
+MANIFEST_NAME = 'manifest.json'
+INDEX_NAME = 'index.faiss'
+DOCSTORE_NAME = 'docstore.jsonl'
+OFFSETS_NAME = 'docstore.offsets.npy'
+IDS_NAME = 'docstore.ids.json'
+SNAPSHOTS_FOLDER = 'snapshots'
+
+def document_source(doc: Document) -> str:
+    """
+        This function returns the source a chunk belongs to. Old libraries do not
+        have the 'source' metadata, so the chunk type is used.
+
+        :param doc: A Langchain's Document object
+        :return: A string representing the source
+    """
+    return doc.metadata.get('source', doc.metadata.get('type'))
+
+def build_manifest(ids: list[str], docs: list[Document], embedding_model: str, index_spec: dict or None = None,
+                   embedding_backend: str = 'openai') -> dict:
+    """
+        This function creates the manifest of a library: its format version, the
+        embedding backend and model, the FAISS index spec and the chunk IDs of each source.
+
+        :param ids: A list with the docstore ID of each chunk
+        :param docs: A list with all Langchain's Document objects of the library
+        :param embedding_model: A string representing the embedding model
+        :param index_spec: A dictionary with the FAISS index spec (see IndexSpec)
+        :param embedding_backend: A string representing the embedding backend ('openai' or 'local')
+        :return: A dictionary with the manifest
+    """
+    sources = {}
+    for id, doc in zip(ids, docs):
+        source = sources.setdefault(document_source(doc), {'type': doc.metadata.get('type'), 'chunks': []})
+        source['chunks'].append(id)
+
+    return {
+        'version': LIBRARY_VERSION,
+        'embedding_backend': embedding_backend,
+        'embedding_model': embedding_model,
+        'index': index_spec or {'factory': 'Flat'},
+        'sources': sources,
+    }
+
+class MappedDocstore(Docstore, AddableMixin):
+    def __init__(self, path: str) -> None:
+        """
+            This class is a read-mostly docstore backed by a JSONL file (one chunk per line) that is
+            memory-mapped, with an offset index to find each line. Chunks are only parsed when they
+            are searched, and many processes loading the same library share the file pages through
+            the OS cache.
+
+            Chunks added or deleted after loading are kept in memory until the library is saved again.
+
+            :param path: A string representing the folder with the library files (see `library_files_path`)
+        """
+        with open(os.path.join(path, IDS_NAME), 'r', encoding='utf-8') as ids_file:
+            self.__ids = json.load(ids_file)
+
+        self.__rows = {id: row for row, id in enumerate(self.__ids)}
+        self.__offsets = np.load(os.path.join(path, OFFSETS_NAME), mmap_mode='r')
+
+        # An empty file can not be memory-mapped
+        with open(os.path.join(path, DOCSTORE_NAME), 'rb') as docstore_file:
+            size = os.fstat(docstore_file.fileno()).st_size
+            self.__mapped = mmap.mmap(docstore_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        self.__added = {}
+        self.__deleted = set()
+
+    def search(self, search: str) -> Document or str:
+        """
+            This method returns the chunk with the given ID.
+
+            :param search: A string representing the chunk ID
+            :return: A Langchain's Document or an error message (as LangChain's docstores do)
+        """
+        if search in self.__added:
+            return self.__added[search]
+
+        row = self.__rows.get(search)
+        if row is None or search in self.__deleted:
+            return f'ID {search} not found.'
+
+        line = json.loads(self.__mapped[int(self.__offsets[row]):int(self.__offsets[row + 1])])
+
+        return Document(page_content=line['page_content'], metadata=line['metadata'])
+
+    def add(self, texts: dict):
+        """
+            This method adds chunks to the docstore (in memory).
+
+            :param texts: A dictionary with ID:Document
+        """
+        for id, doc in texts.items():
+            if id in self.__added or (id in self.__rows and id not in self.__deleted):
+                raise ValueError(f'Tried to add ids that already exist: {id}')
+
+            self.__added[id] = doc
+
+    def delete(self, ids: list):
+        """
+            This method deletes chunks from the docstore.
+
+            :param ids: A list of chunk IDs
+        """
+        for id in ids:
+            if id not in self.__added and (id not in self.__rows or id in self.__deleted):
+                raise ValueError(f'Tried to delete ids that does not exist: {id}')
+
+            self.__added.pop(id, None)
+            if id in self.__rows:
+                self.__deleted.add(id)
+
+def create_snapshot(path: str) -> str:
+    """
+        This function creates an empty folder for the files of a new save of a library. The files
+        are only used after `save_library` points the manifest to it.
+
+        :param path: A string representing where the library is saved
+        :return: A string representing the snapshot folder path
+    """
+    snapshot_path = os.path.join(path, SNAPSHOTS_FOLDER, uuid.uuid4().hex)
+    check_folder_existence(snapshot_path)
+
+    return snapshot_path
+
+def library_files_path(path: str, manifest: dict or None) -> str:
+    """
+        This function returns the folder with the files of a saved library: the snapshot of its
+        manifest (libraries saved before version 4 have the files in the library folder).
+
+        :param path: A string representing where the library is saved
+        :param manifest: A dictionary with the library manifest (None for old libraries)
+        :return: A string representing the folder path
+    """
+    if manifest and manifest.get('snapshot'):
+        return os.path.join(path, manifest['snapshot'])
+
+    return path
+
+def save_library(library: FAISS, path: str, manifest: dict, snapshot_path: str):
+    """
+        This function saves a library in the memory-mapped format: the FAISS index, the chunks in a
+        JSONL file (in the same order of the index rows), the offset of each line and the chunk IDs.
+        The files are written in a new snapshot folder (see `create_snapshot`) and the manifest is
+        replaced at once to point to it, so a process loading the library at the same time reads
+        every file from the old save or every file from the new one, never a mix of both. The
+        previous snapshot is kept for processes that are still loading it, older ones are deleted.
+
+        :param library: A FAISS library
+        :param path: A string representing where the library will be saved
+        :param manifest: A dictionary with the library manifest
+        :param snapshot_path: A string representing the snapshot folder of this save
+    """
+    ids = [library.index_to_docstore_id[row] for row in range(len(library.index_to_docstore_id))]
+
+    offsets = [0]
+    with open(os.path.join(snapshot_path, DOCSTORE_NAME), 'wb') as docstore_file:
+        for id in ids:
+            doc = library.docstore.search(id)
+            line = json.dumps({'id': id, 'page_content': doc.page_content, 'metadata': doc.metadata}, ensure_ascii=False)
+            line = line.encode('utf-8') + b'\n'
+
+            docstore_file.write(line)
+            offsets.append(offsets[-1] + len(line))
+
+    with open(os.path.join(snapshot_path, OFFSETS_NAME), 'wb') as offsets_file:
+        np.save(offsets_file, np.asarray(offsets, dtype=np.int64))
+
+    with open(os.path.join(snapshot_path, IDS_NAME), 'w', encoding='utf-8') as ids_file:
+        json.dump(ids, ids_file)
+
+    faiss.write_index(library.index, os.path.join(snapshot_path, INDEX_NAME))
+
+    previous = (read_manifest(path) or {}).get('snapshot')
+    snapshot = os.path.relpath(snapshot_path, path)
+
+    # The manifest is written with a temporary name and renamed (see `write_json`)
+    write_manifest(path, {**manifest, 'version': LIBRARY_VERSION, 'format': 'mmap', 'snapshot': snapshot})
+
+    for name in os.listdir(os.path.join(path, SNAPSHOTS_FOLDER)):
+        if os.path.join(SNAPSHOTS_FOLDER, name) not in [snapshot, previous]:
+            shutil.rmtree(os.path.join(path, SNAPSHOTS_FOLDER, name), ignore_errors=True)
+
+def load_library(path: str, embeddings, manifest: dict or None) -> tuple[FAISS, bool]:
+    """
+        This function loads a saved library. Libraries in the memory-mapped format are loaded
+        without reading the vectors or the chunks in memory (and without pickle). Older libraries
+        are loaded with LangChain's format.
+
+        :param path: A string representing where the library is saved
+        :param embeddings: The LangChain embeddings object used for queries
+        :param manifest: A dictionary with the library manifest (None for old libraries)
+        :return: A tuple with the FAISS library and if its index is memory-mapped (read-only)
+    """
+    if not manifest or manifest.get('format') != 'mmap':
+        # Old libraries were saved with pickle, so they need the dangerous deserialization
+        library = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        return library, False
+
+    files_path = library_files_path(path, manifest)
+
+    try:
+        index = faiss.read_index(os.path.join(files_path, INDEX_NAME), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        mapped = True
+    except RuntimeError:
+        # Not every index type can be memory-mapped
+        index = faiss.read_index(os.path.join(files_path, INDEX_NAME))
+        mapped = False
+
+    docstore = MappedDocstore(files_path)
+    with open(os.path.join(files_path, IDS_NAME), 'r', encoding='utf-8') as ids_file:
+        index_to_docstore_id = dict(enumerate(json.load(ids_file)))
+
+    # Rows pointing to the wrong chunks would give wrong answers without any error
+    if len(index_to_docstore_id) != index.ntotal:
+        raise ValueError(f'The library in {files_path!r} has {index.ntotal} vectors but {len(index_to_docstore_id)} chunk IDs.')
+
+    return FAISS(embeddings, index, docstore, index_to_docstore_id), mapped
+
+def make_writable(library: FAISS):
+    """
+        This function replaces a memory-mapped (read-only) index by a copy in memory, so vectors
+        can be added or removed.
+
+        :param library: A FAISS library
+    """
+    library.index = faiss.deserialize_index(faiss.serialize_index(library.index))
+
+def read_manifest(path: str) -> dict or None:
+    """
+        This function reads the manifest of a saved library.
+
+        :param path: A string representing where the library is saved
+        :return: A dictionary with the manifest or None if the library has no manifest
+    """
+    return read_json(os.path.join(path, MANIFEST_NAME))
+
+def write_manifest(path: str, manifest: dict):
+    """
+        This function saves the manifest of a library.
+
+        :param path: A string representing where the library is saved
+        :param manifest: A dictionary with the manifest
+    """
+    write_json(os.path.join(path, MANIFEST_NAME), manifest)
+
+
+if __name__ == '__main__':
+    pass
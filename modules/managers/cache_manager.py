@@ -0,0 +1,91 @@
+# Python libraries
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache():
+    def __init__(self, max_size: int = 256, ttl: float or None = None) -> None:
+        """
+            This class is a thread-safe Least Recently Used (LRU) cache. When the cache is
+            full, the item that was not used for the longest time is removed.
+
+            :param max_size: An integer representing how many items the cache can hold
+            :param ttl: A float representing how many seconds an item stays in the cache after
+            being stored. If not given, items only leave the cache when it is full
+        """
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__items = OrderedDict()
+        self.__lock = Lock()
+
+    def __is_expired(self, expires_at: float or None) -> bool:
+        return expires_at is not None and time.monotonic() >= expires_at
+
+    def get(self, key, default=None):
+        """
+            This method returns the cached value for a key and marks it as recently used.
+
+            :param key: A hashable key
+            :param default: The value returned if the key is not cached
+        """
+        with self.__lock:
+            if key not in self.__items:
+                return default
+
+            value, expires_at = self.__items[key]
+            if self.__is_expired(expires_at):
+                del self.__items[key]
+                return default
+
+            self.__items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+            This method stores a value in the cache, removing the least recently used
+            item if the cache is full.
+
+            :param key: A hashable key
+            :param value: Any value to be cached
+        """
+        with self.__lock:
+            expires_at = time.monotonic() + self.__ttl if self.__ttl else None
+
+            self.__items[key] = (value, expires_at)
+            self.__items.move_to_end(key)
+
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
+
+    def items(self) -> list[tuple]:
+        """
+            This method returns a copy of the items that did not expire, from the least to the
+            most recently used. It does not change their order.
+
+            :return: A list of (key, value) tuples
+        """
+        with self.__lock:
+            for key in [key for key, (_, expires_at) in self.__items.items() if self.__is_expired(expires_at)]:
+                del self.__items[key]
+
+            return [(key, value) for key, (value, _) in self.__items.items()]
+
+    def clear(self):
+        """
+            This method removes every item from the cache.
+        """
+        with self.__lock:
+            self.__items.clear()
+
+    def __contains__(self, key) -> bool:
+        with self.__lock:
+            return key in self.__items and not self.__is_expired(self.__items[key][1])
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__items)
+
+
+if __name__ == '__main__':
+    pass
@@ -1,5 +1,8 @@
 # Python libraries
 import os
+import json
+import uuid
+import hashlib
 from shutil import rmtree
 
 def check_folder_existence(folder_path:str):
@@ -61,6 +64,69 @@ def delete_file(file_path: str):
     except Exception as e:
         print(f'Failed to delete {file_path!r}. Error: {e}')
 
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+        This function calculates the SHA-256 of a file reading it in chunks.
+
+        :param file_path: A string containing the file path
+        :param chunk_size: An integer representing how many bytes are read at a time
+        :return: A string with the SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def read_json(file_path: str) -> dict or None:
+    """
+        This function reads a .json file. If the file does not exist or is not a valid
+        .json, it returns None.
+
+        :param file_path: A string containing the file path
+        :return: The loaded content or None
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+def temp_file_path(file_path: str) -> str:
+    """
+        This function returns a unique temporary name next to a file. The name is unique for
+        each call (not only for each process), so threads writing the same file do not rename
+        each other's temporary file.
+
+        :param file_path: A string containing the final file path
+        :return: A string containing the temporary file path
+    """
+    return f'{file_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+
+def write_json(file_path: str, content):
+    """
+        This function writes a content in a .json file. The content is written in a temporary
+        file first and then renamed, so a reader never sees a half-written file.
+
+        :param file_path: A string containing the file path
+        :param content: Any content that can be saved as JSON
+    """
+    max_char = file_path.rfind('/')
+    if max_char > 0:
+        check_folder_existence(file_path[:max_char])
+
+    temp_path = temp_file_path(file_path)
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as json_file:
+            json.dump(content, json_file, ensure_ascii=False)
+
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,210 @@
+# Python libraries
+import os
+import time
+import hashlib
+import requests
+
+from shutil import copyfile
+from threading import Lock
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Local imports
+from modules.managers.folder_manager import check_folder_existence, read_json, temp_file_path, write_json
+
+DEFAULT_CACHE_PATH = 'data/cache/http'
+
+class FetchResponse():
+    def __init__(self, url: str, content: bytes or None, status_code: int, from_cache: bool,
+                 encoding: str or None = None, path: str or None = None, sha256: str or None = None) -> None:
+        """
+            This class represents the result of a FetchClient request.
+
+            :param url: A string representing the requested URL
+            :param content: The response body (None when it was saved to a file)
+            :param status_code: An integer representing the HTTP status code returned by the server
+            (304 when the cached body was used)
+            :param from_cache: A boolean indicating if the body came from the on-disk cache
+            :param encoding: A string representing the text encoding sent by the server
+            :param path: A string representing the file where the body is saved
+            :param sha256: A string with the SHA-256 hex digest of the body
+        """
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.from_cache = from_cache
+        self.encoding = encoding
+        self.path = path
+        self.sha256 = sha256
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+class FetchClient():
+    def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, timeout: tuple = (5, 60), retries: int = 3,
+                 backoff_factor: float = 0.5, pool_size: int = 10, max_age: float = 60.0) -> None:
+        """
+            This class is a shared HTTP client. It reuses connections (pool), retries failed requests
+            with exponential backoff and saves every response in an on-disk cache. Cached responses are
+            validated with ETag/Last-Modified conditional requests, so unchanged files return a 304
+            without downloading the body again.
+
+            :param cache_path: A string representing the folder of the on-disk cache
+            :param timeout: A tuple with the connect and read timeouts in seconds
+            :param retries: An integer representing how many times a failed request is retried
+            :param backoff_factor: A float used to calculate the wait between retries
+            :param pool_size: An integer representing how many connections are kept per host
+            :param max_age: A float representing how many seconds a cached response is used without
+            asking the server again
+        """
+        self.__cache_path = cache_path
+        self.__timeout = timeout
+        self.__max_age = max_age
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET', 'HEAD'],
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.__session = requests.Session()
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+        # One lock per URL, so the same file is not downloaded twice at the same time
+        self.__locks = {}
+        self.__locks_lock = Lock()
+
+        check_folder_existence(cache_path)
+
+    def __url_lock(self, url: str) -> Lock:
+        with self.__locks_lock:
+            return self.__locks.setdefault(url, Lock())
+
+    def __cache_paths(self, url: str) -> tuple[str, str]:
+        """
+            This method returns where the body and the metadata of an URL are cached.
+
+            :param url: A string representing the URL
+            :return: A tuple with the body path and the metadata path
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return f'{self.__cache_path}/{key}.body', f'{self.__cache_path}/{key}.json'
+
+    def __conditional_headers(self, meta: dict or None) -> dict:
+        """
+            This method creates the conditional request headers based on the cached metadata.
+
+            :param meta: The cached metadata of the URL
+            :return: A dictionary with the headers
+        """
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def __is_fresh(self, meta: dict or None, body_path: str) -> bool:
+        return bool(meta) and os.path.exists(body_path) and time.time() - meta['fetched_at'] < self.__max_age
+
+    def __fetch(self, url: str) -> tuple[dict, int, bool]:
+        """
+            This method makes sure the body of an URL is in the cache, downloading it only if the
+            server says it changed. The body is streamed to the cache file.
+
+            :param url: A string representing the URL
+            :return: A tuple with the cached metadata, the status code and if it came from cache
+        """
+        body_path, meta_path = self.__cache_paths(url)
+
+        with self.__url_lock(url):
+            meta = read_json(meta_path)
+            if not os.path.exists(body_path):
+                meta = None
+
+            # Cached recently, there's no need to ask the server
+            if self.__is_fresh(meta, body_path):
+                return meta, 304, True
+
+            with self.__session.get(url, headers=self.__conditional_headers(meta), timeout=self.__timeout,
+                                    stream=True) as response:
+                # The file did not change
+                if response.status_code == 304 and meta:
+                    meta['fetched_at'] = time.time()
+                    write_json(meta_path, meta)
+                    return meta, 304, True
+
+                if response.status_code != 200:
+                    raise ValueError(f"Failed to retrieve data from {url!r}. Status code: {response.status_code}")
+
+                # Stream the body to the cache calculating its SHA-256
+                digest = hashlib.sha256()
+                temp_path = temp_file_path(body_path)
+                with open(temp_path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        if chunk:
+                            file.write(chunk)
+                            digest.update(chunk)
+                os.replace(temp_path, body_path)
+
+                meta = {
+                    'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'encoding': response.encoding,
+                    'sha256': digest.hexdigest(),
+                    'fetched_at': time.time(),
+                }
+                write_json(meta_path, meta)
+
+                return meta, 200, False
+
+    def get(self, url: str) -> FetchResponse:
+        """
+            This method returns the body of an URL, from the cache if it did not change.
+
+            :param url: A string representing the URL
+            :return: A FetchResponse with the body in `content`
+        """
+        meta, status_code, from_cache = self.__fetch(url)
+        body_path, _ = self.__cache_paths(url)
+
+        with open(body_path, 'rb') as file:
+            content = file.read()
+
+        return FetchResponse(url, content, status_code, from_cache, encoding=meta.get('encoding'),
+                             path=body_path, sha256=meta['sha256'])
+
+    def download(self, url: str, save_path: str) -> FetchResponse:
+        """
+            This method saves the body of an URL in a local file, without loading it in memory.
+
+            :param url: A string representing the URL
+            :param save_path: A string containing the local to save the file
+            :return: A FetchResponse with the file `path` and its `sha256`
+        """
+        meta, status_code, from_cache = self.__fetch(url)
+        body_path, _ = self.__cache_paths(url)
+
+        max_char = save_path.rfind('/')
+        if max_char > 0:
+            check_folder_existence(save_path[:max_char])
+
+        copyfile(body_path, save_path)
+
+        return FetchResponse(url, None, status_code, from_cache, encoding=meta.get('encoding'),
+                             path=save_path, sha256=meta['sha256'])
+
+
+# Process-wide client shared by every session
+fetch_client = FetchClient()
+
+
+if __name__ == '__main__':
+    pass
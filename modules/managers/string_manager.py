@@ -1,6 +1,7 @@
 # Python libraries
 import numpy as np
 
+from bisect import bisect_right
 from re import findall
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
@@ -88,6 +89,36 @@ def find_best_match_positions(text, substrings):
 
     return best_beginning_match, best_end_match
 
+def build_offset_index(substrings: list[str]) -> list[int]:
+    """
+    Build a sorted index with the character offset where each substring starts when
+    all substrings are joined together (''.join(substrings)).
+
+    :param substrings: List of substrings (e.g. PDF pages or video segments).
+    :return: A list with the start offset of each substring.
+    """
+    offsets = []
+    position = 0
+    for substring in substrings:
+        offsets.append(position)
+        position += len(substring)
+
+    return offsets
+
+def find_offset_span(offsets: list[int], start: int, end: int) -> tuple[int, int]:
+    """
+    Find which substrings contain a span of the joined text using binary search.
+
+    :param offsets: The sorted start offsets created by `build_offset_index`.
+    :param start: The character offset where the span starts.
+    :param end: The character offset where the span ends (exclusive).
+    :return: The index of the first and the last substring containing the span.
+    """
+    first = max(bisect_right(offsets, start) - 1, 0)
+    last = max(bisect_right(offsets, max(end - 1, start)) - 1, first)
+
+    return first, last
+
 
 if __name__ == '__main__':
     extract_numbers()
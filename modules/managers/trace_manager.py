@@ -0,0 +1,296 @@
+# Python libraries
+import os
+import json
+import time
+import uuid
+
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+# Local imports
+from modules.managers.folder_manager import check_folder_existence
+
+# Upper bounds (seconds) of the latency histograms, from a cache hit to a long video transcription
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Span running in the current thread/task (its children are added to the same trace)
+_current_span = ContextVar('current_span', default=None)
+
+class Histogram():
+    def __init__(self, buckets: tuple = HISTOGRAM_BUCKETS) -> None:
+        """
+            This class is a thread-safe latency histogram in the Prometheus format (cumulative
+            buckets, sum and count).
+
+            :param buckets: A tuple with the upper bound of each bucket in seconds
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.__lock = Lock()
+
+    def observe(self, seconds: float):
+        with self.__lock:
+            self.counts[bisect_left(self.buckets, seconds)] += 1
+            self.sum += seconds
+            self.count += 1
+
+class Span():
+    def __init__(self, tracer: 'Tracer', name: str, attributes: dict) -> None:
+        """
+            This class measures one stage. Spans opened inside another span (in the same thread,
+            task or copied context) are its children, and the span without a parent (root) collects
+            the whole trace. Use it with `tracer.span(name)`.
+
+            :param tracer: The Tracer that records the span
+            :param name: A string representing the stage name
+            :param attributes: A dictionary with extra information about the stage
+        """
+        self.name = name
+        self.attributes = attributes
+        self.id = uuid.uuid4().hex[:16]
+
+        self.__tracer = tracer
+        self.__parent = None
+        self.__root = None
+        self.__start = None
+        self.__spans = None
+        self.__trace = None
+
+    def __enter__(self) -> 'Span':
+        self.__parent = _current_span.get()
+        self.__spans = self.__parent.__spans if self.__parent else []
+        self.__root = self.__parent.__root if self.__parent else self
+        self.__start = time.perf_counter()
+
+        _current_span.set(self)
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        seconds = time.perf_counter() - self.__start
+
+        # The previous span is set again (a token reset fails when a generator is resumed in another context)
+        _current_span.set(self.__parent)
+
+        if error_type is not None:
+            self.attributes['error'] = error_type.__name__
+
+        self.__spans.append({
+            'name': self.name,
+            'span_id': self.id,
+            'parent_id': self.__parent.id if self.__parent else None,
+            'start_ms': (self.__start - self.__root.__start) * 1000,
+            'duration_ms': seconds * 1000,
+            'attributes': self.attributes,
+        })
+        self.__tracer.observe(self.name, seconds)
+
+        if self.__parent is None:
+            self.__trace = {
+                'trace_id': self.id,
+                'name': self.name,
+                'started_at': time.time() - seconds,
+                'duration_ms': seconds * 1000,
+                'spans': sorted(self.__spans, key=lambda span: span['start_ms']),
+            }
+            self.__tracer.finish(self.__trace)
+
+        return False
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict or None:
+        """
+            This method returns the trace of a finished root span.
+
+            :return: A dictionary with the trace or None if it is not a finished root span
+        """
+        return self.__trace
+
+class NoopSpan():
+    """
+        This class is returned when tracing is disabled, so instrumented code costs almost nothing.
+    """
+    def __enter__(self) -> 'NoopSpan':
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        return False
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def to_dict(self) -> None:
+        return None
+
+NOOP_SPAN = NoopSpan()
+
+class Tracer():
+    def __init__(self, enabled: bool = False, path: str or None = None, recent_size: int = 100) -> None:
+        """
+            This class records the time of each instrumented stage (spans). When it is disabled,
+            `span` returns a shared object that does nothing. When it is enabled:
+
+             - each finished trace (a root span and its children) is kept in memory (recent traces)
+             - each finished trace is written as a line of a JSONL file (if `path` is given)
+             - the duration of each span is added to a latency histogram (Prometheus format)
+
+            :param enabled: A boolean indicating if spans are recorded
+            :param path: A string representing the JSONL file where the traces are written
+            :param recent_size: An integer representing how many traces are kept in memory
+        """
+        self.enabled = enabled
+        self.__path = path
+        self.__recent = deque(maxlen=recent_size)
+        self.__histograms = {}
+        self.__lock = Lock()
+
+        if path:
+            max_char = path.rfind('/')
+            if max_char > 0:
+                check_folder_existence(path[:max_char])
+
+    def span(self, name: str, **attributes) -> Span or NoopSpan:
+        """
+            This method creates a span to be used in a `with` block.
+
+            :param name: A string representing the stage name (e.g. 'retrieve_context.llm')
+            :return: A Span or a NoopSpan if tracing is disabled
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+
+        return Span(self, name, attributes)
+
+    def observe(self, name: str, seconds: float):
+        """
+            This method adds a span duration to the histogram of its name.
+
+            :param name: A string representing the stage name
+            :param seconds: A float representing the duration
+        """
+        histogram = self.__histograms.get(name)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(name, Histogram())
+
+        histogram.observe(seconds)
+
+    def finish(self, trace: dict):
+        """
+            This method keeps a finished trace in memory and writes it to the JSONL file.
+
+            :param trace: A dictionary with the trace
+        """
+        self.__recent.append(trace)
+
+        if self.__path:
+            line = json.dumps(trace, ensure_ascii=False, default=str)
+            with self.__lock, open(self.__path, 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
+
+    def recent_traces(self, name: str or None = None) -> list[dict]:
+        """
+            This method returns the traces kept in memory, the most recent last.
+
+            :param name: A string. If given, only traces with this root name are returned
+            :return: A list of dictionaries
+        """
+        return [trace for trace in list(self.__recent) if name is None or trace['name'] == name]
+
+    def render_metrics(self) -> str:
+        """
+            This method creates the latency histograms in the Prometheus text format.
+
+            :return: A string with the metrics
+        """
+        lines = [
+            '# HELP chat_assistant_stage_seconds Duration of the instrumented stages.',
+            '# TYPE chat_assistant_stage_seconds histogram',
+        ]
+
+        with self.__lock:
+            histograms = sorted(self.__histograms.items())
+
+        for name, histogram in histograms:
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'chat_assistant_stage_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+
+            lines.append(f'chat_assistant_stage_seconds_sum{{stage="{label}"}} {histogram.sum}')
+            lines.append(f'chat_assistant_stage_seconds_count{{stage="{label}"}} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+def _create_tracer() -> Tracer:
+    """
+        This function creates the process tracer configured by the 'TRACING', 'TRACE_PATH' and
+        'METRICS_PORT' environment variables. Setting a trace file or a metrics port also
+        enables tracing.
+
+        :return: A Tracer object
+    """
+    path = os.getenv('TRACE_PATH') or None
+    enabled = os.getenv('TRACING', '').lower() in ['1', 'true', 'yes'] or bool(path) or bool(os.getenv('METRICS_PORT'))
+
+    return Tracer(enabled=enabled, path=path)
+
+# Process-wide tracer used by every instrumented module
+tracer = _create_tracer()
+
+_metrics_server = None
+_metrics_lock = Lock()
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """
+        This function starts (only once per process) a HTTP server in a background thread that
+        answers GET /metrics with the latency histograms in the Prometheus text format.
+
+        :param port: An integer representing the port
+        :param host: A string representing the interface the server listens to
+        :return: The running server
+    """
+    global _metrics_server
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+
+            content = tracer.render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    with _metrics_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), Handler)
+            Thread(target=_metrics_server.serve_forever, daemon=True, name='metrics').start()
+
+    return _metrics_server
+
+def start_metrics_server_from_environment():
+    """
+        This function starts the metrics server if the 'METRICS_PORT' environment variable is set.
+    """
+    port = os.getenv('METRICS_PORT')
+    if port:
+        start_metrics_server(int(port))
+
+
+if __name__ == '__main__':
+    pass
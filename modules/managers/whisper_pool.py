@@ -0,0 +1,179 @@
+# Python libraries
+import os
+import time
+import whisper
+
+from contextlib import contextmanager
+from threading import Lock, Semaphore, Thread
+
+# Select the model based on the performance users need
+# VRAM: large 10 GB / medium 5 GB / small 2 GB / base 1 GB / tiny 1 GB (superfast)
+MODEL_OPTIONS = {
+    'speed': 'tiny',
+    'balanced': 'small',
+    'accuracy': 'medium'
+}
+
+class WhisperModelPool():
+    def __init__(self, idle_ttl: float = 600.0, max_concurrency: int = 1) -> None:
+        """
+            This class keeps Whisper models loaded in memory, one per performance tier ('speed',
+            'balanced' or 'accuracy'), so they are not loaded again on every transcription. Each
+            model is loaded only once even if many sessions ask for it at the same time.
+
+            Models not used for `idle_ttl` seconds are removed from memory by a background thread.
+
+            :param idle_ttl: A float representing how many seconds an idle model stays loaded. If
+            zero or negative, models are never removed
+            :param max_concurrency: An integer representing how many transcriptions can use the
+            same model at the same time
+        """
+        self.__idle_ttl = idle_ttl
+        self.__max_concurrency = max_concurrency
+        self.__entries = {}
+        self.__lock = Lock()
+        self.__reaper = None
+
+    def __get_entry(self, model_performance: str) -> dict:
+        """
+            This method returns the pool entry of a tier, creating an empty one if needed.
+
+            :param model_performance: A string representing the performance tier
+            :return: A dictionary with the entry data
+        """
+        if model_performance not in MODEL_OPTIONS:
+            raise ValueError(f'Invalid model performance {model_performance!r}. Use one of {list(MODEL_OPTIONS)}.')
+
+        with self.__lock:
+            if model_performance not in self.__entries:
+                self.__entries[model_performance] = {
+                    'model': None,
+                    'load_lock': Lock(),
+                    'semaphore': Semaphore(self.__max_concurrency),
+                    'in_use': 0,
+                    'last_used': time.monotonic(),
+                }
+
+            return self.__entries[model_performance]
+
+    def __load(self, model_performance: str, entry: dict):
+        """
+            This method loads the Whisper model of an entry if it is not loaded yet.
+
+            :param model_performance: A string representing the performance tier
+            :param entry: The pool entry of the tier
+        """
+        with entry['load_lock']:
+            if entry['model'] is None:
+                entry['model'] = whisper.load_model(MODEL_OPTIONS[model_performance])
+                entry['last_used'] = time.monotonic()
+
+        self.__start_reaper()
+
+    def preload(self, tiers: list[str] or str = ('balanced',)):
+        """
+            This method loads the models of the given tiers before they are needed.
+
+            :param tiers: A list of performance tiers (or a single tier)
+        """
+        if isinstance(tiers, str):
+            tiers = [tiers]
+
+        for model_performance in tiers:
+            self.__load(model_performance, self.__get_entry(model_performance))
+
+    @contextmanager
+    def acquire(self, model_performance: str = 'balanced'):
+        """
+            This method lends a loaded Whisper model. If the model is being used by
+            `max_concurrency` transcriptions, it waits until one of them finishes.
+
+            :param model_performance: A string representing the performance tier
+            :return: A Whisper model (used in a `with` statement)
+        """
+        entry = self.__get_entry(model_performance)
+
+        with entry['semaphore']:
+            with self.__lock:
+                entry['in_use'] += 1
+
+            try:
+                self.__load(model_performance, entry)
+                yield entry['model']
+            finally:
+                with self.__lock:
+                    entry['in_use'] -= 1
+                    entry['last_used'] = time.monotonic()
+
+    def evict_idle(self) -> list[str]:
+        """
+            This method removes from memory the models not used for more than `idle_ttl` seconds.
+
+            :return: A list with the evicted tiers
+        """
+        evicted = []
+        now = time.monotonic()
+
+        with self.__lock:
+            for model_performance, entry in self.__entries.items():
+                idle = now - entry['last_used']
+                if entry['model'] is not None and entry['in_use'] == 0 and idle > self.__idle_ttl:
+                    entry['model'] = None
+                    evicted.append(model_performance)
+
+        return evicted
+
+    def clear(self):
+        """
+            This method removes every idle model from memory.
+        """
+        with self.__lock:
+            for entry in self.__entries.values():
+                if entry['in_use'] == 0:
+                    entry['model'] = None
+
+    def __start_reaper(self):
+        """
+            This method starts (only once) the background thread that evicts idle models.
+        """
+        if self.__idle_ttl <= 0:
+            return
+
+        with self.__lock:
+            if self.__reaper is not None:
+                return
+
+            self.__reaper = Thread(target=self.__reap, name='whisper-pool-reaper', daemon=True)
+            self.__reaper.start()
+
+    def __reap(self):
+        """
+            This method runs in the background thread, checking for idle models periodically.
+        """
+        while True:
+            time.sleep(max(self.__idle_ttl / 2, 1.0))
+            self.evict_idle()
+
+    @property
+    def loaded_tiers(self) -> list[str]:
+        with self.__lock:
+            return [tier for tier, entry in self.__entries.items() if entry['model'] is not None]
+
+
+# Process-wide pool, configured by environment variables
+whisper_pool = WhisperModelPool(
+    idle_ttl=float(os.getenv('WHISPER_IDLE_TTL', 600)),
+    max_concurrency=int(os.getenv('WHISPER_MAX_CONCURRENCY', 1)),
+)
+
+def preload_from_environment():
+    """
+        This function preloads the tiers listed in the 'WHISPER_PRELOAD' environment variable
+        (comma separated, e.g. 'speed,balanced'). Tiers already loaded are not loaded again.
+    """
+    tiers = [tier.strip() for tier in os.getenv('WHISPER_PRELOAD', '').split(',') if tier.strip()]
+    whisper_pool.preload(tiers)
+
+
+if __name__ == '__main__':
+    preload_from_environment()
@@ -1,20 +1,34 @@
 # Python libraries
+import os
+import numpy as np
 import tiktoken
 
+from functools import lru_cache
+from itertools import accumulate
+
 # Local imports
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name: str = 'p50k_base') -> tiktoken.Encoding:
+    """
+        This function returns a tiktoken encoder. The encoder is created only once
+        per process and reused by every call.
+
+        :param encoding_name: A string representing the tiktoken encoding
+        :return: A tiktoken Encoding object
+    """
+    return tiktoken.get_encoding(encoding_name)
+
 def tiktoken_len(text: str) -> int:
     """
-        This function receives a text (string) and returns the size the 
+        This function receives a text (string) and returns the size the
         tokenized text.
 
         :param text: Any kind of string
         :return: A integer representing the size of the string in tokens
     """
-    tokenizer = tiktoken.get_encoding('p50k_base')
-
-    tokens = tokenizer.encode(
+    tokens = get_encoder().encode(
         text,
         disallowed_special=()
     )
@@ -23,10 +37,10 @@ def tiktoken_len(text: str) -> int:
 
 def create_text_splitter(chunk_size: int = 500) -> RecursiveCharacterTextSplitter:
     """
-        This function creates a recursive text splitter based on the size of the 
+        This function creates a recursive text splitter based on the size of the
         text in tokens.
 
-        :param chunk_size: An integer representing the max size of the string 
+        :param chunk_size: An integer representing the max size of the string
         in tokens
         :return: A LangChain's RecursiveCharacterTextSplitter object
     """
@@ -39,5 +53,154 @@ def create_text_splitter(chunk_size: int = 500) -> RecursiveCharacterTextSplitte
 
     return text_splitter
 
+class TokenChunkSplitter():
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 20, encoding_name: str = 'p50k_base',
+                 num_threads: int or None = None) -> None:
+        """
+            This class splits texts in chunks directly at token boundaries. Each text is tokenized
+            only once and all texts are tokenized together (in parallel threads) with the encoder
+            `encode_batch`, instead of measuring the size of every candidate split again.
+
+            Chunks are always exact substrings of the original text, so their character offsets
+            are returned too.
+
+            :param chunk_size: An integer representing the max size of each chunk in tokens
+            :param chunk_overlap: An integer representing how many tokens two chunks share
+            :param encoding_name: A string representing the tiktoken encoding
+            :param num_threads: An integer representing how many threads tokenize the texts. If
+            not given, it uses the number of CPU cores
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f'The chunk overlap ({chunk_overlap}) must be lower than the chunk size ({chunk_size}).')
+
+        self.__chunk_size = chunk_size
+        self.__chunk_overlap = chunk_overlap
+        self.__encoder = get_encoder(encoding_name)
+        self.__num_threads = num_threads or os.cpu_count() or 1
+
+    def split_text(self, text: str) -> list[str]:
+        """
+            This method splits one text in chunks.
+
+            :param text: Any kind of string
+            :return: A list with the text chunks
+        """
+        return [chunk for chunk, _, _ in self.split_texts_with_offsets([text])[0]]
+
+    def split_texts_with_offsets(self, texts: list[str]) -> list[list[tuple[str, int, int]]]:
+        """
+            This method splits many texts in chunks, tokenizing all of them in one batch.
+
+            :param texts: A list of strings
+            :return: A list (one item per text) of lists of tuples with the chunk text, and
+            its start and end (exclusive) character offsets in the original text
+        """
+        tokens_batch = self.__encoder.encode_batch(
+            texts,
+            num_threads=self.__num_threads,
+            disallowed_special=()
+        )
+
+        return [self.__cut(text, tokens) for text, tokens in zip(texts, tokens_batch)]
+
+    def split_stream(self, texts):
+        """
+            This method splits a stream of texts (e.g. PDF pages) as if they were one text joined
+            together, without keeping all of them in memory. Each text is tokenized only once and only
+            the tokens of the current chunk are buffered.
+
+            :param texts: An iterable (e.g. a generator) of strings
+            :return: A generator of tuples with the chunk text, and the index of the first and the
+            last text the chunk came from
+        """
+        step = self.__chunk_size - self.__chunk_overlap
+        tokens, owners = [], []
+        emitted = False
+
+        for index, text in enumerate(texts):
+            new_tokens = self.__encoder.encode(text, disallowed_special=())
+            tokens.extend(new_tokens)
+            owners.extend([index] * len(new_tokens))
+
+            # Emit every full chunk and keep the overlap for the next one
+            while len(tokens) >= self.__chunk_size:
+                chunk = self.__decode(tokens[:self.__chunk_size])
+                if chunk.strip():
+                    yield chunk, owners[0], owners[self.__chunk_size - 1]
+
+                emitted = True
+                del tokens[:step]
+                del owners[:step]
+
+        # The remaining tokens are a new chunk only if they are not just the overlap
+        if tokens and (not emitted or len(tokens) > self.__chunk_overlap):
+            chunk = self.__decode(tokens)
+            if chunk.strip():
+                yield chunk, owners[0], owners[-1]
+
+    def __decode(self, tokens: list[int]) -> str:
+        """
+            This method decodes tokens to text, ignoring a multi-byte character cut in the borders.
+
+            :param tokens: A list of tokens
+            :return: The decoded string
+        """
+        return b''.join(self.__encoder.decode_tokens_bytes(tokens)).decode('utf-8', errors='ignore')
+
+    def __cut(self, text: str, tokens: list[int]) -> list[tuple[str, int, int]]:
+        """
+            This method cuts a tokenized text in chunks of `chunk_size` tokens with `chunk_overlap`
+            tokens in common. Token boundaries are converted from bytes to characters, so a chunk
+            never breaks a multi-byte character.
+
+            :param text: The original text
+            :param tokens: The tokens of the text
+            :return: A list of tuples with the chunk text, and its start and end character offsets
+        """
+        if not tokens:
+            return []
+
+        # Byte offset where each token starts (and the end of the last one)
+        byte_offsets = [0] + list(accumulate(len(b) for b in self.__encoder.decode_tokens_bytes(tokens)))
+
+        # Convert byte offsets to character offsets (only needed for non-ASCII texts)
+        if text.isascii():
+            char_floor = char_ceil = lambda position: position
+        else:
+            buffer = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+            is_char_start = (buffer & 0xC0) != 0x80
+            chars_before = np.concatenate(([0], np.cumsum(is_char_start)))
+            is_char_start = np.append(is_char_start, True)
+
+            char_ceil = lambda position: int(chars_before[position])
+            char_floor = lambda position: int(chars_before[position]) - (0 if is_char_start[position] else 1)
+
+        chunks = []
+        step = self.__chunk_size - self.__chunk_overlap
+
+        for first in range(0, len(tokens), step):
+            last = min(first + self.__chunk_size, len(tokens))
+
+            start, end = char_floor(byte_offsets[first]), char_ceil(byte_offsets[last])
+            chunk = text[start:end]
+
+            if chunk.strip():
+                chunks.append((chunk, start, end))
+
+            if last == len(tokens):
+                break
+
+        return chunks
+
+def create_token_splitter(chunk_size: int = 500) -> TokenChunkSplitter:
+    """
+        This function creates a splitter that cuts the text directly at token boundaries.
+
+        :param chunk_size: An integer representing the max size of the string
+        in tokens
+        :return: A TokenChunkSplitter object
+    """
+    return TokenChunkSplitter(chunk_size=chunk_size, chunk_overlap=20)
+
 if __name__ == '__main__':
     create_text_splitter()
@@ -1,97 +1,368 @@
 # Python libraries
-import moviepy.editor as mp
-import whisper
 import os
+import subprocess
+import re
+import multiprocessing
+import numpy as np
 
-from os import listdir
-from pydub import AudioSegment
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
 
 # Local imports
-from modules.managers.folder_manager import check_folder_existence, delete_file
+from modules.managers.folder_manager import file_sha256, read_json, write_json
+from modules.managers.whisper_pool import whisper_pool, MODEL_OPTIONS
 
+# Whisper expects mono audio with 16kHz
+SAMPLE_RATE = 16_000
 
-def extract_audio_from_video(video_path: str) -> str:
+# Folder where the transcriptions are saved (by video hash, model tier and language)
+TRANSCRIPT_CACHE_PATH = 'data/cache/transcripts'
+
+# Process pools of the parallel transcription, one per (tier, workers). They are kept between
+# videos, so each worker process loads its Whisper model only once
+_transcription_pools = {}
+_transcription_pools_lock = Lock()
+
+
+def _iter_pcm_blocks(video_path: str, block_seconds: float = 30.0):
     """
-        This function will load a saved video and extract the audio in 16kHz framerate
-        and then save it in a .wav format in a temporary folder.
+        This function decodes the audio of a video with ffmpeg and yields the raw 16kHz
+        mono 16-bit samples read directly from the ffmpeg pipe.
 
         :param video_path: A string representing where the saved video is located
+        :param block_seconds: A float representing the duration of each block in seconds
+        :return: A generator of bytes
     """
-    # Check how many temporary audios are within the temp/ folder
-    check_folder_existence('temp/')
-    amount_files = len(listdir('temp/'))
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    command = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0',
+        '-i', video_path,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE),
+        '-'
+    ]
 
-    # Create a temporary audio path
-    audio_path = f'temp/temp_audio_{amount_files}.wav'
+    # Each sample has 2 bytes (16-bit)
+    block_size = int(block_seconds * SAMPLE_RATE) * 2
 
-    # Check if the audio folder exists
-    check_folder_existence(audio_path[:audio_path.rfind('/')])
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_size)
+            if not data:
+                break
 
-    # Load the video file
-    video = mp.VideoFileClip(video_path, verbose=False)
+            yield data
 
-    # Extract audio from the video
-    audio = video.audio
-    audio.write_audiofile(audio_path, codec='pcm_s16le')
+        finished = True
+    finally:
+        # Stop ffmpeg if the caller did not read the whole audio
+        if not finished:
+            process.kill()
 
-    # Load the audio file with pydub
-    audio_segment = AudioSegment.from_file(audio_path, format='wav')
+        process.stdout.close()
+        error = process.stderr.read().decode(errors='ignore')
+        process.stderr.close()
+
+        if process.wait() != 0 and finished:
+            raise RuntimeError(f"Failed to decode the audio of {video_path!r}: {error.strip()}")
+
+def _pcm_to_float(data: bytes or bytearray) -> np.ndarray:
+    """
+        This function converts 16-bit samples to float32 samples between -1 and 1.
+
+        :param data: Raw 16-bit little-endian samples
+        :return: A NumPy float32 array
+    """
+    # An odd number of bytes can only happen if the stream was cut
+    samples = np.frombuffer(data, dtype=np.int16, count=len(data) // 2).astype(np.float32)
+    samples /= 32768.0
 
-    # Setting audio to mono, 16kHz, and 16-bit
-    audio = audio_segment.set_channels(1).set_frame_rate(16_000).set_sample_width(2)
+    return samples
 
-    # Save the audio again
-    audio.export(audio_path, format='wav')
+def iter_audio_blocks(video_path: str, block_seconds: float = 30.0):
+    """
+        This function yields the audio of a video in blocks of 16kHz mono float32 samples.
+        No temporary file is created and only one block is in memory at a time, so it can
+        be used with long lectures.
+
+        :param video_path: A string representing where the saved video is located
+        :param block_seconds: A float representing the duration of each block in seconds
+        :return: A generator of NumPy float32 arrays with values between -1 and 1
+    """
+    for data in _iter_pcm_blocks(video_path, block_seconds):
+        yield _pcm_to_float(data)
+
+def decode_audio(video_path: str) -> np.ndarray:
+    """
+        This function decodes all the audio of a video in memory as 16kHz mono float32
+        samples, the format Whisper expects. The 16-bit samples are accumulated and
+        converted only once, so the peak memory is 6 bytes per sample (about 350 MB
+        for one hour of audio).
+
+        :param video_path: A string representing where the saved video is located
+        :return: A NumPy float32 array with values between -1 and 1
+    """
+    buffer = bytearray()
+    for data in _iter_pcm_blocks(video_path):
+        buffer += data
 
-    return audio_path
+    return _pcm_to_float(buffer)
 
-def transcript_video(video_path: str, model_performance: str = 'balanced') -> tuple[str, dict]:
+def find_silence_cuts(audio: np.ndarray, window_seconds: float = 300.0, search_seconds: float = 15.0,
+                      frame_seconds: float = 0.03) -> list[int]:
+    """
+        This function finds where the audio can be cut in windows of about `window_seconds`.
+        Around each target position, it picks the quietest frame (lowest RMS energy), so the
+        cuts fall on silences instead of in the middle of a word.
+
+        :param audio: A NumPy float32 array with 16kHz samples
+        :param window_seconds: A float representing the desired duration of each window
+        :param search_seconds: A float representing how far (before and after the target) a
+        silence is searched
+        :param frame_seconds: A float representing the duration of each energy frame
+        :return: A sorted list with the sample positions of the cuts
+    """
+    frame = max(int(frame_seconds * SAMPLE_RATE), 1)
+    window = int(window_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+
+    cuts = []
+    target = window
+
+    # The last window must have at least half of the desired duration
+    while target + window // 2 < len(audio):
+        start = max(target - search, (cuts[-1] if cuts else 0) + frame)
+        end = min(target + search, len(audio))
+
+        # RMS energy of each frame only around the target
+        frames = audio[start:start + (end - start) // frame * frame].reshape(-1, frame)
+        energy = np.sqrt(np.mean(frames ** 2, axis=1))
+
+        cut = start + int(np.argmin(energy)) * frame + frame // 2
+        cuts.append(cut)
+        target = cut + window
+
+    return cuts
+
+def _initialize_worker(threads: int, model_performance: str):
+    """
+        This function runs once in each transcription process, limiting how many threads
+        PyTorch uses so the processes do not compete for the same cores, and loading the
+        Whisper model before the first window arrives.
+
+        :param threads: An integer representing the threads of each process
+        :param model_performance: A string representing the Whisper model selection
+    """
+    import torch
+
+    torch.set_num_threads(threads)
+    whisper_pool.preload(model_performance)
+
+def get_transcription_pool(model_performance: str, workers: int) -> ProcessPoolExecutor:
+    """
+        This function returns the process pool that transcribes windows with a Whisper tier,
+        creating it only once per process. Its workers keep the model loaded between videos.
+
+        :param model_performance: A string representing the Whisper model selection
+        :param workers: An integer representing how many processes the pool has
+        :return: A ProcessPoolExecutor
+    """
+    key = (model_performance, workers)
+
+    with _transcription_pools_lock:
+        if key not in _transcription_pools:
+            # Spawn new processes instead of forking one that may have PyTorch threads running
+            _transcription_pools[key] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_worker,
+                initargs=(max((os.cpu_count() or 1) // workers, 1), model_performance)
+            )
+
+        return _transcription_pools[key]
+
+def shutdown_transcription_pools():
+    """
+        This function stops the transcription processes, removing their models from memory.
+    """
+    with _transcription_pools_lock:
+        pools = list(_transcription_pools.values())
+        _transcription_pools.clear()
+
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _transcribe_window(audio: np.ndarray, offset: float, model_performance: str, language: str) -> list:
+    """
+        This function transcribes one audio window in a worker process and moves the
+        segment times by the window offset.
+
+        :param audio: A NumPy float32 array with the window samples
+        :param offset: A float representing where the window starts in seconds
+        :param model_performance: A string representing the Whisper model selection
+        :param language: A string representing the audio language
+        :return: A list of segments [text, start, end]
+    """
+    with whisper_pool.acquire(model_performance) as model:
+        result = model.transcribe(
+            audio, language=language, temperature=0.0, word_timestamps=True
+        )
+
+    return [[x['text'], x['start'] + offset, x['end'] + offset] for x in result['segments']]
+
+def transcribe_audio_parallel(audio: np.ndarray, model_performance: str = 'balanced', workers: int = 2,
+                              window_seconds: float = 300.0, language: str = 'pt') -> list:
+    """
+        This function splits the audio at silences in windows and transcribes them in a process
+        pool. Each process loads its own Whisper model once (the pool is kept between videos, see
+        `get_transcription_pool`), so memory grows with the number of workers.
+
+        :param audio: A NumPy float32 array with 16kHz samples
+        :param model_performance: A string representing the Whisper model selection
+        :param workers: An integer representing how many processes transcribe at the same time
+        :param window_seconds: A float representing the desired duration of each window
+        :param language: A string representing the audio language
+        :return: A list of segments [text, start, end] with times relative to the whole audio
+    """
+    bounds = [0] + find_silence_cuts(audio, window_seconds=window_seconds) + [len(audio)]
+    windows = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    executor = get_transcription_pool(model_performance, workers)
+    try:
+        futures = [
+            executor.submit(_transcribe_window, audio[start:end], start / SAMPLE_RATE, model_performance, language)
+            for start, end in windows
+        ]
+
+        # Keep the windows order
+        segments = []
+        for future in futures:
+            segments.extend(future.result())
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory), the next video creates a new pool
+        with _transcription_pools_lock:
+            if _transcription_pools.get((model_performance, workers)) is executor:
+                del _transcription_pools[(model_performance, workers)]
+        raise
+
+    return segments
+
+def _words(text: str) -> set[str]:
+    return set(re.findall(r'\w+', text.lower()))
+
+def compare_transcriptions(sequential: list, parallel: list, tolerance: float = 2.0,
+                           min_overlap: float = 0.6) -> dict:
+    """
+        This function checks if a parallel transcription can replace the sequential one in the
+        citation lookups (the minutes shown to the user). For each sequential segment, the words
+        of the parallel segments around the same time (plus `tolerance` seconds) must contain
+        most of its words. Segments cut at a window border are found in the neighbour window.
+
+        :param sequential: A list of segments [text, start, end] of the sequential transcription
+        :param parallel: A list of segments [text, start, end] of the parallel transcription
+        :param tolerance: A float representing how many seconds a segment can move
+        :param min_overlap: A float representing the fraction of words that must be found
+        :return: A dictionary with the 'aligned' fraction of segments and the 'misaligned' ones
+    """
+    misaligned = []
+    scored = 0
+
+    for text, start, end in sequential:
+        words = _words(text)
+        if not words:
+            continue
+
+        scored += 1
+        nearby = set()
+        for other_text, other_start, other_end in parallel:
+            if other_end >= start - tolerance and other_start <= end + tolerance:
+                nearby |= _words(other_text)
+
+        if len(words & nearby) / len(words) < min_overlap:
+            misaligned.append([text, start, end])
+
+    return {
+        'segments': scored,
+        'aligned': 1.0 - len(misaligned) / scored if scored else 1.0,
+        'misaligned': misaligned,
+    }
+
+def transcript_video(video_path: str, model_performance: str = 'balanced', workers: int or None = None,
+                     window_seconds: float = 300.0, language: str = 'pt',
+                     content_hash: str or None = None) -> tuple[str, dict]:
     """
         This function receives a saved video and then process it based on the Whisper
         OpenAI object and transcript the audio to a text format. Based on the model
-        performance, the function will load a tiny, small or medium version of Whisper 
-        and being necessary 1, 2 or 5 GB of VRAM consecutively.
+        performance, the function will use a tiny, small or medium version of Whisper
+        and being necessary 1, 2 or 5 GB of VRAM consecutively. Models are kept loaded
+        in a process-wide pool (see modules/managers/whisper_pool.py).
+
+        The audio is decoded in memory and given directly to Whisper, without temporary
+        files. With more than one worker, long videos are splitted at silences and the
+        windows are transcribed in parallel processes (useful on CPU-only machines).
+
+        Transcriptions are saved on disk by the video SHA-256, the model tier and the
+        language. The same video is never decoded or transcribed twice.
 
         :param video_path: A string representing the path to a local video
         :param model_performance: A string representing the Whisper model selection. Can be
         'speed', 'balanced' or 'accuracy' and uses VRAM (GPU)
-        :return: A tuple containing the text extract and a dictionary containing the
-        transcription of the video, segments of text and their time and other
-        important metadata
-    """
-    # Extract audio from video
-    audio_path = extract_audio_from_video(video_path)
-
-    # Ensure the audio file path is correct
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-    
-    # Select the model based on the performance users need
-    model_options = {
-        'speed': 'tiny',
-        'balanced': 'small',
-        'accuracy': 'medium'
-    }
+        :param workers: An integer representing how many processes transcribe the video. If not
+        given, it uses the 'WHISPER_WORKERS' environment variable (default 1, sequential)
+        :param window_seconds: A float representing the duration of each window in parallel mode
+        :param language: A string representing the audio language
+        :param content_hash: A string with the SHA-256 of the video (e.g. calculated while
+        downloading it). If not given, it is calculated from the file
+        :return: A tuple containing the text extract (all segments joined) and a list
+        containing the segments of text and their time
+    """
+    if model_performance not in MODEL_OPTIONS:
+        raise ValueError(f'Invalid model performance {model_performance!r}. Use one of {list(MODEL_OPTIONS)}.')
 
-    # Load whisper model
-    model = whisper.load_model(model_options[model_performance]) # VRAM: large 10 GB / medium 5 GB / small 2 GB / base 1 GB / tiny 1 GB (superfast)
+    # Check if this video was already transcribed with the same model and language
+    content_hash = content_hash or file_sha256(video_path)
+    cache_path = f'{TRANSCRIPT_CACHE_PATH}/{content_hash}_{model_performance}_{language}.json'
 
-    # Transcribe the audio
-    result = model.transcribe(
-        audio_path, language='pt', temperature=0.0, word_timestamps=True
-    )
+    cached = read_json(cache_path)
+    if cached:
+        return cached['text'], cached['segments']
 
-    # Add type key
-    result['type'] = 'video'
+    workers = workers or int(os.getenv('WHISPER_WORKERS', 1))
 
-    delete_file(audio_path)
+    # Decode the audio from video (16kHz mono float32)
+    audio = decode_audio(video_path)
+
+    if workers > 1 and len(audio) > window_seconds * SAMPLE_RATE:
+        result = transcribe_audio_parallel(
+            audio, model_performance=model_performance, workers=workers,
+            window_seconds=window_seconds, language=language
+        )
+    else:
+        # Borrow the whisper model from the process pool (loaded only once)
+        with whisper_pool.acquire(model_performance) as model:
+            # Transcribe the audio
+            result = model.transcribe(
+                audio, language=language, temperature=0.0, word_timestamps=True
+            )
+
+        result = [[x['text'], x['start'], x['end']] for x in result['segments']]
 
     segments = [
-        [x['text'] for x in result['segments']],
-        [[x['start'], x['end']] for x in result['segments']]
+        [x[0] for x in result],
+        [[x[1], x[2]] for x in result]
     ]
 
-    return result['text'], segments
+    # The text is the segments joined together, so a character offset in the text
+    # can be mapped to a segment (and its time)
+    text = ''.join(segments[0])
+
+    write_json(cache_path, {'text': text, 'segments': segments})
+
+    return text, segments
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+# Python libraries
+import asyncio
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+
+# The API imports the ingestion pipeline, which needs Whisper
+pytest.importorskip('whisper')
+
+from fastapi.testclient import TestClient
+
+# Local imports
+import api
+
+from modules.api_client import ApiClient, STREAM_ERROR_MARKER
+from modules.indexing_data import StreamingAnswer
+
+class StubIndex():
+    def __init__(self, pieces: list[str]) -> None:
+        self.pieces = pieces
+        self.sent = []
+        self.closed = False
+
+    def stream_context(self, query: str, raw_data: dict, threshold: float) -> StreamingAnswer:
+        def pieces():
+            try:
+                for piece in self.pieces:
+                    self.sent.append(piece)
+                    yield piece
+            finally:
+                self.closed = True
+
+        return StreamingAnswer(query, pieces())
+
+def run_stream_answer(index: StubIndex, monkeypatch, cancelled: Event) -> list:
+    monkeypatch.setattr(api, 'load_library', lambda library_id: (index, {}))
+
+    loop = asyncio.new_event_loop()
+    pieces = asyncio.Queue()
+    try:
+        api.stream_answer(api.ChatRequest(query='Pergunta'), loop, pieces, cancelled)
+        # Runs the callbacks that put the pieces in the queue
+        loop.run_until_complete(asyncio.sleep(0))
+    finally:
+        loop.close()
+
+    return [pieces.get_nowait() for _ in range(pieces.qsize())]
+
+def test_stream_sends_every_piece(monkeypatch):
+    index = StubIndex(['Uma ', 'resposta'])
+
+    assert run_stream_answer(index, monkeypatch, Event()) == ['Uma ', 'resposta', None]
+    assert index.closed
+
+def test_stream_stops_when_the_client_disconnects(monkeypatch):
+    index = StubIndex(['Uma ', 'resposta ', 'longa'])
+    cancelled = Event()
+    cancelled.set()
+
+    assert run_stream_answer(index, monkeypatch, cancelled) == [None]
+    # The generator is closed after the first piece, so the next ones are never generated
+    assert index.sent == ['Uma ']
+    assert index.closed
+
+def test_stream_error_is_sent_as_the_last_piece(monkeypatch):
+    def broken(library_id):
+        raise ValueError('A biblioteca não carregou.')
+
+    monkeypatch.setattr(api, 'load_library', broken)
+
+    response = TestClient(api.app).post('/chat/stream', json={'query': 'Pergunta'})
+
+    assert response.status_code == 200
+    assert response.text == f'{STREAM_ERROR_MARKER}ValueError: A biblioteca não carregou.'
+
+def test_client_raises_on_the_error_marker():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            for piece in ['Uma ', f'{STREAM_ERROR_MARKER}RuntimeError: falhou', '']:
+                data = piece.encode('utf-8')
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    try:
+        answer = ApiClient(f'http://127.0.0.1:{server.server_address[1]}').stream_answer('Pergunta')
+        with pytest.raises(ValueError, match='RuntimeError: falhou'):
+            for _ in answer:
+                pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert answer.response == 'Uma '
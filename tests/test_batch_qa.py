@@ -0,0 +1,93 @@
+# Python libraries
+import json
+import pytest
+
+# Local imports
+from batch_qa import read_questions, run_batch, summarize
+from benchmarks.stubs import create_pdf_raw_data, create_queries, create_stub_llm
+from modules.answer_cache import AnswerCache
+from modules.embedd_text import embedding_in_chunks
+from modules.indexing_data import IndexingData, OUT_OF_SCOPE_RESPONSE
+
+def write_lines(path, lines: list) -> str:
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(json.dumps(line) if isinstance(line, dict) else line for line in lines))
+
+    return str(path)
+
+def test_read_questions_finds_the_question_field(tmp_path):
+    path = write_lines(tmp_path / 'questions.jsonl', [
+        {'id': 'a', 'query': 'O que é HTML?'},
+        '',
+        {'request_id': 'b', 'question': 'O que é CSS?'},
+        {'title': 'O que é uma tag?', 'query': ''},
+    ])
+
+    assert read_questions(path) == [
+        {'id': 'a', 'query': 'O que é HTML?'},
+        {'id': 'b', 'query': 'O que é CSS?'},
+        {'id': 4, 'query': 'O que é uma tag?'},
+    ]
+
+def test_read_questions_with_a_given_field(tmp_path):
+    path = write_lines(tmp_path / 'questions.jsonl', [{'id': 1, 'query': 'ignorada', 'text': 'O que é HTML?'}])
+
+    assert read_questions(path, field='text') == [{'id': 1, 'query': 'O que é HTML?'}]
+
+def test_read_questions_without_a_question(tmp_path):
+    path = write_lines(tmp_path / 'questions.jsonl', [{'id': 1, 'query': 'O que é HTML?'}, {'id': 2, 'answer': 'HTML'}])
+
+    with pytest.raises(ValueError, match='line 2'):
+        read_questions(path)
+
+def test_summarize_ignores_the_errors():
+    results = [
+        {'id': 1, 'response': 'Resposta', 'ttft': 0.1, 'total_time': 1.0},
+        {'id': 2, 'response': 'Resposta', 'ttft': 0.2, 'total_time': 2.0},
+        # Out of scope answers are answers (sent in one piece)
+        {'id': 3, 'response': OUT_OF_SCOPE_RESPONSE, 'ttft': 0.3, 'total_time': 0.3},
+        {'id': 4, 'error': 'APIError: falhou', 'total_time': 9.0},
+    ]
+
+    summary = summarize(results, seconds=2.0)
+
+    assert (summary['questions'], summary['errors'], summary['questions_per_second']) == (4, 1, 2.0)
+    assert summary['total_time_p50'] == pytest.approx(1.0)
+    assert summary['total_time_p99'] == pytest.approx(1.98)
+    assert summary['ttft_p50'] == pytest.approx(0.2)
+
+def test_summarize_without_answers():
+    summary = summarize([{'id': 1, 'error': 'APIError: falhou', 'total_time': 1.0}], seconds=1.0)
+
+    assert summary['errors'] == 1
+    assert summary['total_time_p50'] is None and summary['ttft_p99'] is None
+
+def test_run_batch_writes_every_answer(tmp_path):
+    raw = create_pdf_raw_data(30)
+    docs = embedding_in_chunks({raw['text']: 'pdf'}, raw_data={'pdf': raw})
+
+    # Local embeddings and a stub LLM, so nothing is sent to OpenAI
+    index = IndexingData(
+        api_key='stub', embedding_backend='local', llm=create_stub_llm(), lexical_gate=0.01,
+        embedding_store_path=f'{tmp_path}/store', answer_cache=AnswerCache(max_size=0, similarity=None)
+    )
+    index.create_library_from_documents(docs)
+
+    questions = [{'id': i, 'query': query} for i, query in enumerate(create_queries(6))]
+    questions.append({'id': 'fora', 'query': 'Quem venceu Wimbledon?'})
+
+    summary = run_batch(index, {'pdf': raw}, questions, f'{tmp_path}/answers.jsonl', concurrency=3, threshold=2.0)
+
+    with open(f'{tmp_path}/answers.jsonl', 'r', encoding='utf-8') as file:
+        answers = {answer['id']: answer for answer in map(json.loads, file)}
+
+    assert (summary['questions'], summary['errors']) == (7, 0)
+    assert set(answers) == {question['id'] for question in questions}
+
+    out_of_scope = answers.pop('fora')
+    assert (out_of_scope['response'], out_of_scope['location']) == (OUT_OF_SCOPE_RESPONSE, None)
+
+    for answer in answers.values():
+        assert answer['response'] == 'Esta é uma resposta de teste baseada no contexto da aula.'
+        assert answer['location'].startswith('O documento de apoio encontra-se')
+        assert answer['ttft'] <= answer['total_time']
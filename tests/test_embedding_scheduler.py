@@ -0,0 +1,98 @@
+# Python libraries
+import time
+import openai
+import pytest
+
+# Local imports
+from benchmarks.fake_openai_server import FakeOpenAIServer, fake_embedding
+from benchmarks.stubs import StubEmbeddings
+from modules.embedding_scheduler import EmbeddingScheduler, create_batches
+from modules.embedding_store import CachedEmbeddings, EmbeddingStore
+from modules.tokenize_text import get_encoder
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer(dimension=8, latency=0.05).start()
+    yield server
+    server.stop()
+
+def create_items(count: int, words: int = 50) -> dict:
+    return {f'chunk-{i}': ' '.join(f'palavra{i}x{j}' for j in range(words)) for i in range(count)}
+
+def create_scheduler(server: FakeOpenAIServer, **kwargs) -> EmbeddingScheduler:
+    return EmbeddingScheduler(api_key='fake', base_url=server.url, **{'backoff_factor': 0.01, **kwargs})
+
+def test_batches_respect_the_token_budget():
+    items = create_items(40)
+    encoder = get_encoder('cl100k_base')
+    tokens = {key: len(encoder.encode(text)) for key, text in items.items()}
+    budget = 3 * max(tokens.values())
+
+    batches = create_batches(items, max_tokens=budget, max_size=100)
+
+    assert len(batches) > 1
+    assert [key for batch in batches for key in batch] == list(items)
+    for batch in batches:
+        assert sum(tokens[key] for key in batch) <= budget
+
+def test_batches_respect_the_maximum_size():
+    batches = create_batches(create_items(25), max_tokens=10 ** 9, max_size=10)
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+def test_scheduler_sends_one_request_per_batch(server):
+    items = create_items(40)
+    budget = 3 * max(len(get_encoder('cl100k_base').encode(text)) for text in items.values())
+
+    vectors = create_scheduler(server, max_batch_tokens=budget).embed(items)
+
+    assert vectors == {key: pytest.approx(fake_embedding(text, 8)) for key, text in items.items()}
+    assert len(server.batches) == len(create_batches(items, budget, 2048))
+    assert sorted(text for batch in server.batches for text in batch) == sorted(items.values())
+
+def test_scheduler_limits_the_concurrent_requests(server):
+    server.latency = 0.1
+
+    create_scheduler(server, max_batch_size=1, concurrency=3).embed(create_items(12))
+
+    assert len(server.batches) == 12
+    assert server.max_active == 3
+
+def test_scheduler_waits_and_retries_after_rate_limits(server):
+    server.rate_limit_first = 3
+
+    start = time.perf_counter()
+    vectors = create_scheduler(server, max_batch_size=2, concurrency=4).embed(create_items(8))
+
+    assert len(vectors) == 8
+    assert server.rate_limited == 3
+    assert server.requests == 4 + 3
+    # The server asks to wait 0.1 seconds (Retry-After)
+    assert time.perf_counter() - start >= 0.1
+
+def test_scheduler_gives_up_after_the_retries(server):
+    server.rate_limit = 1.0
+
+    with pytest.raises(openai.RateLimitError):
+        create_scheduler(server, max_retries=2).embed(create_items(2))
+
+    assert server.requests == 3
+
+def test_failed_embedding_resumes_from_the_checkpoint(server, tmp_path):
+    texts = list(create_items(10).values())
+    scheduler = create_scheduler(server, max_batch_size=2, concurrency=1, max_retries=1)
+    embeddings = CachedEmbeddings(StubEmbeddings(8), EmbeddingStore(f'{tmp_path}/store.sqlite'),
+                                  model_name='fake', scheduler=scheduler)
+
+    # The server fails after two batches
+    server.fail_after = 2
+    with pytest.raises(openai.InternalServerError):
+        embeddings.embed_documents(texts)
+
+    # Only the batches that were not saved are sent again
+    server.fail_after = None
+    vectors = embeddings.embed_documents(texts)
+
+    sent = [text for batch in server.batches for text in batch]
+    assert sorted(sent) == sorted(texts)
+    assert vectors == [pytest.approx(fake_embedding(text, 8)) for text in texts]
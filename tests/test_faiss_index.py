@@ -0,0 +1,90 @@
+# Python libraries
+import pytest
+
+# Local imports
+from benchmarks.stubs import create_pdf_raw_data, create_stub_llm
+from modules.answer_cache import AnswerCache
+from modules.embedd_text import embedding_in_chunks
+from modules.indexing_data import IndexingData
+
+SPECS = ['Flat', 'IVF4,Flat', 'IVF4,PQ4x4', 'HNSW16']
+
+def create_index(spec: str, tmp_path) -> IndexingData:
+    # Local embeddings and a stub LLM, so nothing is sent to OpenAI
+    return IndexingData(
+        api_key='stub', embedding_backend='local', llm=create_stub_llm(), index_spec=spec,
+        embedding_store_path=f'{tmp_path}/store', answer_cache=AnswerCache(max_size=0, similarity=None)
+    )
+
+def create_text(pages: int, seed: int) -> str:
+    return create_pdf_raw_data(pages, seed=seed)['text']
+
+def assert_chunks_find_themselves(index: IndexingData, min_fraction: float):
+    library = index.get_library
+    assert library.index.ntotal == len(library.index_to_docstore_id)
+
+    found = 0
+    for id in library.index_to_docstore_id.values():
+        doc = library.docstore.search(id)
+        best = library.similarity_search_by_vector(index.embed_query(doc.page_content), k=1)
+        found += best[0].metadata['id'] == id
+
+    # Rows that point to the wrong chunks would find almost nothing
+    assert found / len(library.index_to_docstore_id) >= min_fraction
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_mmr_search(spec, tmp_path):
+    raw = create_pdf_raw_data(200)
+    docs = embedding_in_chunks({raw['text']: 'pdf'}, raw_data={'pdf': raw})
+
+    index = create_index(spec, tmp_path)
+    index.create_library_from_documents(docs)
+
+    # LangChain's MMR reconstructs the vectors of the results (IVF indexes need a direct map)
+    vector = index.embed_query(docs[3].page_content)
+    found = index.get_library.max_marginal_relevance_search_by_vector(vector, k=3)
+    assert found[0].page_content == docs[3].page_content
+
+    # The same after saving and loading the library
+    index.save_local(f'{tmp_path}/library')
+    loaded = IndexingData(api_key='stub', path=f'{tmp_path}/library', llm=create_stub_llm(),
+                          embedding_store_path=f'{tmp_path}/store')
+    found = loaded.get_library.max_marginal_relevance_search_by_vector(vector, k=3)
+    assert found[0].page_content == docs[3].page_content
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_search_after_removing_a_source(spec, tmp_path):
+    # Approximate indexes (compressed vectors or graph search) can miss a few chunks
+    min_fraction = 1.0 if spec in ['Flat', 'IVF4,Flat'] else 0.9
+
+    index = create_index(spec, tmp_path)
+    index.add_source('pdf', create_text(120, seed=1), 'text')
+    index.add_source('notes', create_text(120, seed=2), 'text')
+
+    result = index.remove_source('pdf')
+    assert result['removed'] > 0
+    assert set(index.get_manifest['sources']) == {'notes'}
+    assert_chunks_find_themselves(index, min_fraction)
+
+    # New chunks do not reuse the rows of the remaining chunks
+    index.add_source('video', create_text(120, seed=3), 'text')
+    assert_chunks_find_themselves(index, min_fraction)
+
+@pytest.mark.parametrize('spec', SPECS[1:])
+def test_removing_a_source_keeps_the_trained_index(spec, tmp_path):
+    index = create_index(spec, tmp_path)
+    index.add_source('pdf', create_text(120, seed=1), 'text')
+    index.add_source('notes', create_text(120, seed=2), 'text')
+
+    trained = index.get_library.index
+    vectors = {
+        id: trained.reconstruct(row) for row, id in index.get_library.index_to_docstore_id.items()
+    }
+
+    index.remove_source('pdf')
+
+    # The same index (not trained again) with the same vectors of the remaining chunks
+    library = index.get_library
+    assert library.index is trained
+    for row, id in library.index_to_docstore_id.items():
+        assert (library.index.reconstruct(row) == vectors[id]).all()
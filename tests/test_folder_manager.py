@@ -0,0 +1,29 @@
+# Python libraries
+import os
+
+from threading import Thread
+
+# Local imports
+from modules.managers.folder_manager import read_json, write_json
+
+def test_write_json_from_many_threads(tmp_path):
+    path = f'{tmp_path}/status.json'
+    errors = []
+
+    def writer(thread: int):
+        for i in range(200):
+            try:
+                write_json(path, {'thread': thread, 'i': i})
+            except Exception as e:
+                errors.append(e)
+
+    threads = [Thread(target=writer, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert read_json(path)['i'] == 199
+    # No temporary file is left behind
+    assert os.listdir(tmp_path) == ['status.json']
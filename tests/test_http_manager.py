@@ -0,0 +1,164 @@
+# Python libraries
+import time
+import pytest
+import requests
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+# Local imports
+from modules.managers.http_manager import FetchClient
+
+class StandInServer():
+    def __init__(self) -> None:
+        """
+            This class is a local HTTP server that stands in for GitHub. Each path answers with the
+            responses in `routes[path]` (one per request, the last one is repeated). A response is
+            a dictionary with the 'status', the 'body', the 'headers' and a 'delay' in seconds.
+            If the request has a matching If-None-Match/If-Modified-Since header, it answers 304.
+        """
+        self.routes = {}
+        self.requests = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append({'path': self.path, 'headers': dict(self.headers)})
+
+                responses = server.routes[self.path]
+                response = responses.pop(0) if len(responses) > 1 else responses[0]
+                time.sleep(response.get('delay', 0))
+
+                headers = response.get('headers', {})
+                not_modified = (
+                    ('ETag' in headers and self.headers.get('If-None-Match') == headers['ETag']) or
+                    ('Last-Modified' in headers and self.headers.get('If-Modified-Since') == headers['Last-Modified'])
+                )
+
+                body = b'' if not_modified else response.get('body', b'')
+                self.send_response(304 if not_modified else response.get('status', 200))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.__server.daemon_threads = True
+        Thread(target=self.__server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.__server.server_address[1]}{path}'
+
+    def count(self, path: str) -> int:
+        return sum(request['path'] == path for request in self.requests)
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    yield server
+    server.stop()
+
+def create_client(tmp_path, **kwargs) -> FetchClient:
+    return FetchClient(cache_path=f'{tmp_path}/http', **{'backoff_factor': 0.01, **kwargs})
+
+def test_etag_revalidation_returns_304(server, tmp_path):
+    server.routes['/lesson.txt'] = [{'body': 'Aula de HTML'.encode('utf-8'), 'headers': {'ETag': '"v1"'}}]
+    client = create_client(tmp_path, max_age=0)
+
+    first = client.get(server.url('/lesson.txt'))
+    second = client.get(server.url('/lesson.txt'))
+
+    assert (first.status_code, first.from_cache) == (200, False)
+    assert (second.status_code, second.from_cache) == (304, True)
+    assert second.text == 'Aula de HTML'
+    assert second.sha256 == first.sha256
+    assert server.requests[1]['headers'].get('If-None-Match') == '"v1"'
+
+def test_last_modified_revalidation_returns_304(server, tmp_path):
+    modified = formatdate(usegmt=True)
+    server.routes['/lesson.pdf'] = [{'body': b'%PDF-1.4', 'headers': {'Last-Modified': modified}}]
+    client = create_client(tmp_path, max_age=0)
+
+    client.get(server.url('/lesson.pdf'))
+    second = client.get(server.url('/lesson.pdf'))
+
+    assert (second.status_code, second.from_cache, second.content) == (304, True, b'%PDF-1.4')
+    assert server.requests[1]['headers'].get('If-Modified-Since') == modified
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    server.routes['/lesson.txt'] = [
+        {'body': b'v1', 'headers': {'ETag': '"v1"'}},
+        {'body': b'v2', 'headers': {'ETag': '"v2"'}},
+    ]
+    client = create_client(tmp_path, max_age=0)
+
+    client.get(server.url('/lesson.txt'))
+    second = client.get(server.url('/lesson.txt'))
+
+    assert (second.status_code, second.from_cache, second.content) == (200, False, b'v2')
+
+def test_fresh_cache_hit_sends_no_request(server, tmp_path):
+    server.routes['/lesson.txt'] = [{'body': b'Aula', 'headers': {'ETag': '"v1"'}}]
+    client = create_client(tmp_path, max_age=60)
+
+    client.get(server.url('/lesson.txt'))
+    second = client.get(server.url('/lesson.txt'))
+
+    assert (second.status_code, second.from_cache, second.content) == (304, True, b'Aula')
+    assert server.count('/lesson.txt') == 1
+
+def test_server_errors_are_retried_with_backoff(server, tmp_path):
+    server.routes['/video.mp4'] = [{'status': 503}, {'status': 502}, {'body': b'video'}]
+    client = create_client(tmp_path, retries=3, backoff_factor=0.1)
+
+    start = time.perf_counter()
+    response = client.get(server.url('/video.mp4'))
+    seconds = time.perf_counter() - start
+
+    assert (response.status_code, response.content) == (200, b'video')
+    assert server.count('/video.mp4') == 3
+    # urllib3 retries the first error at once and waits backoff_factor * 2 before the second retry
+    assert seconds >= 0.15
+
+def test_server_errors_stop_after_the_retries(server, tmp_path):
+    server.routes['/broken.txt'] = [{'status': 500}]
+    client = create_client(tmp_path, retries=2)
+
+    with pytest.raises(requests.exceptions.RetryError):
+        client.get(server.url('/broken.txt'))
+
+    assert server.count('/broken.txt') == 3
+
+def test_slow_server_times_out(server, tmp_path):
+    server.routes['/slow.txt'] = [{'body': b'late', 'delay': 1.0}]
+    client = create_client(tmp_path, timeout=(1, 0.2), retries=1)
+
+    start = time.perf_counter()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(server.url('/slow.txt'))
+
+    # The read timeout is retried once, without waiting the whole delay
+    assert time.perf_counter() - start < 0.9
+    assert server.count('/slow.txt') == 2
+
+def test_not_found_is_not_cached(server, tmp_path):
+    server.routes['/missing.txt'] = [{'status': 404}]
+    client = create_client(tmp_path)
+
+    with pytest.raises(ValueError):
+        client.get(server.url('/missing.txt'))
+
+    with pytest.raises(ValueError):
+        client.get(server.url('/missing.txt'))
+
+    assert server.count('/missing.txt') == 2
@@ -0,0 +1,165 @@
+# Python libraries
+import time
+import numpy as np
+import pytest
+
+# Local imports
+from benchmarks.stubs import create_pdf_raw_data, create_queries, create_stub_llm
+from modules.answer_cache import AnswerCache
+from modules.embedd_text import embedding_in_chunks
+from modules.indexing_data import IndexingData, OUT_OF_SCOPE_RESPONSE
+from modules.library_registry import get_raw_data
+from modules.managers.trace_manager import tracer
+
+# Default library of the app (a lesson about HTML)
+DEFAULT_LIBRARY_PATH = 'data/libraries/first_approach'
+DEFAULT_RAW_DATA_PATH = 'data/raw_data.json'
+
+# Questions about the lesson, with and without its words
+LESSON_QUESTIONS = ['O que é uma tag HTML?', 'Como criar uma lista ordenada?', 'Como faço um link para outra página?']
+GENERIC_QUESTIONS = ['Me explique a aula', 'What is a hyperlink?']
+OTHER_QUESTIONS = ['Qual a capital da França?', 'Quem venceu Wimbledon?', 'Como funciona a fotossíntese?']
+
+@pytest.fixture
+def library(tmp_path):
+    raw = create_pdf_raw_data(60)
+    docs = embedding_in_chunks({raw['text']: 'pdf'}, raw_data={'pdf': raw})
+
+    # Local embeddings and a stub LLM, with the semantic tier of the answer cache and the lexical gate
+    index = IndexingData(
+        api_key='stub', embedding_backend='local', llm=create_stub_llm(), lexical_gate=0.01,
+        embedding_store_path=f'{tmp_path}/store', answer_cache=AnswerCache(similarity=0.95)
+    )
+    index.create_library_from_documents(docs)
+
+    return index, {'pdf': raw}
+
+def count_embeddings(index: IndexingData, monkeypatch) -> list:
+    calls = []
+    embed_query = index.embed_query
+
+    def counted(text: str):
+        calls.append(text)
+        return embed_query(text)
+
+    monkeypatch.setattr(index, 'embed_query', counted)
+    return calls
+
+def test_out_of_scope_question_is_not_embedded(library, monkeypatch):
+    index, raw_data = library
+    calls = count_embeddings(index, monkeypatch)
+
+    answer = index.retrieve_context('Quantos gols Pelé marcou?', raw_data, threshold=2.0)
+    streamed = index.stream_context('Quem venceu Wimbledon?', raw_data, threshold=2.0)
+
+    assert answer['response'] == OUT_OF_SCOPE_RESPONSE
+    assert ''.join(streamed) == OUT_OF_SCOPE_RESPONSE
+    assert calls == []
+
+def test_question_in_scope_is_answered_and_cached(library, monkeypatch):
+    index, raw_data = library
+    query = create_queries(1)[0]
+
+    first = index.retrieve_context(query, raw_data, threshold=2.0)
+    calls = count_embeddings(index, monkeypatch)
+    second = ''.join(index.stream_context(query, raw_data, threshold=2.0))
+
+    assert first['response'] != OUT_OF_SCOPE_RESPONSE
+    assert second == first['response']
+    # The exact tier of the cache answers without embedding the query
+    assert calls == []
+
+def test_query_embedding_is_traced(library, monkeypatch):
+    index, raw_data = library
+    monkeypatch.setattr(tracer, 'enabled', True)
+
+    # Sending the query to OpenAI takes 50 ms, the next calls are LRU cache hits
+    embedded = set()
+    embed_query = index.embed_query
+
+    def slow(text: str):
+        if text not in embedded:
+            embedded.add(text)
+            time.sleep(0.05)
+        return embed_query(text)
+
+    monkeypatch.setattr(index, 'embed_query', slow)
+    trace = index.retrieve_context(create_queries(1)[0], raw_data, threshold=2.0)['trace']
+
+    spans = [span for span in trace['spans'] if span['name'] == 'retrieve_context.embed_query']
+    # The first span is the answer cache lookup, which really embeds the query
+    assert spans[0]['duration_ms'] >= 50
+    assert sum(span['duration_ms'] for span in spans) <= trace['duration_ms']
+
+def embedded_questions(questions: list[str], tmp_path, monkeypatch, lexical_gate: float or None = None) -> list:
+    index = IndexingData(
+        api_key='stub', path=DEFAULT_LIBRARY_PATH, llm=create_stub_llm(), lexical_gate=lexical_gate,
+        embedding_store_path=f'{tmp_path}/store', answer_cache=AnswerCache(max_size=0, similarity=None)
+    )
+    raw_data = get_raw_data(DEFAULT_RAW_DATA_PATH)
+
+    # The library uses OpenAI embeddings, so the questions get a fixed vector instead
+    calls = []
+    vector = np.ones(index.get_library.index.d, dtype=np.float32) / np.sqrt(index.get_library.index.d)
+
+    def fake_embedding(text: str):
+        calls.append(text)
+        return vector.tolist()
+
+    monkeypatch.setattr(index, 'embed_query', fake_embedding)
+
+    for question in questions:
+        # Nothing passes the vector threshold, so no question reaches the LLM
+        assert index.retrieve_context(question, raw_data, threshold=0.0)['response'] == OUT_OF_SCOPE_RESPONSE
+
+    return calls
+
+def test_lexical_gate_is_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv('LEXICAL_GATE', raising=False)
+    questions = LESSON_QUESTIONS + GENERIC_QUESTIONS
+
+    # Every question reaches the vector search
+    assert embedded_questions(questions, tmp_path, monkeypatch) == questions
+
+def test_lexical_gate_on_the_default_library(tmp_path, monkeypatch):
+    # Only questions without any word of the lesson are refused
+    calls = embedded_questions(LESSON_QUESTIONS + OTHER_QUESTIONS, tmp_path, monkeypatch, lexical_gate=0.01)
+
+    assert calls == LESSON_QUESTIONS
+
+def test_empty_answer_cache_is_kept():
+    # An empty cache is falsy, but it must not be replaced by the default one
+    cache = AnswerCache(max_size=0, similarity=None)
+    index = IndexingData(api_key='stub', embedding_backend='local', llm=create_stub_llm(), answer_cache=cache)
+
+    assert index.get_answer_cache is cache
+
+HTML_LESSON = (
+    'A linguagem HTML define a estrutura das páginas web com tags. A tag de link cria um hiperlink para '
+    'outra página e a tag de lista ordenada numera os itens. O navegador exibe o texto de cada elemento. '
+) * 20
+BIOLOGY_LESSON = (
+    'A fotossíntese acontece nas folhas das plantas. A clorofila absorve a luz do sol e transforma gás '
+    'carbônico e água em glicose e oxigênio. As raízes levam a água e os sais minerais até as folhas. '
+) * 20
+
+def test_new_source_of_a_local_library_is_embedded_with_its_words(tmp_path):
+    query = 'Como a clorofila usa a luz do sol na fotossíntese?'
+
+    # A source added to a library with the local backend...
+    added = IndexingData(api_key='stub', embedding_backend='local', llm=create_stub_llm(), embedding_store_path=f'{tmp_path}/store')
+    added.add_source('html', HTML_LESSON, 'text')
+    added.add_source('biology', BIOLOGY_LESSON, 'text')
+
+    # ...is embedded as if the library was created with both sources
+    joint = IndexingData(api_key='stub', embedding_backend='local', llm=create_stub_llm(), embedding_store_path=f'{tmp_path}/store')
+    joint.create_library_from_documents(
+        embedding_in_chunks({HTML_LESSON: 'text'}, source='html') + embedding_in_chunks({BIOLOGY_LESSON: 'text'}, source='biology')
+    )
+
+    found = added.get_library.similarity_search_with_score_by_vector(added.embed_query(query), k=3)
+    expected = joint.get_library.similarity_search_with_score_by_vector(joint.embed_query(query), k=3)
+
+    assert [doc.metadata['source'] for doc, _ in found] == ['biology'] * 3
+    assert [score for _, score in found] == pytest.approx([score for _, score in expected], abs=1e-4)
+    assert set(added.get_manifest['sources']) == {'html', 'biology'}
@@ -0,0 +1,38 @@
+# Python libraries
+import pytest
+
+# Local imports
+from benchmarks.stubs import create_pdf_raw_data, create_queries
+from modules.embedd_text import embedding_in_chunks
+from modules.lexical_index import BM25Index
+
+def create_chunks(pages: int, seed: int) -> dict:
+    raw = create_pdf_raw_data(pages, seed=seed)
+    return {doc.metadata['id']: doc.page_content for doc in embedding_in_chunks({raw['text']: 'pdf'}, source=f'pdf-{seed}')}
+
+def assert_same_search(index: BM25Index, expected: BM25Index):
+    assert len(index) == len(expected)
+    for query in create_queries(20):
+        found, best = index.search(query, top_k=5), expected.search(query, top_k=5)
+        assert [id for id, _ in found] == [id for id, _ in best]
+        assert [score for _, score in found] == pytest.approx([score for _, score in best], rel=1e-5)
+
+def test_update_is_the_same_as_building_again():
+    first, second, third = create_chunks(20, seed=1), create_chunks(20, seed=2), create_chunks(20, seed=3)
+    index = BM25Index.build(list(first) + list(second), list(first.values()) + list(second.values()))
+
+    # Remove the first source and add the third one
+    updated = index.update(list(first), list(third), list(third.values()))
+    expected = BM25Index.build(list(second) + list(third), list(second.values()) + list(third.values()))
+
+    assert_same_search(updated, expected)
+
+def test_update_of_an_empty_index():
+    chunks = create_chunks(5, seed=1)
+
+    updated = BM25Index.build([], []).update([], list(chunks), list(chunks.values()))
+    assert_same_search(updated, BM25Index.build(list(chunks), list(chunks.values())))
+
+    emptied = updated.update(list(chunks), [], [])
+    assert len(emptied) == 0
+    assert emptied.search(create_queries(1)[0]) == []
@@ -0,0 +1,70 @@
+# Python libraries
+import os
+import json
+import pytest
+
+# Local imports
+from benchmarks.stubs import create_pdf_raw_data, create_stub_llm
+from modules.indexing_data import IndexingData
+from modules.library_store import IDS_NAME, SNAPSHOTS_FOLDER, library_files_path, read_manifest
+
+def create_index(tmp_path) -> IndexingData:
+    # Local embeddings and a stub LLM, so nothing is sent to OpenAI
+    index = IndexingData(api_key='stub', embedding_backend='local', llm=create_stub_llm(), embedding_store_path=f'{tmp_path}/store')
+    index.add_source('pdf', create_pdf_raw_data(20, seed=1)['text'], 'text')
+
+    return index
+
+def load_index(path: str, tmp_path) -> IndexingData:
+    return IndexingData(api_key='stub', path=path, llm=create_stub_llm(), embedding_store_path=f'{tmp_path}/store')
+
+def assert_chunks_are_consistent(index: IndexingData):
+    library = index.get_library
+    assert library.index.ntotal == len(library.index_to_docstore_id)
+
+    for row, id in library.index_to_docstore_id.items():
+        doc = library.docstore.search(id)
+        assert doc.metadata['id'] == id
+        assert library.similarity_search_by_vector(list(library.index.reconstruct(row)), k=1)[0].metadata['id'] == id
+
+def test_each_save_is_a_new_snapshot(tmp_path):
+    path = f'{tmp_path}/library'
+    index = create_index(tmp_path)
+    index.save_local(path)
+
+    # A process that loaded the first save keeps reading it after the library is saved again
+    first = load_index(path, tmp_path)
+    first_snapshot = read_manifest(path)['snapshot']
+
+    index.add_source('notes', create_pdf_raw_data(20, seed=2)['text'], 'text')
+    index.save_local(path)
+
+    assert read_manifest(path)['snapshot'] != first_snapshot
+    assert set(first.get_manifest['sources']) == {'pdf'}
+    assert_chunks_are_consistent(first)
+
+    second = load_index(path, tmp_path)
+    assert set(second.get_manifest['sources']) == {'pdf', 'notes'}
+    assert_chunks_are_consistent(second)
+
+    # Only the current and the previous snapshots are kept
+    index.remove_source('pdf')
+    index.save_local(path)
+
+    snapshots = os.listdir(os.path.join(path, SNAPSHOTS_FOLDER))
+    assert len(snapshots) == 2
+    assert os.path.basename(first_snapshot) not in snapshots
+    assert_chunks_are_consistent(load_index(path, tmp_path))
+
+def test_ids_that_do_not_match_the_index_are_refused(tmp_path):
+    path = f'{tmp_path}/library'
+    create_index(tmp_path).save_local(path)
+
+    ids_path = os.path.join(library_files_path(path, read_manifest(path)), IDS_NAME)
+    with open(ids_path, 'r', encoding='utf-8') as ids_file:
+        ids = json.load(ids_file)
+    with open(ids_path, 'w', encoding='utf-8') as ids_file:
+        json.dump(ids[:-1], ids_file)
+
+    with pytest.raises(ValueError, match='chunk IDs'):
+        load_index(path, tmp_path)
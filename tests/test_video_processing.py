@@ -0,0 +1,52 @@
+# Python libraries
+import numpy as np
+import pytest
+
+pytest.importorskip('whisper')
+
+# Local imports
+from modules.video_processing import SAMPLE_RATE, compare_transcriptions, find_silence_cuts
+
+SEQUENTIAL = [
+    [' Hoje vamos falar sobre listas em HTML.', 0.0, 3.2],
+    [' Uma lista ordenada usa a tag ol.', 3.2, 6.8],
+    [' Cada item fica dentro de uma tag li.', 6.8, 10.1],
+    [' A lista sem ordem usa a tag ul.', 10.1, 13.5],
+]
+
+def test_compare_transcriptions_accepts_segments_cut_at_a_window_border():
+    # The parallel windows split the second segment and move the times a little
+    parallel = [
+        [' Hoje vamos falar sobre listas em HTML. Uma lista', 0.0, 4.0],
+        [' ordenada usa a tag ol.', 4.0, 6.5],
+        [' Cada item fica dentro de uma tag li.', 7.1, 10.3],
+        [' A lista sem ordem usa a tag ul.', 10.3, 13.4],
+    ]
+
+    comparison = compare_transcriptions(SEQUENTIAL, parallel)
+
+    assert comparison['segments'] == 4
+    assert comparison['aligned'] == 1.0
+    assert comparison['misaligned'] == []
+
+def test_compare_transcriptions_finds_shifted_segments():
+    # A wrong window offset moves the last two segments by 30 seconds
+    parallel = SEQUENTIAL[:2] + [[text, start + 30, end + 30] for text, start, end in SEQUENTIAL[2:]]
+
+    comparison = compare_transcriptions(SEQUENTIAL, parallel)
+
+    assert comparison['aligned'] == 0.5
+    assert [segment[1] for segment in comparison['misaligned']] == [6.8, 10.1]
+
+def test_find_silence_cuts_falls_on_silences():
+    # Noise with one second of silence around each 10s mark
+    generator = np.random.default_rng(0)
+    audio = generator.uniform(-0.5, 0.5, 35 * SAMPLE_RATE).astype(np.float32)
+    for second in [9.5, 19.5, 29.5]:
+        audio[int(second * SAMPLE_RATE):int((second + 1) * SAMPLE_RATE)] = 0.0
+
+    cuts = find_silence_cuts(audio, window_seconds=10.0, search_seconds=2.0)
+
+    assert len(cuts) == 3
+    for cut, second in zip(cuts, [9.5, 19.5, 29.5]):
+        assert second * SAMPLE_RATE <= cut <= (second + 1) * SAMPLE_RATE